@@ -2,9 +2,13 @@ import contextlib
 import logging
 import pathlib
 import textwrap
-from typing import Any, Dict, List
+import time
+from typing import Any, Dict, List, Optional, Type
 
-from _nebari.utils import timer
+from _nebari.provider import opentofu
+from _nebari.scheduler import run_stages
+from _nebari.stages.base import NebariTerraformStage
+from _nebari.utils import subprocess_log, timer
 from nebari import hookspecs, schema
 
 logger = logging.getLogger(__name__)
@@ -12,9 +16,21 @@ logger = logging.getLogger(__name__)
 
 def deploy_configuration(
     config: schema.Main,
-    stages: List[hookspecs.NebariStage],
+    stages: List[Type[hookspecs.NebariStage]],
     disable_prompt: bool = False,
     disable_checks: bool = False,
+    max_parallel_stages: int = 1,
+    skip_unchanged: bool = False,
+    resume_from: Optional[str] = None,
+    only: Optional[str] = None,
+    upgrade_providers: bool = False,
+    batch_imports: bool = False,
+    plan_first: bool = False,
+    plan_only: bool = False,
+    tofu_progress: bool = False,
+    parallelism: Optional[int] = None,
+    refresh: Optional[bool] = None,
+    log_dir: Optional[pathlib.Path] = None,
 ) -> Dict[str, Any]:
     if config.prevent_deploy:
         raise ValueError(
@@ -45,28 +61,134 @@ def deploy_configuration(
             "The validation checks at the end of each stage have been disabled"
         )
 
+    if skip_unchanged:
+        logger.warning(
+            "Stages unchanged since their last successful deploy will not be applied"
+        )
+
+    if resume_from and only:
+        raise ValueError("Only one of resume_from and only can be specified")
+
+    # stages before the one resumed from only restore their outputs
+    restored_stages = set()
+    start_stage = resume_from or only
+    if start_stage:
+        stage_names = [stage.name for stage in stages]
+        if start_stage not in stage_names:
+            raise ValueError(
+                f"Stage={start_stage} not found, available stages are {stage_names}"
+            )
+        index = stage_names.index(start_stage)
+        restored_stages = set(stage_names[:index])
+        if only:
+            stages = stages[: index + 1]
+        logger.warning(
+            f"Stages {sorted(restored_stages)} will restore outputs from their last deploy without being applied"
+        )
+
+    if plan_only:
+        skipped_stages = [
+            stage.name
+            for stage in stages
+            if not issubclass(stage, NebariTerraformStage)
+        ]
+        if skipped_stages:
+            logger.warning(
+                f"Only terraform stages can be planned, skipping stages {skipped_stages}"
+            )
+        stages = [stage for stage in stages if issubclass(stage, NebariTerraformStage)]
+
+    from nebari.plugins import nebari_plugin_manager
+
+    hook = nebari_plugin_manager.plugin_manager.hook
+
     with timer(logger, "deploying Nebari"):
         stage_outputs = {}
-        with contextlib.ExitStack() as stack:
-            for stage in stages:
-                s: hookspecs.NebariStage = stage(
-                    output_directory=pathlib.Path.cwd(), config=config
+        planned_changes = {}
+
+        def _deploy_stage(stage):
+            s: hookspecs.NebariStage = stage(
+                output_directory=pathlib.Path.cwd(), config=config
+            )
+            if skip_unchanged:
+                s.skip_unchanged = True
+            if s.name in restored_stages:
+                s.restore_outputs = True
+            if upgrade_providers:
+                s.upgrade_providers = True
+            if batch_imports:
+                s.batch_imports = True
+            if plan_first:
+                s.plan_first = True
+            if plan_only:
+                s.plan_only = True
+            if tofu_progress:
+                s.tofu_progress = True
+            if parallelism is not None:
+                s.parallelism_override = parallelism
+            if refresh is not None:
+                s.refresh_override = refresh
+
+            hook.nebari_stage_started(stage=s, action="deploy")
+            start_time = time.time()
+            error = None
+            try:
+                with (
+                    contextlib.ExitStack() as stage_stack,
+                    subprocess_log(log_dir / f"{s.name}.log" if log_dir else None),
+                ):
+                    with timer(logger, f"deploy stage={s.name}", category="stage"):
+                        stage_stack.enter_context(
+                            s.deploy(stage_outputs, disable_prompt)
+                        )
+                    if plan_only and s.planned_changes is not None:
+                        planned_changes[s.name] = s.planned_changes
+
+                    if (
+                        not disable_checks
+                        and not plan_only
+                        and s.name not in restored_stages
+                    ):
+                        with timer(logger, f"check stage={s.name}", category="stage"):
+                            s.check(stage_outputs, disable_prompt)
+                    return stage_stack.pop_all()
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                hook.nebari_stage_finished(
+                    stage=s,
+                    action="deploy",
+                    duration=time.time() - start_time,
+                    outputs_size=len(stage_outputs.get("stages/" + s.name, {})),
+                    error=error,
                 )
-                stack.enter_context(s.deploy(stage_outputs, disable_prompt))
 
-                if not disable_checks:
-                    s.check(stage_outputs, disable_prompt)
+        with contextlib.ExitStack() as stack:
+            for _, stage_stack in run_stages(
+                stages, _deploy_stage, max_workers=max_parallel_stages
+            ):
+                stack.enter_context(stage_stack)
+
+        if plan_only:
+            print("Planned changes:")
+            for stage_name, changes in planned_changes.items():
+                print(f" - {stage_name}: {opentofu.format_changes(changes)}")
+            return stage_outputs
+
         print("Nebari deployed successfully")
 
-        print("Services:")
-        for service_name, service in stage_outputs["stages/07-kubernetes-services"][
-            "service_urls"
-        ]["value"].items():
-            print(f" - {service_name} -> {service['url']}")
+        if "stages/07-kubernetes-services" in stage_outputs:
+            print("Services:")
+            for service_name, service in stage_outputs["stages/07-kubernetes-services"][
+                "service_urls"
+            ]["value"].items():
+                print(f" - {service_name} -> {service['url']}")
 
-        print(
-            f"Kubernetes kubeconfig located at file://{stage_outputs['stages/02-infrastructure']['kubeconfig_filename']['value']}"
-        )
+        if "stages/02-infrastructure" in stage_outputs:
+            print(
+                f"Kubernetes kubeconfig located at file://{stage_outputs['stages/02-infrastructure']['kubeconfig_filename']['value']}"
+            )
         username = "root"
         password = config.security.keycloak.initial_root_password
         if password:
@@ -1,15 +1,66 @@
 import contextlib
 import logging
 import pathlib
-from typing import List
+import time
+from typing import Any, Dict, List
 
+from _nebari.stages.base import NebariTerraformStage
 from _nebari.utils import timer
 from nebari import hookspecs, schema
 
 logger = logging.getLogger(__name__)
 
 
-def destroy_configuration(config: schema.Main, stages: List[hookspecs.NebariStage]):
+@contextlib.contextmanager
+def stage_lifecycle(
+    stage: hookspecs.NebariStage,
+    stage_outputs: Dict[str, Dict[str, Any]],
+    status: Dict[str, bool],
+):
+    """Enter the destroy context of a stage firing the stage lifecycle hooks.
+
+    Terraform stages are only destroyed when their context exits so the
+    reported duration covers both entering and exiting the context.
+    """
+    from nebari.plugins import nebari_plugin_manager
+
+    hook = nebari_plugin_manager.plugin_manager.hook
+    hook.nebari_stage_started(stage=stage, action="destroy")
+
+    duration = 0.0
+    error = None
+    raised_by_stage = True
+    start_time = time.time()
+    try:
+        with stage.destroy(stage_outputs, status):
+            duration += time.time() - start_time
+            try:
+                yield
+            except BaseException:
+                raised_by_stage = False
+                raise
+            finally:
+                start_time = time.time()
+    except BaseException as e:
+        if raised_by_stage:
+            error = e
+        raise
+    finally:
+        duration += time.time() - start_time
+        hook.nebari_stage_finished(
+            stage=stage,
+            action="destroy",
+            duration=duration,
+            outputs_size=len(stage_outputs.get("stages/" + stage.name, {})),
+            error=error,
+        )
+
+
+def destroy_configuration(
+    config: schema.Main,
+    stages: List[hookspecs.NebariStage],
+    tofu_progress: bool = False,
+):
     logger.info(
         """Removing all infrastructure, your local files will still remain,
     you can use 'nebari deploy' to re-install infrastructure using same config file\n"""
@@ -25,7 +76,10 @@ def destroy_configuration(config: schema.Main, stages: List[hookspecs.NebariStag
                     s: hookspecs.NebariStage = stage(
                         output_directory=pathlib.Path.cwd(), config=config
                     )
-                    stack.enter_context(s.destroy(stage_outputs, status))
+                    if tofu_progress and isinstance(s, NebariTerraformStage):
+                        s.tofu_progress = True
+                    with timer(logger, f"destroy stage={s.name}", category="stage"):
+                        stack.enter_context(stage_lifecycle(s, stage_outputs, status))
                 except Exception as e:
                     status[s.name] = False
                     print(
@@ -0,0 +1,62 @@
+import concurrent.futures
+import logging
+from typing import Dict, List, Tuple, Type
+
+from _nebari.plan import restored_stages
+from _nebari.provider import opentofu
+from _nebari.stages.base import NebariTerraformStage
+from _nebari.utils import timer
+from nebari import hookspecs, schema
+
+logger = logging.getLogger(__name__)
+
+
+def drift_configuration(
+    config: schema.Main,
+    stages: List[Type[hookspecs.NebariStage]],
+    max_parallel_stages: int = 4,
+) -> Tuple[Dict[str, List[Dict[str, str]]], Dict[str, str]]:
+    """Detect changes made outside of Nebari to the resources of all terraform stages.
+
+    The outputs of every stage are restored from its last deploy and all
+    stages are then checked concurrently with a refresh-only plan.
+    Returns the drifted resources of each stage that could be checked and
+    the error of each stage that could not.
+    """
+    with timer(logger, "checking Nebari for drift"):
+
+        def _drift_stage(s: NebariTerraformStage):
+            with timer(logger, f"drift stage={s.name}", category="stage"):
+                return opentofu.drift(
+                    str(s.output_directory / s.stage_prefix),
+                    input_vars=s.input_vars(stage_outputs),
+                    parallelism=s.tofu_settings()["parallelism"],
+                )
+
+        with restored_stages(config, stages, max_parallel_stages) as (
+            instances,
+            stage_outputs,
+        ):
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=max_parallel_stages
+            ) as executor:
+                futures = {s.name: executor.submit(_drift_stage, s) for s in instances}
+
+    drifted, failed = {}, {}
+    for stage_name, future in futures.items():
+        try:
+            drifted[stage_name] = future.result()
+        except opentofu.OpenTofuException as e:
+            failed[stage_name] = str(e)
+
+    print("Drifted resources:")
+    for stage_name in futures:
+        if stage_name in failed:
+            print(f" - {stage_name}: error, {failed[stage_name]}")
+        elif not drifted[stage_name]:
+            print(f" - {stage_name}: no drift")
+        else:
+            print(f" - {stage_name}: {len(drifted[stage_name])} drifted")
+            for resource in drifted[stage_name]:
+                print(f"   - {resource['address']} ({resource['action']})")
+    return drifted, failed
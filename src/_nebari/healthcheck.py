@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import random
+from typing import Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# a probe returns True when the endpoint is healthy
+Probe = Callable[[], Awaitable[bool]]
+
+
+def http_probe(url: str, verify: bool = False, timeout: float = 10) -> Probe:
+    """Probe succeeding when `url` responds with a status code below 400."""
+
+    async def probe() -> bool:
+        import requests
+
+        try:
+            response = await asyncio.to_thread(
+                requests.get, url, verify=verify, timeout=timeout
+            )
+        except requests.RequestException as e:
+            logger.debug(f"health check request to url={url} failed: {e}")
+            return False
+        return response.status_code < 400
+
+    return probe
+
+
+def tcp_probe(host: str, port: int, timeout: float = 5) -> Probe:
+    """Probe succeeding when a TCP connection to `host:port` can be opened."""
+
+    async def probe() -> bool:
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port), timeout
+            )
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        return True
+
+    return probe
+
+
+async def _wait_until_healthy(
+    name: str,
+    probe: Probe,
+    num_attempts: int,
+    initial_delay: float,
+    max_delay: float,
+) -> bool:
+    loop = asyncio.get_running_loop()
+    # give up no sooner than `num_attempts` probes spaced `max_delay` apart,
+    # the backoff only probes more often while the endpoint starts up
+    deadline = loop.time() + num_attempts * max_delay
+    attempt = 0
+    while True:
+        attempt += 1
+        if await probe():
+            print(f"Attempt {attempt} health check succeeded for {name}")
+            return True
+        print(f"Attempt {attempt} health check failed for {name}")
+
+        remaining = deadline - loop.time()
+        if attempt >= num_attempts and remaining <= 0:
+            return False
+
+        # exponential backoff with jitter so probes do not retry in lockstep
+        delay = min(max_delay, initial_delay * 2 ** (attempt - 1))
+        delay = random.uniform(delay / 2, delay)
+        if remaining > 0:
+            delay = min(delay, remaining)
+        await asyncio.sleep(delay)
+
+
+def wait_until_healthy(
+    probes: Dict[str, Probe],
+    num_attempts: int = 10,
+    initial_delay: float = 1,
+    max_delay: float = 10,
+) -> Dict[str, bool]:
+    """Run all probes concurrently until each succeeds or runs out of attempts.
+
+    A probe runs out of attempts after `num_attempts` attempts and no
+    sooner than `num_attempts * max_delay` seconds.
+
+    Returns a mapping of probe name to whether the endpoint became healthy.
+    """
+
+    async def _run():
+        results = await asyncio.gather(
+            *(
+                _wait_until_healthy(name, probe, num_attempts, initial_delay, max_delay)
+                for name, probe in probes.items()
+            )
+        )
+        return dict(zip(probes, results))
+
+    return asyncio.run(_run())
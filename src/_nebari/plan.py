@@ -0,0 +1,93 @@
+import concurrent.futures
+import contextlib
+import logging
+import pathlib
+from typing import Any, Dict, Iterator, List, Tuple, Type
+
+from _nebari.provider import opentofu
+from _nebari.scheduler import run_stages
+from _nebari.stages.base import NebariTerraformStage
+from _nebari.utils import timer
+from nebari import hookspecs, schema
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.contextmanager
+def restored_stages(
+    config: schema.Main,
+    stages: List[Type[hookspecs.NebariStage]],
+    max_parallel_stages: int = 4,
+) -> Iterator[Tuple[List[NebariTerraformStage], Dict[str, Dict[str, Any]]]]:
+    """Restore the outputs of all terraform stages from their last deploy.
+
+    Yields the stage instances along with the restored stage outputs. The
+    deploy context of every stage stays active until the context exits,
+    keeping the provider credentials they set up available.
+    """
+    stages = [stage for stage in stages if issubclass(stage, NebariTerraformStage)]
+    stage_outputs: Dict[str, Dict[str, Any]] = {}
+
+    def _restore_stage(stage):
+        s: NebariTerraformStage = stage(
+            output_directory=pathlib.Path.cwd(), config=config
+        )
+        s.restore_outputs = True
+        with contextlib.ExitStack() as stage_stack:
+            # also sets up the provider credentials of later stages
+            stage_stack.enter_context(s.deploy(stage_outputs))
+            return s, stage_stack.pop_all()
+
+    with contextlib.ExitStack() as stack:
+        instances = {}
+        for _, (s, stage_stack) in run_stages(
+            stages, _restore_stage, max_workers=max_parallel_stages
+        ):
+            stack.enter_context(stage_stack)
+            instances[s.name] = s
+        # in priority order rather than the order stages finished restoring
+        yield [
+            instances[stage.name] for stage in stages if stage.name in instances
+        ], stage_outputs
+
+
+def plan_configuration(
+    config: schema.Main,
+    stages: List[Type[hookspecs.NebariStage]],
+    max_parallel_stages: int = 4,
+) -> Dict[str, Dict[str, int]]:
+    """Plan all terraform stages without applying any of them.
+
+    The outputs of every stage are first restored from its last deploy so
+    that all stages can then be planned concurrently against the deployed
+    outputs of the stages before them. Returns the resource change counts
+    of each stage.
+    """
+    with timer(logger, "planning Nebari"):
+
+        def _plan_stage(s: NebariTerraformStage):
+            with timer(logger, f"plan stage={s.name}", category="stage"):
+                return opentofu.plan_changes(
+                    str(s.output_directory / s.stage_prefix),
+                    input_vars=s.input_vars(stage_outputs),
+                    **s.tofu_settings(),
+                )
+
+        with restored_stages(config, stages, max_parallel_stages) as (
+            instances,
+            stage_outputs,
+        ):
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=max_parallel_stages
+            ) as executor:
+                futures = {s.name: executor.submit(_plan_stage, s) for s in instances}
+            planned_changes = {s.name: futures[s.name].result() for s in instances}
+
+    print("Planned changes:")
+    totals = dict.fromkeys(["create", "update", "replace", "delete"], 0)
+    for stage_name, changes in planned_changes.items():
+        print(f" - {stage_name}: {opentofu.format_changes(changes)}")
+        for action, count in changes.items():
+            totals[action] = totals.get(action, 0) + count
+    print(f"Total: {opentofu.format_changes(totals)}")
+    return planned_changes
@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import os
+import platform
+import shutil
+import sys
+import tarfile
+import tempfile
+import threading
+import urllib.parse
+import urllib.request
+import zipfile
+from pathlib import Path
+from typing import Dict
+
+from _nebari.utils import cache_directory
+
+logger = logging.getLogger(__name__)
+
+OS_MAPPING = {
+    "linux": "linux",
+    "win32": "windows",
+    "darwin": "darwin",
+    "freebsd": "freebsd",
+    "openbsd": "openbsd",
+    "solaris": "solaris",
+}
+
+ARCHITECTURE_MAPPING = {
+    "x86_64": "amd64",
+    "i386": "386",
+    "armv7l": "arm",
+    "aarch64": "arm64",
+    "arm64": "arm64",
+}
+
+# release archive, published checksums and path of the binary within the
+# archive of each tool, formatted with `version`, `os` and `arch`
+RELEASES = {
+    "tofu": {
+        "url": "https://github.com/opentofu/opentofu/releases/download/v{version}/tofu_{version}_{os}_{arch}.zip",
+        "checksums_url": "https://github.com/opentofu/opentofu/releases/download/v{version}/tofu_{version}_SHA256SUMS",
+        "member": "tofu",
+    },
+    "helm": {
+        "url": "https://get.helm.sh/helm-{version}-{os}-{arch}.tar.gz",
+        "checksums_url": "https://get.helm.sh/helm-{version}-{os}-{arch}.tar.gz.sha256sum",
+        "member": "{os}-{arch}/helm",
+    },
+    "kustomize": {
+        "url": "https://github.com/kubernetes-sigs/kustomize/releases/download/kustomize%2Fv{version}/kustomize_v{version}_{os}_{arch}.tar.gz",
+        "checksums_url": "https://github.com/kubernetes-sigs/kustomize/releases/download/kustomize%2Fv{version}/checksums.txt",
+        "member": "kustomize",
+    },
+}
+
+CHUNK_SIZE = 1024 * 1024
+
+_DOWNLOAD_LOCK = threading.Lock()
+
+
+class DownloadException(Exception):
+    pass
+
+
+def binary_mirror():
+    """Location of a mirror of the release archives, if any.
+
+    Set `NEBARI_BINARY_MIRROR` to a directory or URL laid out as
+    `<mirror>/<tool>/<version>/<archive or checksums filename>` to install
+    the binaries without access to the upstream release pages.
+    """
+    return os.environ.get("NEBARI_BINARY_MIRROR")
+
+
+def release_urls(tool: str, version: str, os_name: str, arch: str) -> Dict[str, str]:
+    release = RELEASES[tool]
+    urls = {
+        key: release[key].format(version=version, os=os_name, arch=arch)
+        for key in ("url", "checksums_url")
+    }
+
+    mirror = binary_mirror()
+    if mirror:
+        if "://" not in mirror:
+            mirror = Path(mirror).absolute().as_uri()
+        urls = {
+            key: f"{mirror.rstrip('/')}/{tool}/{version}/{url.rsplit('/', 1)[-1]}"
+            for key, url in urls.items()
+        }
+    return urls
+
+
+def published_checksum(checksums_url: str, filename: str) -> str:
+    """SHA256 of `filename` from a `sha256sum` formatted checksums file."""
+    with urllib.request.urlopen(checksums_url) as f:
+        checksums: str = f.read().decode("utf-8")
+
+    for line in checksums.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[1].lstrip("*") == filename:
+            return parts[0].lower()
+    raise DownloadException(
+        f"No checksum published for {filename} in checksums={checksums_url}"
+    )
+
+
+def download_file(url: str, path: Path) -> str:
+    """Stream `url` to `path` returning the SHA256 of its content."""
+    sha256 = hashlib.sha256()
+    with urllib.request.urlopen(url) as response, path.open("wb") as f:
+        while chunk := response.read(CHUNK_SIZE):
+            sha256.update(chunk)
+            f.write(chunk)
+    return sha256.hexdigest()
+
+
+def extract_member(archive: Path, member: str, path: Path):
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as z, z.open(member) as src:
+            with path.open("wb") as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    else:
+        with tarfile.open(archive) as t:
+            member_file = t.extractfile(member)
+            if member_file is None:
+                raise DownloadException(f"{member} is not a file in {archive}")
+            with member_file, path.open("wb") as dst:
+                shutil.copyfileobj(member_file, dst, CHUNK_SIZE)
+
+
+def download_binary(tool: str, version: str) -> Path:
+    """Path to the binary of `tool` at `version` for the current platform.
+
+    Binaries are kept in the nebari cache directory keyed by tool,
+    version and platform so the network is only used on a cache miss.
+    Release archives are verified against their published SHA256
+    checksums before the binary is extracted.
+    """
+    os_name = OS_MAPPING[sys.platform]
+    arch = ARCHITECTURE_MAPPING[platform.machine()]
+    directory = cache_directory("bin", tool, version, f"{os_name}_{arch}")
+    binary_path = directory / tool
+
+    if binary_path.is_file():
+        return binary_path
+
+    with _DOWNLOAD_LOCK:
+        # downloaded by another thread while waiting for the lock
+        if binary_path.is_file():
+            return binary_path
+
+        urls = release_urls(tool, version, os_name, arch)
+        archive_name = urllib.parse.unquote(urls["url"].rsplit("/", 1)[-1])
+        expected_checksum = published_checksum(urls["checksums_url"], archive_name)
+
+        logger.info(f"downloading {tool} from url={urls['url']} to path={binary_path}")
+        with tempfile.TemporaryDirectory(dir=directory) as download_directory:
+            archive = Path(download_directory) / archive_name
+            checksum = download_file(urls["url"], archive)
+            if checksum != expected_checksum:
+                raise DownloadException(
+                    f"Checksum mismatch for url={urls['url']} expected={expected_checksum} actual={checksum}"
+                )
+
+            member = RELEASES[tool]["member"].format(
+                version=version, os=os_name, arch=arch
+            )
+            extracted_path = Path(download_directory) / tool
+            extract_member(archive, member, extracted_path)
+            extracted_path.chmod(0o555)
+            # atomic so other processes never see a partial binary
+            extracted_path.replace(binary_path)
+
+    return binary_path
@@ -1,59 +1,28 @@
 import logging
-import os
+import re
+import shutil
 import subprocess
 import tempfile
+import threading
 from pathlib import Path
 
 from _nebari import constants
-from _nebari.utils import run_subprocess_cmd
+from _nebari.provider import download
+from _nebari.utils import cache_directory, run_subprocess_cmd, timer
 
 logger = logging.getLogger(__name__)
 
 
+# charts are pulled one at a time, concurrent renders share the cache
+_CHART_LOCK = threading.Lock()
+
+
 class HelmException(Exception):
     pass
 
 
 def download_helm_binary(version=constants.HELM_VERSION) -> Path:
-    filename_directory = Path(tempfile.gettempdir()) / "helm" / version
-    filename_path = filename_directory / "helm"
-
-    if not filename_directory.is_dir():
-        filename_directory.mkdir(parents=True)
-
-    if not filename_path.is_file():
-        logger.info(
-            "downloading and extracting Helm binary version %s to path=%s",
-            constants.HELM_VERSION,
-            filename_path,
-        )
-        old_path = os.environ.get("PATH")
-        new_path = f"{filename_directory}:{old_path}"
-        install_script = subprocess.run(
-            [
-                "curl",
-                "-s",
-                "https://raw.githubusercontent.com/helm/helm/main/scripts/get-helm-3",
-            ],
-            stdout=subprocess.PIPE,
-            check=True,
-        )
-        subprocess.run(
-            [
-                "bash",
-                "-s",
-                "--",
-                "-v",
-                constants.HELM_VERSION,
-                "--no-sudo",
-            ],
-            input=install_script.stdout,
-            check=True,
-            env={"HELM_INSTALL_DIR": str(filename_directory), "PATH": new_path},
-        )
-
-    filename_path.chmod(0o555)
-    return filename_path
+    return download.download_binary("helm", version)
 
 
 def run_helm_subprocess(processargs, **kwargs) -> None:
@@ -62,6 +31,7 @@ def run_helm_subprocess(processargs, **kwargs) -> None:
     return_code, output = run_subprocess_cmd(
         [helm_path] + processargs, capture_output=True, **kwargs
     )
+    output.close()
     if return_code:
         raise HelmException("Helm returned an error")
 
@@ -72,3 +42,65 @@ def version() -> str:
 
     version_output = subprocess.check_output([helm_path, "version"]).decode("utf-8")
     return version_output
+
+
+def chart_cache_directory(repo: str, name: str, version: str) -> Path:
+    """Cache directory of a chart, holding the unpacked chart in `<name>/`.
+
+    Laid out as `helm-charts/<repo>/<name>/<version>` within the nebari
+    cache, with the scheme stripped from the repository URL and other
+    special characters replaced. The cache can be seeded offline with
+    `helm pull <name> --repo <repo> --version <version> --untar --untardir
+    <directory>`.
+    """
+    repo_key = re.sub(r"[^A-Za-z0-9._-]+", "_", re.sub(r"^[a-z]+://", "", repo))
+    return cache_directory("helm-charts", repo_key, name, str(version))
+
+
+def cache_chart(repo: str, name: str, version: str) -> Path:
+    """Path of the unpacked chart in the chart cache, pulled unless cached."""
+    directory = chart_cache_directory(repo, name, version)
+    chart_path = directory / name
+    if (chart_path / "Chart.yaml").is_file():
+        return chart_path
+
+    with _CHART_LOCK:
+        if (chart_path / "Chart.yaml").is_file():
+            return chart_path
+
+        logger.info(f"pulling helm chart repo={repo} name={name} version={version}")
+        with (
+            tempfile.TemporaryDirectory(dir=directory) as temp_dir,
+            timer(logger, "helm pull", category="helm", chart=name),
+        ):
+            run_helm_subprocess(
+                [
+                    "pull",
+                    name,
+                    "--repo",
+                    repo,
+                    "--version",
+                    str(version),
+                    "--untar",
+                    "--untardir",
+                    temp_dir,
+                ]
+            )
+            try:
+                # atomic, another process may have cached the chart meanwhile
+                (Path(temp_dir) / name).replace(chart_path)
+            except OSError:
+                if not (chart_path / "Chart.yaml").is_file():
+                    raise
+    return chart_path
+
+
+def copy_cached_chart(repo: str, name: str, version: str, chart_home: Path):
+    """Copy a cached chart to where `kustomize build --enable-helm` looks for it.
+
+    Kustomize only pulls charts missing from `chart_home`.
+    """
+    target = Path(chart_home) / f"{name}-{version}" / name
+    if target.exists():
+        shutil.rmtree(target)
+    shutil.copytree(cache_chart(repo, name, version), target)
@@ -16,6 +16,8 @@
 import os
 import pathlib
 import re
+import threading
+from typing import Dict, Optional, Tuple
 
 import yaml
 from kubernetes import client
@@ -26,8 +28,56 @@ UPPER_FOLLOWED_BY_LOWER_RE = re.compile("(.)([A-Z][a-z]+)")
 LOWER_OR_NUM_FOLLOWED_BY_UPPER_RE = re.compile("([a-z0-9])([A-Z])")
 
 
+class ResourceResolver:
+    """Resolves an apiVersion and kind to the resource of a dynamic client.
+
+    Share one resolver between all manifests applied to a cluster, every
+    resource is then only looked up once. The dynamic client keeps its
+    API discovery in a cache file and discovers again when a lookup
+    misses it. Call `invalidate` to discover again regardless, e.g. once
+    CRDs were applied.
+    """
+
+    def __init__(self, k8s_client: client.ApiClient):
+        self.k8s_client = k8s_client
+        self._lock = threading.Lock()
+        self._dynamic_client: Optional[DynamicClient] = None
+        self._resources: Dict[Tuple[str, str], Resource] = {}
+
+    def _client(self) -> DynamicClient:
+        if self._dynamic_client is None:
+            self._dynamic_client = DynamicClient(self.k8s_client)
+        return self._dynamic_client
+
+    @property
+    def dynamic_client(self) -> DynamicClient:
+        with self._lock:
+            return self._client()
+
+    def get(self, api_version: str, kind: str) -> Resource:
+        key = (api_version, kind)
+        with self._lock:
+            if key not in self._resources:
+                self._resources[key] = self._client().resources.get(
+                    api_version=api_version, kind=kind
+                )
+            return self._resources[key]
+
+    def invalidate(self):
+        with self._lock:
+            if self._dynamic_client is not None:
+                self._dynamic_client.resources.invalidate_cache()
+            self._resources = {}
+
+
 def create_from_directory(
-    k8s_client, yaml_dir=None, verbose=False, namespace="default", apply=False, **kwargs
+    k8s_client,
+    yaml_dir=None,
+    verbose=False,
+    namespace="default",
+    apply=False,
+    resolver=None,
+    **kwargs,
 ):
     """
     Perform an action from files from a directory. Pass True for verbose to
@@ -78,6 +128,8 @@ def create_from_directory(
 
     failures = []
     k8s_objects_all = []
+    if apply and resolver is None:
+        resolver = ResourceResolver(k8s_client)
 
     for file in files:
         try:
@@ -87,6 +139,7 @@ def create_from_directory(
                 verbose=verbose,
                 namespace=namespace,
                 apply=apply,
+                resolver=resolver,
                 **kwargs,
             )
             k8s_objects_all.append(k8s_objects)
@@ -104,6 +157,7 @@ def create_from_yaml(
     verbose=False,
     namespace="default",
     apply=False,
+    resolver=None,
     **kwargs,
 ):
     """
@@ -121,6 +175,8 @@ def create_from_yaml(
         the resource creation will fail. If the API object in
         the yaml file already contains a namespace definition
         this parameter has no effect.
+    resolver: ResourceResolver used to look up the resources to apply,
+        shared by all objects of the file unless given.
 
     Available parameters for creating <kind>:
     :param async_req bool
@@ -141,6 +197,9 @@ def create_from_yaml(
         instances for each object that failed to create.
     """
 
+    if apply and resolver is None:
+        resolver = ResourceResolver(k8s_client)
+
     def create_with(objects, apply=apply):
         failures = []
         k8s_objects = []
@@ -154,6 +213,7 @@ def create_from_yaml(
                     verbose,
                     namespace=namespace,
                     apply=apply,
+                    resolver=resolver,
                     **kwargs,
                 )
                 k8s_objects.append(created)
@@ -182,7 +242,13 @@ def create_from_yaml(
 
 
 def create_from_dict(
-    k8s_client, data, verbose=False, namespace="default", apply=False, **kwargs
+    k8s_client,
+    data,
+    verbose=False,
+    namespace="default",
+    apply=False,
+    resolver=None,
+    **kwargs,
 ):
     """
     Perform an action from a dictionary containing valid kubernetes
@@ -227,6 +293,7 @@ def create_from_dict(
                     verbose,
                     namespace=namespace,
                     apply=apply,
+                    resolver=resolver,
                     **kwargs,
                 )
                 k8s_objects.append(created)
@@ -236,7 +303,13 @@ def create_from_dict(
         # This is a single object. Call the single item method
         try:
             created = create_from_yaml_single_item(
-                k8s_client, data, verbose, namespace=namespace, apply=apply, **kwargs
+                k8s_client,
+                data,
+                verbose,
+                namespace=namespace,
+                apply=apply,
+                resolver=resolver,
+                **kwargs,
             )
             k8s_objects.append(created)
         except client.rest.ApiException as api_exception:
@@ -250,13 +323,13 @@ def create_from_dict(
 
 
 def create_from_yaml_single_item(
-    k8s_client, yml_object, verbose=False, apply=False, **kwargs
+    k8s_client, yml_object, verbose=False, apply=False, resolver=None, **kwargs
 ):
     kind = yml_object["kind"]
     if apply:
-        apply_client = DynamicClient(k8s_client).resources.get(
-            api_version=yml_object["apiVersion"], kind=kind
-        )
+        if resolver is None:
+            resolver = ResourceResolver(k8s_client)
+        apply_client = resolver.get(api_version=yml_object["apiVersion"], kind=kind)
         resp = apply_client.server_side_apply(
             body=yml_object, field_manager="python-client", **kwargs
         )
@@ -298,7 +371,10 @@ def create_from_yaml_single_item(
 
 
 def delete_from_yaml(
-    k8s_client: client.ApiClient, yaml_file: pathlib.Path = None, verbose: bool = False
+    k8s_client: client.ApiClient,
+    yaml_file: pathlib.Path = None,
+    verbose: bool = False,
+    resolver: Optional[ResourceResolver] = None,
 ) -> None:
     """
     Delete all objects in a yaml file. Pass True for verbose to
@@ -306,6 +382,7 @@ def delete_from_yaml(
     Input:
     yaml_file: string. Contains the path to yaml file.
     k8s_client: an ApiClient object, initialized with the client args.
+    resolver: ResourceResolver used to look up the resources to delete.
 
     Returns:
         None
@@ -314,7 +391,7 @@ def delete_from_yaml(
         OperationFailureError which holds list of `client.rest.ApiException`
         instances for each object that failed to delete.
     """
-    dynamic_client = DynamicClient(k8s_client)
+    resolver = resolver or ResourceResolver(k8s_client)
     k8s_objects = parse_yaml_file(yaml_file)
     exceptions = []
     for object in k8s_objects:
@@ -322,16 +399,14 @@ def delete_from_yaml(
             if verbose:
                 print(f"Deleting {object.kind} {object.name}")
             if object.namespaced:
-                dynamic_client.resources.get(
-                    api_version=object.api_version, kind=object.kind
-                ).delete(
+                resolver.get(api_version=object.api_version, kind=object.kind).delete(
                     name=object.name,
                     namespace=object.extra_args.get("namespace", "default"),
                 )
             else:
-                dynamic_client.resources.get(
-                    api_version=object.api_version, kind=object.kind
-                ).delete(name=object.name)
+                resolver.get(api_version=object.api_version, kind=object.kind).delete(
+                    name=object.name
+                )
         except client.rest.ApiException as api_exception:
             if api_exception.reason == "Not Found":
                 continue
@@ -0,0 +1,204 @@
+import concurrent.futures
+import dataclasses
+import json
+import logging
+import pathlib
+from typing import Any, Dict, Iterable, List, Optional
+
+import yaml
+from kubernetes import client
+
+from _nebari.provider import kubernetes, kubernetes_readiness
+from _nebari.utils import timer
+
+logger = logging.getLogger(__name__)
+
+# objects applied concurrently within a phase
+APPLY_MAX_WORKERS = 16
+
+# seconds to wait for applied CRDs to be established
+CRD_ESTABLISHED_TIMEOUT = 60
+
+# kinds applied in each phase, one phase after another. Objects of any
+# other kind, e.g. workloads and custom resources, are applied in the
+# phase before the webhooks, which would otherwise intercept objects
+# before the services they call are running
+PHASES = [
+    # namespaced objects of later phases may be created in these namespaces
+    ("namespaces", {"Namespace", "CustomResourceDefinition"}),
+    (
+        "cluster",
+        {
+            "PriorityClass",
+            "StorageClass",
+            "ClusterRole",
+            "ClusterRoleBinding",
+            "Role",
+            "RoleBinding",
+        },
+    ),
+    (
+        "config",
+        {
+            "ServiceAccount",
+            "ConfigMap",
+            "Secret",
+            "PersistentVolumeClaim",
+            "LimitRange",
+            "ResourceQuota",
+        },
+    ),
+    ("workloads", None),
+    (
+        "webhooks",
+        {"MutatingWebhookConfiguration", "ValidatingWebhookConfiguration"},
+    ),
+]
+
+
+@dataclasses.dataclass
+class ApplyError:
+    kind: str
+    name: Optional[str]
+    namespace: Optional[str]
+    error: str
+
+    def __str__(self):
+        name = f"{self.namespace}/{self.name}" if self.namespace else self.name
+        return f"{self.kind} {name}: {self.error}"
+
+
+def api_error(e: client.rest.ApiException) -> str:
+    """Message of the Status object returned by the API server, if any."""
+    try:
+        message = json.loads(e.body)["message"]
+    except (TypeError, ValueError, KeyError):
+        message = e.body
+    return (
+        f"({e.status}) {e.reason}: {message}" if message else f"({e.status}) {e.reason}"
+    )
+
+
+def load_objects(filename: pathlib.Path) -> List[Dict[str, Any]]:
+    """Kubernetes objects of a manifest file, with `List` kinds expanded."""
+
+    class Loader(yaml.loader.SafeLoader):
+        yaml_implicit_resolvers = yaml.loader.SafeLoader.yaml_implicit_resolvers.copy()
+        if "=" in yaml_implicit_resolvers:
+            yaml_implicit_resolvers.pop("=")
+
+    objects = []
+    with open(filename) as f:
+        for document in yaml.load_all(f, Loader=Loader):
+            if document is None:
+                continue
+            if document["kind"].endswith("List") and "items" in document:
+                # Could be "List" or "Pod/Service/...List"
+                kind = document["kind"][: -len("List")]
+                for item in document["items"]:
+                    if kind:
+                        item = {
+                            **item,
+                            "apiVersion": document["apiVersion"],
+                            "kind": kind,
+                        }
+                    objects.append(item)
+            else:
+                objects.append(document)
+    return objects
+
+
+def phases(objects: Iterable[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group `objects` by the phase they are applied in, keeping their order."""
+    default_phase = next(i for i, (_, kinds) in enumerate(PHASES) if kinds is None)
+    grouped: List[List[Dict[str, Any]]] = [[] for _ in PHASES]
+    for obj in objects:
+        index = next(
+            (
+                i
+                for i, (_, kinds) in enumerate(PHASES)
+                if kinds and obj["kind"] in kinds
+            ),
+            default_phase,
+        )
+        grouped[index].append(obj)
+    return grouped
+
+
+def apply_objects(
+    k8s_client: client.ApiClient,
+    objects: List[Dict[str, Any]],
+    namespace: str = "default",
+    resolver: Optional[kubernetes.ResourceResolver] = None,
+    max_workers: int = APPLY_MAX_WORKERS,
+) -> List[ApplyError]:
+    """Server-side apply `objects` phase by phase, see `PHASES`.
+
+    Objects within a phase are applied concurrently on up to
+    `max_workers` threads. Objects without a namespace are applied to
+    `namespace`. Failing objects do not stop the apply, the error of
+    each is returned instead.
+    """
+    resolver = resolver or kubernetes.ResourceResolver(k8s_client)
+
+    def _apply(obj):
+        metadata = obj.get("metadata", {})
+        object_namespace = metadata.get("namespace", namespace)
+        try:
+            kubernetes.create_from_yaml_single_item(
+                k8s_client,
+                obj,
+                apply=True,
+                resolver=resolver,
+                namespace=object_namespace,
+            )
+        except client.rest.ApiException as e:
+            return ApplyError(
+                obj["kind"], metadata.get("name"), object_namespace, api_error(e)
+            )
+        except Exception as e:
+            return ApplyError(
+                obj["kind"], metadata.get("name"), object_namespace, str(e)
+            )
+        return None
+
+    errors = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for (phase, _), phase_objects in zip(PHASES, phases(objects)):
+            if not phase_objects:
+                continue
+            with timer(
+                logger,
+                f"kubernetes apply phase={phase}",
+                category="kubernetes",
+                objects=len(phase_objects),
+            ):
+                phase_errors = [
+                    error
+                    for error in executor.map(_apply, phase_objects)
+                    if error is not None
+                ]
+            errors.extend(phase_errors)
+
+            failed = {(error.kind, error.name) for error in phase_errors}
+            crds = [
+                obj
+                for obj in phase_objects
+                if obj["kind"] == "CustomResourceDefinition"
+                and (obj["kind"], obj["metadata"]["name"]) not in failed
+            ]
+            if crds:
+                # custom resources of later phases need established crds
+                not_ready = kubernetes_readiness.wait_until_ready(
+                    k8s_client,
+                    kubernetes_readiness.targets(crds),
+                    timeout=CRD_ESTABLISHED_TIMEOUT,
+                    resolver=resolver,
+                )
+                errors.extend(
+                    ApplyError(target.kind, target.name, target.namespace, status)
+                    for target, status in not_ready.items()
+                )
+                # discover the resources defined by the crds
+                resolver.invalidate()
+    return errors
@@ -0,0 +1,377 @@
+import concurrent.futures
+import dataclasses
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import rich
+import urllib3
+from kubernetes import client, watch
+from kubernetes.dynamic.exceptions import ResourceNotFoundError
+from rich.console import Group
+from rich.errors import LiveError
+from rich.live import Live
+from rich.table import Table
+from rich.text import Text
+
+from _nebari.provider import kubernetes
+from _nebari.utils import timer
+
+logger = logging.getLogger(__name__)
+
+# overall deadline of waiting for objects to become ready, in seconds
+READY_TIMEOUT = 600
+
+# objects watched concurrently
+READY_MAX_WORKERS = 32
+
+# seconds to wait before watching again after a watch failed or closed early
+WATCH_RETRY_DELAY = 1
+
+# number of pending objects shown in the progress view
+NUM_PENDING = 5
+
+Objects = Dict[str, Dict[str, Any]]
+
+
+class ReadinessError(Exception):
+    """Raised when a watched object can no longer become ready, e.g. a failed job."""
+
+
+def _condition(obj: Dict[str, Any], condition_type: str) -> Optional[Dict[str, Any]]:
+    conditions: List[Dict[str, Any]] = (obj.get("status") or {}).get("conditions") or []
+    for condition in conditions:
+        if condition.get("type") == condition_type:
+            return condition
+    return None
+
+
+def _not_observed(obj: Dict[str, Any]) -> Optional[str]:
+    generation = obj["metadata"].get("generation")
+    observed = (obj.get("status") or {}).get("observedGeneration")
+    if generation is not None and (observed is None or observed < generation):
+        return "waiting for the controller to observe the change"
+    return None
+
+
+def deployment_status(obj: Dict[str, Any]) -> Optional[str]:
+    status = obj.get("status") or {}
+    replicas = obj["spec"].get("replicas", 1)
+    updated = status.get("updatedReplicas", 0)
+    available = status.get("availableReplicas", 0)
+    not_observed = _not_observed(obj)
+    if not_observed:
+        return not_observed
+    if updated < replicas:
+        return f"{updated}/{replicas} replicas updated"
+    if status.get("replicas", 0) > updated:
+        return f"{status['replicas'] - updated} old replicas pending termination"
+    if available < replicas:
+        return f"{available}/{replicas} replicas available"
+    return None
+
+
+def statefulset_status(obj: Dict[str, Any]) -> Optional[str]:
+    status = obj.get("status") or {}
+    replicas = obj["spec"].get("replicas", 1)
+    ready = status.get("readyReplicas", 0)
+    not_observed = _not_observed(obj)
+    if not_observed:
+        return not_observed
+    update_strategy = (obj["spec"].get("updateStrategy") or {}).get("type")
+    if update_strategy != "OnDelete" and status.get("updateRevision") != status.get(
+        "currentRevision"
+    ):
+        return f"{status.get('updatedReplicas', 0)}/{replicas} replicas updated"
+    if ready < replicas:
+        return f"{ready}/{replicas} replicas ready"
+    return None
+
+
+def daemonset_status(obj: Dict[str, Any]) -> Optional[str]:
+    status = obj.get("status") or {}
+    desired = status.get("desiredNumberScheduled", 0)
+    updated = status.get("updatedNumberScheduled", 0)
+    available = status.get("numberAvailable", 0)
+    not_observed = _not_observed(obj)
+    if not_observed:
+        return not_observed
+    if updated < desired:
+        return f"{updated}/{desired} pods updated"
+    if available < desired:
+        return f"{available}/{desired} pods available"
+    return None
+
+
+def job_status(obj: Dict[str, Any]) -> Optional[str]:
+    complete = _condition(obj, "Complete")
+    if complete and complete.get("status") == "True":
+        return None
+    failed = _condition(obj, "Failed")
+    if failed and failed.get("status") == "True":
+        raise ReadinessError(failed.get("message") or failed.get("reason"))
+    completions = obj["spec"].get("completions", 1)
+    succeeded = (obj.get("status") or {}).get("succeeded", 0)
+    return f"{succeeded}/{completions} completions"
+
+
+def crd_status(obj: Dict[str, Any]) -> Optional[str]:
+    established = _condition(obj, "Established")
+    if established and established.get("status") == "True":
+        return None
+    names_accepted = _condition(obj, "NamesAccepted")
+    if names_accepted and names_accepted.get("status") == "False":
+        raise ReadinessError(names_accepted.get("message"))
+    return "waiting to be established"
+
+
+# status of an object of each kind, None once the object is ready and
+# otherwise what it is waiting for
+STATUS: Dict[str, Callable[[Dict[str, Any]], Optional[str]]] = {
+    "Deployment": deployment_status,
+    "StatefulSet": statefulset_status,
+    "DaemonSet": daemonset_status,
+    "Job": job_status,
+    "CustomResourceDefinition": crd_status,
+}
+
+
+def all_deleted(objects: Objects) -> Optional[str]:
+    """Status of a `Target` waiting for all of its objects to be deleted."""
+    if objects:
+        return f"{len(objects)} remaining"
+    return None
+
+
+@dataclasses.dataclass(frozen=True)
+class Target:
+    """Objects to wait for, either the object `name` or all matching `label_selector`.
+
+    By default the target is ready once the object `name` exists and its
+    status, see `STATUS`, is ready. A custom `status` is passed the
+    watched objects by name instead.
+    """
+
+    api_version: str
+    kind: str
+    name: Optional[str] = None
+    namespace: Optional[str] = None
+    label_selector: Optional[str] = None
+    status: Optional[Callable[[Objects], Optional[str]]] = None
+
+    def __str__(self):
+        name = self.name or self.label_selector
+        name = f"{self.namespace}/{name}" if self.namespace else name
+        return f"{self.kind} {name}"
+
+    def current_status(self, objects: Objects) -> Optional[str]:
+        if self.status is not None:
+            return self.status(objects)
+        if self.name not in objects:
+            return "waiting to be created"
+        return STATUS[self.kind](objects[self.name])
+
+
+def targets(
+    objects: Iterable[Dict[str, Any]], namespace: str = "default"
+) -> List[Target]:
+    """Targets for the objects with a kind in `STATUS`, e.g. applied by a stage."""
+    return [
+        Target(
+            obj["apiVersion"],
+            obj["kind"],
+            name=obj["metadata"]["name"],
+            namespace=(
+                None
+                if obj["kind"] == "CustomResourceDefinition"
+                else obj["metadata"].get("namespace", namespace)
+            ),
+        )
+        for obj in objects
+        if obj["kind"] in STATUS
+    ]
+
+
+class ReadinessProgress:
+    """Shows the targets still being waited for and how long the wait took."""
+
+    def __init__(self, targets: List[Target], prefix: str = "kubernetes"):
+        self.prefix = prefix
+        self.start_time = time.time()
+        self.total = len(targets)
+        self.pending: Dict[str, str] = {str(target): "" for target in targets}
+        self._lock = threading.Lock()
+        self._live: Optional[Live] = None
+
+    def __enter__(self):
+        console = rich.get_console()
+        if console.is_terminal:
+            live = Live(self, console=console, refresh_per_second=2, transient=True)
+            try:
+                live.start()
+                self._live = live
+            except LiveError:
+                # another stage deployed in parallel already shows its progress
+                pass
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+
+    def _print(self, message: str):
+        if self._live is not None:
+            self._live.console.print(f"[{self.prefix}]: {message}", markup=False)
+        else:
+            print(f"[{self.prefix}]: {message}", flush=True)
+
+    def update(self, target: Target, status: Optional[str]):
+        with self._lock:
+            if str(target) not in self.pending:
+                return
+            if status is not None:
+                self.pending[str(target)] = status
+                return
+            del self.pending[str(target)]
+        self._print(f"{target} ready after {time.time() - self.start_time:.0f}s")
+
+    def __rich__(self):
+        with self._lock:
+            pending = list(self.pending.items())
+
+        table = Table(box=None, show_header=False, padding=(0, 1))
+        for name, status in pending[:NUM_PENDING]:
+            table.add_row(Text(name), Text(status))
+        return Group(
+            Text(
+                f"[{self.prefix}]: {self.total - len(pending)}/{self.total} ready, "
+                f"waiting for {time.time() - self.start_time:.0f}s"
+            ),
+            table,
+        )
+
+
+def _wait_until_ready(
+    resolver: kubernetes.ResourceResolver,
+    target: Target,
+    deadline: float,
+    progress: ReadinessProgress,
+) -> Optional[str]:
+    selectors = {
+        "namespace": target.namespace,
+        "label_selector": target.label_selector,
+        "field_selector": f"metadata.name={target.name}" if target.name else None,
+    }
+
+    status: Optional[str] = "waiting to be listed"
+    while True:
+        watcher = watch.Watch()
+        try:
+            resource = resolver.get(target.api_version, target.kind)
+            dynamic_client = resolver.dynamic_client
+
+            # list first, the watch then starts from the listed resource version
+            listed = dynamic_client.get(resource, **selectors).to_dict()
+            objects = {
+                obj["metadata"]["name"]: obj for obj in listed.get("items") or []
+            }
+            resource_version = listed["metadata"]["resourceVersion"]
+            status = target.current_status(objects)
+            progress.update(target, status)
+
+            while status is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return status
+                # the server closes the watch after the timeout
+                num_events = 0
+                for event in dynamic_client.watch(
+                    resource,
+                    resource_version=resource_version,
+                    timeout=max(1, int(remaining)),
+                    watcher=watcher,
+                    **selectors,
+                ):
+                    num_events += 1
+                    obj = event["raw_object"]
+                    resource_version = obj["metadata"]["resourceVersion"]
+                    if event["type"] == "BOOKMARK":
+                        continue
+                    elif event["type"] == "DELETED":
+                        objects.pop(obj["metadata"]["name"], None)
+                    else:
+                        objects[obj["metadata"]["name"]] = obj
+                    status = target.current_status(objects)
+                    progress.update(target, status)
+                    if status is None:
+                        watcher.stop()
+                if status is not None and not num_events:
+                    # closed early, e.g. by a dropped connection
+                    _retry_delay(deadline)
+            return None
+        except client.rest.ApiException as e:
+            if e.status != 410 and e.status < 500:
+                raise
+            # the resource version is too old to resume from, or the
+            # API server is temporarily unavailable
+            logger.debug(f"watch of {target} failed with {e.status}, listing again")
+        except (ResourceNotFoundError, urllib3.exceptions.HTTPError) as e:
+            # a kind not served yet or a dropped connection
+            logger.debug(f"watch of {target} failed with {e!r}, listing again")
+        finally:
+            watcher.stop()
+
+        if deadline - time.monotonic() <= 0:
+            return status
+        _retry_delay(deadline)
+
+
+def _retry_delay(deadline: float):
+    time.sleep(max(0, min(WATCH_RETRY_DELAY, deadline - time.monotonic())))
+
+
+def wait_until_ready(
+    k8s_client: client.ApiClient,
+    targets: List[Target],
+    timeout: float = READY_TIMEOUT,
+    resolver: Optional[kubernetes.ResourceResolver] = None,
+) -> Dict[Target, str]:
+    """Watch all `targets` concurrently until each is ready or `timeout` passes.
+
+    The timeout is a single deadline shared by all targets. Returns the
+    status of each target which did not become ready, empty when all did.
+    """
+    if not targets:
+        return {}
+
+    resolver = resolver or kubernetes.ResourceResolver(k8s_client)
+    deadline = time.monotonic() + timeout
+    not_ready = {}
+    with (
+        timer(logger, "kubernetes wait", category="kubernetes", objects=len(targets)),
+        ReadinessProgress(targets) as progress,
+    ):
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(targets), READY_MAX_WORKERS)
+        ) as executor:
+            futures = {
+                target: executor.submit(
+                    _wait_until_ready, resolver, target, deadline, progress
+                )
+                for target in targets
+            }
+            for target, future in futures.items():
+                try:
+                    status = future.result()
+                except ReadinessError as e:
+                    status = f"failed: {e}"
+                except client.rest.ApiException as e:
+                    status = f"({e.status}) {e.reason}"
+                except Exception as e:
+                    # one failing watch does not abort waiting for the others
+                    status = f"failed: {e!r}"
+                if status is not None:
+                    not_ready[target] = status
+    return not_ready
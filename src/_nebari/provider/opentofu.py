@@ -1,22 +1,45 @@
 import contextlib
-import io
+import hashlib
 import json
 import logging
-import platform
+import os
 import re
 import subprocess
 import sys
 import tempfile
-import urllib.request
-import zipfile
+import threading
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from _nebari import constants
-from _nebari.utils import deep_merge, run_subprocess_cmd, timer
+from _nebari.provider import download
+from _nebari.provider.opentofu_progress import OpenTofuProgress
+from _nebari.utils import (
+    cache_directory,
+    deep_merge_into,
+    run_subprocess_cmd,
+    timer,
+)
 
 logger = logging.getLogger(__name__)
 
+# stored within the `.terraform` directory after a successful `tofu init`
+INIT_FINGERPRINT_FILENAME = "nebari-init-fingerprint"
+LOCK_FILENAME = ".terraform.lock.hcl"
+# holds the `import` blocks of a deploy with `batch_imports`
+IMPORTS_FILENAME = "_nebari_imports.tf.json"
+# render terraform JSON without indentation, for large deployments
+TF_JSON_COMPACT = os.getenv("NEBARI_TF_JSON_COMPACT", "").lower() in ("1", "true")
+# state written by the local backend, within the stage directory
+LOCAL_STATE_FILENAME = "terraform.tfstate"
+
+# insignificant whitespace between JSON tokens
+JSON_WHITESPACE = " \t\n\r"
+
+# the provider plugin cache is not safe for concurrent use, stages
+# deployed in parallel therefore initialize one at a time
+_INIT_LOCK = threading.Lock()
+
 
 class OpenTofuException(Exception):
     pass
@@ -30,6 +53,12 @@ def deploy(
     tofu_destroy: bool = False,
     input_vars: Dict[str, Any] = {},
     state_imports: List[Any] = [],
+    upgrade_providers: bool = False,
+    batch_imports: bool = False,
+    tofu_plan: bool = False,
+    tofu_progress: bool = False,
+    parallelism: Optional[int] = None,
+    refresh: bool = True,
 ):
     """Execute a given directory with OpenTofu infrastructure configuration.
 
@@ -51,6 +80,29 @@ def deploy(
 
       state_imports: (addr, id) pairs for iterate through and attempt
         to tofu import
+
+      upgrade_providers: whether to run `tofu init -upgrade` even
+        when the directory was initialized with the same configuration
+        default False
+
+      batch_imports: whether to import `state_imports` within `tofu
+        apply` using `import` blocks instead of running `tofu import`
+        for each of them default False. Addresses already in the state
+        are left out. Unlike `tofu import` the apply fails if a resource
+        to import does not exist
+
+      tofu_plan: whether to run `tofu plan` before `tofu apply` and
+        only apply the saved plan if it has changes default False
+
+      tofu_progress: whether to show the progress of `tofu plan`,
+        `tofu apply` and `tofu destroy` from their `-json` output and
+        report the time spent on each resource default False
+
+      parallelism: `-parallelism` of `tofu plan`, `tofu apply` and
+        `tofu destroy` default None for the opentofu default
+
+      refresh: whether `tofu plan`, `tofu apply` and `tofu destroy`
+        refresh the state first default True
     """
     with tempfile.NamedTemporaryFile(
         mode="w", encoding="utf-8", suffix=".tfvars.json"
@@ -59,63 +111,154 @@ def deploy(
         f.file.flush()
 
         if tofu_init:
-            init(directory)
-
-        if tofu_import:
-            for addr, id in state_imports:
-                tfimport(
-                    addr, id, directory=directory, var_files=[f.name], exist_ok=True
+            init(directory, force=upgrade_providers)
+
+        if tofu_import and batch_imports and tofu_apply:
+            # import blocks are only rendered for resources not in the state yet
+            state_imports = pending_imports(directory, state_imports)
+
+        def _apply():
+            if not tofu_plan:
+                apply(
+                    directory,
+                    var_files=[f.name],
+                    progress=tofu_progress,
+                    parallelism=parallelism,
+                    refresh=refresh,
                 )
+                return
+
+            with tempfile.TemporaryDirectory() as plan_directory:
+                plan_file = Path(plan_directory) / "nebari.tfplan"
+                if plan(
+                    directory,
+                    var_files=[f.name],
+                    out=plan_file,
+                    progress=tofu_progress,
+                    parallelism=parallelism,
+                    refresh=refresh,
+                ):
+                    apply(
+                        directory,
+                        plan_file=plan_file,
+                        progress=tofu_progress,
+                        parallelism=parallelism,
+                    )
+                else:
+                    logger.info(f"tofu plan directory={directory} has no changes")
+
+        if tofu_import and batch_imports and tofu_apply and state_imports:
+            imports_path = Path(directory or ".") / IMPORTS_FILENAME
+            imports_path.write_text(
+                tf_render_objects([Import(addr, id) for addr, id in state_imports])
+            )
+            try:
+                _apply()
+            finally:
+                imports_path.unlink()
+        else:
+            if tofu_import:
+                for addr, id in state_imports:
+                    tfimport(
+                        addr, id, directory=directory, var_files=[f.name], exist_ok=True
+                    )
 
-        if tofu_apply:
-            apply(directory, var_files=[f.name])
+            if tofu_apply:
+                _apply()
 
         if tofu_destroy:
-            destroy(directory, var_files=[f.name])
+            destroy(
+                directory,
+                var_files=[f.name],
+                progress=tofu_progress,
+                parallelism=parallelism,
+                refresh=refresh,
+            )
 
         return output(directory)
 
 
-def download_opentofu_binary(version=constants.OPENTOFU_VERSION):
-    os_mapping = {
-        "linux": "linux",
-        "win32": "windows",
-        "darwin": "darwin",
-        "freebsd": "freebsd",
-        "openbsd": "openbsd",
-        "solaris": "solaris",
-    }
-
-    architecture_mapping = {
-        "x86_64": "amd64",
-        "i386": "386",
-        "armv7l": "arm",
-        "aarch64": "arm64",
-        "arm64": "arm64",
-    }
-
-    download_url = f"https://github.com/opentofu/opentofu/releases/download/v{version}/tofu_{version}_{os_mapping[sys.platform]}_{architecture_mapping[platform.machine()]}.zip"
-
-    filename_directory = Path(tempfile.gettempdir()) / "opentofu" / version
-    filename_path = filename_directory / "tofu"
-
-    if not filename_path.is_file():
-        logger.info(
-            f"downloading and extracting opentofu binary from url={download_url} to path={filename_path}"
+def plan_changes(
+    directory,
+    input_vars: Dict[str, Any] = {},
+    tofu_init: bool = True,
+    upgrade_providers: bool = False,
+    parallelism: Optional[int] = None,
+    refresh: bool = True,
+) -> Dict[str, int]:
+    """Plan the given directory without applying it.
+
+    Returns the number of resources the plan would create, update,
+    replace and delete.
+    """
+    with tempfile.TemporaryDirectory() as plan_directory:
+        var_file = Path(plan_directory) / "nebari.tfvars.json"
+        var_file.write_text(json.dumps(input_vars))
+        plan_file = Path(plan_directory) / "nebari.tfplan"
+
+        if tofu_init:
+            init(directory, force=upgrade_providers)
+
+        if not plan(
+            directory,
+            var_files=[str(var_file)],
+            out=plan_file,
+            parallelism=parallelism,
+            refresh=refresh,
+        ):
+            return summarize_plan({})
+        return summarize_plan(show_plan(directory, plan_file))
+
+
+def drift(
+    directory,
+    input_vars: Dict[str, Any] = {},
+    tofu_init: bool = True,
+    parallelism: Optional[int] = None,
+) -> List[Dict[str, str]]:
+    """Resources of the given directory changed outside of tofu.
+
+    The directory is initialized without upgrading providers so that
+    they are taken from the lock file and the shared plugin cache. A
+    failing init or plan raises an `OpenTofuException`.
+    """
+    with tempfile.TemporaryDirectory() as plan_directory:
+        var_file = Path(plan_directory) / "nebari.tfvars.json"
+        var_file.write_text(json.dumps(input_vars))
+
+        if tofu_init:
+            init(directory, upgrade=False, exit_on_error=False)
+
+        return refresh_only_plan(
+            directory, var_files=[str(var_file)], parallelism=parallelism
         )
-        with urllib.request.urlopen(download_url) as f:
-            bytes_io = io.BytesIO(f.read())
-        download_file = zipfile.ZipFile(bytes_io)
-        download_file.extract("tofu", filename_directory)
 
-    filename_path.chmod(0o555)
-    return filename_path
 
+def download_opentofu_binary(version=constants.OPENTOFU_VERSION):
+    return download.download_binary("tofu", version)
 
-def run_tofu_subprocess(processargs, exit_on_error=True, **kwargs):
+
+def plugin_cache_dir() -> Path:
+    """Provider plugin cache shared by all stages and deployments.
+
+    An existing `TF_PLUGIN_CACHE_DIR` environment variable takes precedence.
+    """
+    if os.environ.get("TF_PLUGIN_CACHE_DIR"):
+        return Path(os.environ["TF_PLUGIN_CACHE_DIR"])
+    return cache_directory("opentofu", "plugin-cache")
+
+
+def _run_tofu_subprocess(processargs, **kwargs):
     tofu_path = download_opentofu_binary()
     logger.info(f" tofu at {tofu_path}")
-    exit_code, output = run_subprocess_cmd([tofu_path] + processargs, **kwargs)
+    kwargs.setdefault(
+        "env", {**os.environ, "TF_PLUGIN_CACHE_DIR": str(plugin_cache_dir())}
+    )
+    return run_subprocess_cmd([tofu_path] + processargs, **kwargs)
+
+
+def run_tofu_subprocess(processargs, exit_on_error=True, **kwargs):
+    exit_code, output = _run_tofu_subprocess(processargs, **kwargs)
     if exit_code != 0:
         if exit_on_error:
             logger.error("Error: OpenTofu command failed")
@@ -133,39 +276,255 @@ def version():
     return re.search(r"(\d+)\.(\d+).(\d+)", version_output).group(0)
 
 
-def init(directory=None, upgrade=True):
+def init_fingerprint(directory=None) -> str:
+    """Hash of everything `tofu init` depends on within `directory`.
+
+    Covers the opentofu version, the dependency lock file and the
+    configuration files declaring the backend, providers and modules.
+    """
+    directory = Path(directory or ".")
+    fingerprint = hashlib.sha256(constants.OPENTOFU_VERSION.encode("utf8"))
+    for root, dirs, filenames in os.walk(directory):
+        dirs[:] = sorted(_ for _ in dirs if _ != ".terraform")
+        for filename in sorted(filenames):
+            if not (
+                filename == LOCK_FILENAME
+                or filename.endswith(".tf")
+                or filename.endswith(".tf.json")
+            ):
+                continue
+            path = Path(root) / filename
+            fingerprint.update(str(path.relative_to(directory)).encode("utf8"))
+            fingerprint.update(path.read_bytes())
+    return fingerprint.hexdigest()
+
+
+def init(directory=None, upgrade=True, force=False, exit_on_error=True):
+    """Run `tofu init` unless `directory` is already initialized.
+
+    The init is skipped when the `.terraform` directory, lock file and
+    configuration are unchanged since the last successful init in
+    `directory`. Set `force` to always run it, e.g. to upgrade providers.
+    A failing init exits unless `exit_on_error` is False, then it raises
+    an `OpenTofuException`.
+    """
+    fingerprint_path = Path(directory or ".") / ".terraform" / INIT_FINGERPRINT_FILENAME
+    fingerprint = init_fingerprint(directory)
+    if (
+        not force
+        and fingerprint_path.is_file()
+        and fingerprint_path.read_text() == fingerprint
+    ):
+        logger.info(f"tofu init directory={directory} up to date, skipping")
+        return
+
     logger.info(f"tofu init directory={directory}")
-    with timer(logger, "tofu init"):
+    with _INIT_LOCK, timer(logger, "tofu init", category="tofu", directory=directory):
         command = ["init"]
         if upgrade:
             command.append("-upgrade")
-        run_tofu_subprocess(command, cwd=directory, prefix="tofu")
+        run_tofu_subprocess(
+            command, exit_on_error=exit_on_error, cwd=directory, prefix="tofu"
+        )
 
+    # init may have created or updated the lock file
+    fingerprint_path.parent.mkdir(exist_ok=True)
+    fingerprint_path.write_text(init_fingerprint(directory))
 
-def apply(directory=None, targets=None, var_files=None):
-    targets = targets or []
+
+@contextlib.contextmanager
+def progress_view(directory, operation: str, enabled: bool = True):
+    """Yield the extra arguments and subprocess options to follow `operation`.
+
+    When enabled tofu is run with `-json` and its event stream is shown as
+    a progress view. A report of the time spent on each resource is then
+    written to `.terraform/nebari-<operation>-report.json` of `directory`.
+    """
+    if not enabled:
+        yield [], {}
+        return
+
+    progress = OpenTofuProgress(directory, operation)
+    try:
+        with progress:
+            yield ["-json"], {"stdout_callback": progress.handle_line}
+    finally:
+        progress.write(
+            Path(directory or ".") / ".terraform" / f"nebari-{operation}-report.json"
+        )
+
+
+def tofu_options(parallelism: Optional[int] = None, refresh: bool = True) -> List[str]:
+    options = []
+    if parallelism is not None:
+        options.append(f"-parallelism={parallelism}")
+    if not refresh:
+        options.append("-refresh=false")
+    return options
+
+
+def plan(
+    directory=None,
+    var_files=None,
+    out=None,
+    progress=False,
+    parallelism=None,
+    refresh=True,
+) -> bool:
+    """Run `tofu plan`, saving the plan to `out`, and return whether it has changes."""
     var_files = var_files or []
 
-    logger.info(f"tofu apply directory={directory} targets={targets}")
+    logger.info(f"tofu plan directory={directory}")
+    with progress_view(directory, "plan", progress) as (args, kwargs):
+        command = (
+            ["plan", "-input=false", "-detailed-exitcode"]
+            + args
+            + tofu_options(parallelism, refresh)
+            + (["-out=" + str(out)] if out else [])
+            + ["-var-file=" + _ for _ in var_files]
+        )
+        with timer(logger, "tofu plan", category="tofu", directory=directory):
+            # -detailed-exitcode exits with 2 when the plan has changes
+            exit_code, _ = _run_tofu_subprocess(
+                command, cwd=directory, prefix="tofu", **kwargs
+            )
+    if exit_code not in (0, 2):
+        logger.error("Error: OpenTofu command failed")
+        sys.exit(1)
+    has_changes: bool = exit_code == 2
+    return has_changes
+
+
+def refresh_only_plan(
+    directory=None, var_files=None, parallelism=None
+) -> List[Dict[str, str]]:
+    """Run `tofu plan -refresh-only` and return the drifted resources.
+
+    Each drifted resource is returned with its address and the action
+    (update or delete) that brought the state in line with it. Raises
+    `OpenTofuException` when the plan fails.
+    """
+    var_files = var_files or []
+    drifted = []
+    errors = []
+
+    def handle_line(line: bytes):
+        try:
+            event = json.loads(line)
+        except ValueError:
+            return
+        if not isinstance(event, dict):
+            return
+        if event.get("type") == "resource_drift":
+            change = event.get("change", {})
+            drifted.append(
+                {
+                    "address": change.get("resource", {}).get("addr"),
+                    "action": change.get("action"),
+                }
+            )
+        elif event.get("type") == "diagnostic":
+            diagnostic = event.get("diagnostic", {})
+            if diagnostic.get("severity") == "error":
+                errors.append(diagnostic.get("summary", ""))
+
+    logger.info(f"tofu plan -refresh-only directory={directory}")
+    # only reads the state, do not hold the lock a deploy may be waiting on
     command = (
-        ["apply", "-auto-approve"]
-        + ["-target=" + _ for _ in targets]
+        ["plan", "-refresh-only", "-input=false", "-detailed-exitcode", "-json"]
+        + ["-lock=false"]
+        + tofu_options(parallelism)
         + ["-var-file=" + _ for _ in var_files]
     )
-    with timer(logger, "tofu apply"):
-        run_tofu_subprocess(command, cwd=directory, prefix="tofu")
+    with timer(logger, "tofu plan -refresh-only", category="tofu", directory=directory):
+        exit_code, _ = _run_tofu_subprocess(
+            command, cwd=directory, prefix="tofu", stdout_callback=handle_line
+        )
+    if exit_code not in (0, 2):
+        raise OpenTofuException(
+            "OpenTofu refresh-only plan failed: " + "; ".join(errors)
+        )
+    return drifted
+
+
+def show_plan(directory=None, plan_file=None) -> dict:
+    logger.info(f"tofu show directory={directory} plan={plan_file}")
+    command = ["show", "-json", str(plan_file)]
+    with timer(logger, "tofu show", category="tofu", directory=directory):
+        with run_tofu_subprocess(
+            command,
+            cwd=directory,
+            prefix="tofu",
+            strip_errors=True,
+            capture_output=True,
+        ) as output:
+            plan: dict = json.loads(output.getvalue())
+    return plan
+
+
+def summarize_plan(plan: dict) -> Dict[str, int]:
+    """Count the resource changes of a plan from `tofu show -json`."""
+    summary = {"create": 0, "update": 0, "replace": 0, "delete": 0}
+    for resource_change in plan.get("resource_changes", []):
+        actions = resource_change["change"]["actions"]
+        if sorted(actions) == ["create", "delete"]:
+            summary["replace"] += 1
+        elif actions[0] in summary:
+            summary[actions[0]] += 1
+    return summary
+
+
+def format_changes(changes: Dict[str, int]) -> str:
+    return ", ".join(f"{count} to {action}" for action, count in changes.items())
+
+
+def apply(
+    directory=None,
+    targets=None,
+    var_files=None,
+    plan_file=None,
+    progress=False,
+    parallelism=None,
+    refresh=True,
+):
+    targets = targets or []
+    var_files = var_files or []
+
+    logger.info(f"tofu apply directory={directory} targets={targets}")
+    with progress_view(directory, "apply", progress) as (args, kwargs):
+        if plan_file is not None:
+            # variables, targets and refresh are part of the saved plan
+            command = (
+                ["apply", "-auto-approve"]
+                + args
+                + tofu_options(parallelism)
+                + [str(plan_file)]
+            )
+        else:
+            command = (
+                ["apply", "-auto-approve"]
+                + args
+                + tofu_options(parallelism, refresh)
+                + ["-target=" + _ for _ in targets]
+                + ["-var-file=" + _ for _ in var_files]
+            )
+        with timer(logger, "tofu apply", category="tofu", directory=directory):
+            run_tofu_subprocess(command, cwd=directory, prefix="tofu", **kwargs)
 
 
 def output(directory=None):
-    tofu_path = download_opentofu_binary()
-
-    logger.info(f"tofu={tofu_path} output directory={directory}")
-    with timer(logger, "tofu output"):
-        return json.loads(
-            subprocess.check_output(
-                [tofu_path, "output", "-json"], cwd=directory
-            ).decode("utf8")[:-1]
-        )
+    logger.info(f"tofu output directory={directory}")
+    command = ["output", "-json"]
+    with timer(logger, "tofu output", category="tofu", directory=directory):
+        with run_tofu_subprocess(
+            command,
+            exit_on_error=False,
+            cwd=directory,
+            prefix="tofu",
+            strip_errors=True,
+            capture_output=True,
+        ) as output:
+            return json.loads(output.getvalue())
 
 
 def tfimport(addr, id, directory=None, var_files=None, exist_ok=False):
@@ -174,7 +533,7 @@ def tfimport(addr, id, directory=None, var_files=None, exist_ok=False):
     logger.info(f"tofu import directory={directory} addr={addr} id={id}")
     command = ["import"] + ["-var-file=" + _ for _ in var_files] + [addr, id]
     logger.error(str(command))
-    with timer(logger, "tofu import"):
+    with timer(logger, "tofu import", category="tofu", directory=directory):
         try:
             run_tofu_subprocess(
                 command,
@@ -189,6 +548,40 @@ def tfimport(addr, id, directory=None, var_files=None, exist_ok=False):
                 raise e
 
 
+def pending_imports(directory=None, state_imports: List[Any] = []) -> List[Any]:
+    """Filter out `(addr, id)` pairs whose address is already in the state.
+
+    Avoids starting a provider for imports that are known to be no-ops.
+    All pairs are returned when the state cannot be read.
+    """
+    if not state_imports:
+        return []
+
+    try:
+        state = state_pull(directory)
+    except OpenTofuException:
+        return list(state_imports)
+
+    addresses = set()
+    for resource in state.get("resources", []):
+        if resource.get("mode") != "managed":
+            continue
+        prefix = f"{resource['module']}." if resource.get("module") else ""
+        address = f"{prefix}{resource['type']}.{resource['name']}"
+        for instance in resource.get("instances", []):
+            index_key = instance.get("index_key")
+            if index_key is None:
+                addresses.add(address)
+            else:
+                addresses.add(f"{address}[{json.dumps(index_key)}]")
+
+    pending = [(addr, id) for addr, id in state_imports if addr not in addresses]
+    logger.info(
+        f"{len(state_imports) - len(pending)} of {len(state_imports)} imports already in state directory={directory}"
+    )
+    return pending
+
+
 def show(directory=None, tofu_init: bool = True) -> dict:
 
     if tofu_init:
@@ -196,49 +589,124 @@ def show(directory=None, tofu_init: bool = True) -> dict:
 
     logger.info(f"tofu show directory={directory}")
     command = ["show", "-json"]
-    with timer(logger, "tofu show"):
+    with timer(logger, "tofu show", category="tofu", directory=directory):
         try:
-            output = json.loads(
-                run_tofu_subprocess(
-                    command,
-                    exit_on_error=False,
-                    cwd=directory,
-                    prefix="tofu",
-                    strip_errors=True,
-                    capture_output=True,
-                )
-            )
-            return output
+            with run_tofu_subprocess(
+                command,
+                exit_on_error=False,
+                cwd=directory,
+                prefix="tofu",
+                strip_errors=True,
+                capture_output=True,
+            ) as output:
+                return json.loads(output.getvalue())
         except OpenTofuException as e:
             raise e
 
 
+def state_pull(directory=None) -> dict:
+    logger.info(f"tofu state pull directory={directory}")
+    command = ["state", "pull"]
+    with timer(logger, "tofu state pull", category="tofu", directory=directory):
+        with run_tofu_subprocess(
+            command,
+            exit_on_error=False,
+            cwd=directory,
+            prefix="tofu",
+            strip_errors=True,
+            capture_output=True,
+        ) as output:
+            state = output.getvalue()
+    # an empty state is returned as no output at all
+    if not state.strip():
+        return {}
+    pulled_state: dict = json.loads(state)
+    return pulled_state
+
+
+def iter_state(state: str) -> Iterator[Tuple[str, Any]]:
+    """Decode a raw state one top level field at a time.
+
+    Yields `(key, value)` pairs in the order they appear in `state`,
+    except for the `resources` list which is yielded as one
+    `("resource", resource)` pair per resource. Callers looking for a
+    single resource can stop early without decoding the remaining ones.
+    """
+    decoder = json.JSONDecoder()
+
+    def token(index: int) -> Tuple[str, int]:
+        while index < len(state) and state[index] in JSON_WHITESPACE:
+            index += 1
+        return state[index : index + 1], index
+
+    char, index = token(0)
+    if not char:
+        return
+    if char != "{":
+        raise ValueError("state is not a JSON object")
+
+    char, index = token(index + 1)
+    while char != "}":
+        key, index = decoder.raw_decode(state, index)
+        char, index = token(index)
+        if char != ":":
+            raise ValueError(f"expected ':' after key={key} in state")
+        char, index = token(index + 1)
+
+        if key == "resources" and char == "[":
+            char, index = token(index + 1)
+            while char != "]":
+                resource, index = decoder.raw_decode(state, index)
+                yield "resource", resource
+                char, index = token(index)
+                if char == ",":
+                    char, index = token(index + 1)
+            index += 1
+        else:
+            value, index = decoder.raw_decode(state, index)
+            yield key, value
+
+        char, index = token(index)
+        if char == ",":
+            char, index = token(index + 1)
+
+
 def refresh(directory=None, var_files=None):
     var_files = var_files or []
 
     logger.info(f"tofu refresh directory={directory}")
     command = ["refresh"] + ["-var-file=" + _ for _ in var_files]
 
-    with timer(logger, "tofu refresh"):
+    with timer(logger, "tofu refresh", category="tofu", directory=directory):
         run_tofu_subprocess(command, cwd=directory, prefix="tofu")
 
 
-def destroy(directory=None, targets=None, var_files=None):
+def destroy(
+    directory=None,
+    targets=None,
+    var_files=None,
+    progress=False,
+    parallelism=None,
+    refresh=True,
+):
     targets = targets or []
     var_files = var_files or []
 
     logger.info(f"tofu destroy directory={directory} targets={targets}")
-    command = (
-        [
-            "destroy",
-            "-auto-approve",
-        ]
-        + ["-target=" + _ for _ in targets]
-        + ["-var-file=" + _ for _ in var_files]
-    )
+    with progress_view(directory, "destroy", progress) as (args, kwargs):
+        command = (
+            [
+                "destroy",
+                "-auto-approve",
+            ]
+            + args
+            + tofu_options(parallelism, refresh)
+            + ["-target=" + _ for _ in targets]
+            + ["-var-file=" + _ for _ in var_files]
+        )
 
-    with timer(logger, "tofu destroy"):
-        run_tofu_subprocess(command, cwd=directory, prefix="tofu")
+        with timer(logger, "tofu destroy", category="tofu", directory=directory):
+            run_tofu_subprocess(command, cwd=directory, prefix="tofu", **kwargs)
 
 
 def rm_local_state(directory=None):
@@ -264,6 +732,8 @@ def tf_context(filename):
 
 
 _TF_OBJECTS = {}
+# stages are rendered concurrently, each registering its objects
+_TF_OBJECTS_LOCK = threading.Lock()
 
 
 def tf_clear():
@@ -271,20 +741,29 @@ def tf_clear():
     _TF_OBJECTS = {}
 
 
-def tf_render():
+def tf_dumps(content: Dict[str, Any], compact: Optional[bool] = None) -> str:
+    if compact is None:
+        compact = TF_JSON_COMPACT
+    if compact:
+        return json.dumps(content, separators=(",", ":"))
+    return json.dumps(content, indent=4)
+
+
+def tf_render(compact: Optional[bool] = None):
     global _TF_OBJECTS
-    return json.dumps(_TF_OBJECTS, indent=4)
+    return tf_dumps(_TF_OBJECTS, compact)
 
 
-def tf_render_objects(terraform_objects):
-    return json.dumps(deep_merge(*terraform_objects), indent=4)
+def tf_render_objects(terraform_objects, compact: Optional[bool] = None):
+    return tf_dumps(deep_merge_into({}, *terraform_objects), compact)
 
 
 def register(f):
     def wrapper(*args, **kwargs):
         global _TF_OBJECTS
         obj = f(*args, **kwargs)
-        _TF_OBJECTS = deep_merge(_TF_OBJECTS, obj)
+        with _TF_OBJECTS_LOCK:
+            deep_merge_into(_TF_OBJECTS, obj)
         return obj
 
     return wrapper
@@ -328,3 +807,8 @@ def Resource(_resource_type, _name, **kwargs):
 @register
 def Output(_name, **kwargs):
     return {"output": {_name: kwargs}}
+
+
+@register
+def Import(_to, _id, **kwargs):
+    return {"import": [{"to": _to, "id": _id, **kwargs}]}
@@ -0,0 +1,182 @@
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import rich
+from rich.console import Group
+from rich.errors import LiveError
+from rich.live import Live
+from rich.table import Table
+from rich.text import Text
+
+logger = logging.getLogger(__name__)
+
+# number of in-flight resources shown in the progress view
+NUM_IN_FLIGHT = 5
+
+
+class OpenTofuProgress:
+    """Follows the `-json` event stream of a tofu plan, apply or destroy.
+
+    Shows the number of resources done out of the planned total and the
+    longest running in-flight resources, and records how long each
+    resource took. Use as a context manager and pass each line of the
+    tofu output to `handle_line`.
+    """
+
+    def __init__(self, directory: str, operation: str, prefix: str = "tofu"):
+        self.directory = directory
+        self.operation = operation
+        self.prefix = prefix
+        self.start_time = time.time()
+        # planned total from the change summary, until then the number
+        # of planned changes seen so far
+        self.total: Optional[int] = None
+        self.planned = 0
+        self.in_flight: Dict[str, Dict[str, Any]] = {}
+        self.resources: Dict[str, Dict[str, Any]] = {}
+        self.diagnostics: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._live: Optional[Live] = None
+
+    def __enter__(self):
+        console = rich.get_console()
+        if console.is_terminal:
+            live = Live(self, console=console, refresh_per_second=2, transient=True)
+            try:
+                live.start()
+                self._live = live
+            except LiveError:
+                # another stage deployed in parallel already shows its progress
+                pass
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+        self.print_summary()
+
+    def _print(self, message: str):
+        if self._live is not None:
+            self._live.console.print(f"[{self.prefix}]: {message}", markup=False)
+        else:
+            print(f"[{self.prefix}]: {message}", flush=True)
+
+    def handle_line(self, line: bytes):
+        try:
+            event = json.loads(line)
+        except ValueError:
+            self._print(line.decode("utf-8", errors="replace").rstrip())
+            return
+        if not isinstance(event, dict):
+            return
+
+        event_type = event.get("type")
+        hook = event.get("hook", {})
+        address = hook.get("resource", {}).get("addr")
+
+        with self._lock:
+            if event_type == "planned_change":
+                self.planned += 1
+            elif event_type == "change_summary":
+                changes = event.get("changes", {})
+                self.total = (
+                    changes.get("add", 0)
+                    + changes.get("change", 0)
+                    + changes.get("remove", 0)
+                )
+            elif event_type == "apply_start":
+                self.in_flight[address] = {
+                    "action": hook.get("action"),
+                    "start": time.time(),
+                }
+            elif event_type in ("apply_complete", "apply_errored"):
+                started = self.in_flight.pop(address, {})
+                elapsed = hook.get("elapsed_seconds")
+                if elapsed is None and started:
+                    elapsed = time.time() - started["start"]
+                self.resources[address] = {
+                    "action": hook.get("action", started.get("action")),
+                    "duration": elapsed,
+                    "status": (
+                        "complete" if event_type == "apply_complete" else "errored"
+                    ),
+                }
+            elif event_type == "diagnostic":
+                self.diagnostics.append(event.get("diagnostic", {}))
+
+        if event_type == "diagnostic":
+            diagnostic = event.get("diagnostic", {})
+            self._print(
+                f"{diagnostic.get('severity', 'info').capitalize()}: {diagnostic.get('summary', '')}"
+            )
+            if diagnostic.get("detail"):
+                self._print(diagnostic["detail"])
+        elif self._live is None or event_type in ("apply_errored", "change_summary"):
+            # without a live view keep the log similar to the human output
+            if event.get("@message") and event_type not in ("apply_progress", "log"):
+                self._print(event["@message"])
+
+    def __rich__(self):
+        with self._lock:
+            done = len(self.resources)
+            in_flight = sorted(
+                self.in_flight.items(), key=lambda item: item[1]["start"]
+            )
+
+        total = self.total if self.total is not None else self.planned or "?"
+        table = Table(box=None, show_header=False, padding=(0, 1))
+        now = time.time()
+        for address, resource in in_flight[:NUM_IN_FLIGHT]:
+            table.add_row(
+                f"{now - resource['start']:.0f}s",
+                resource["action"] or "",
+                Text(address),
+            )
+        return Group(
+            Text(
+                f"[{self.prefix}]: {self.directory} {self.operation} "
+                f"{done}/{total} resources done, {len(in_flight)} in progress"
+            ),
+            table,
+        )
+
+    def report(self) -> Dict[str, Any]:
+        resources = sorted(
+            (
+                {"address": address, **resource}
+                for address, resource in self.resources.items()
+            ),
+            key=lambda resource: -(resource["duration"] or 0),
+        )
+        return {
+            "directory": str(self.directory),
+            "operation": self.operation,
+            "duration": time.time() - self.start_time,
+            "total": self.total,
+            "resources": resources,
+            "in_flight": sorted(self.in_flight),
+            "diagnostics": self.diagnostics,
+        }
+
+    def print_summary(self):
+        slowest = [
+            resource for resource in self.report()["resources"] if resource["duration"]
+        ][:NUM_IN_FLIGHT]
+        if slowest:
+            self._print(
+                "slowest resources: "
+                + ", ".join(
+                    f"{resource['address']} ({resource['duration']:.0f}s)"
+                    for resource in slowest
+                )
+            )
+
+    def write(self, filename: Path):
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        with filename.open("w") as f:
+            json.dump(self.report(), f, indent=4)
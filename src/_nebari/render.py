@@ -1,22 +1,40 @@
+import concurrent.futures
 import hashlib
+import json
+import logging
+import os
 import pathlib
 import shutil
 import sys
-from typing import Dict, List
+import time
+from typing import Any, Dict, List, Optional
 
 from rich import print
 from rich.table import Table
 
 from _nebari.deprecate import DEPRECATED_FILE_PATHS
+from _nebari.utils import timer
 from nebari import hookspecs, schema
 
+logger = logging.getLogger(__name__)
+
+# index of the output files written by the last render, within the output directory
+MANIFEST_FILENAME = ".nebari-render-manifest.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
 
 def render_template(
     output_directory: pathlib.Path,
     config: schema.Main,
     stages: List[hookspecs.NebariStage],
     dry_run=False,
+    max_workers: Optional[int] = None,
+    show_render_times: bool = False,
 ):
+    """Render all stages to `output_directory` and write the changed files.
+
+    Stages are rendered concurrently on up to `max_workers` threads.
+    """
     output_directory = pathlib.Path(output_directory).resolve()
     if output_directory == pathlib.Path.home():
         print("ERROR: Deploying Nebari in home directory is not advised!")
@@ -26,12 +44,36 @@ def render_template(
     # into it in remove_existing_renders
     output_directory.mkdir(exist_ok=True, parents=True)
 
+    def _render_stage(stage):
+        start_time = time.time()
+        with timer(logger, f"render stage={stage.name}", category="stage"):
+            stage_contents = stage(
+                output_directory=output_directory, config=config
+            ).render()
+        return stage_contents, time.time() - start_time
+
+    start_time = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        rendered = list(executor.map(_render_stage, stages))
+
+    # merged in stage order, later stages override the files of earlier
+    # ones just as when rendered one after another
     contents = {}
-    for stage in stages:
-        contents.update(
-            stage(output_directory=output_directory, config=config).render()
-        )
+    render_times = {}
+    for stage, (stage_contents, duration) in zip(stages, rendered):
+        contents.update(stage_contents)
+        render_times[stage.name] = duration
+
+    if show_render_times:
+        table = Table("Stage", "Render time", style="deep_sky_blue1")
+        for stage_name, duration in sorted(
+            render_times.items(), key=lambda item: -item[1]
+        ):
+            table.add_row(stage_name, f"{duration:.2f}s")
+        table.add_row("Total", f"{time.time() - start_time:.2f}s", style="bold")
+        print(table)
 
+    manifest = read_manifest(output_directory)
     new, untracked, updated, deleted = inspect_files(
         output_base_dir=output_directory,
         ignore_filenames=[
@@ -45,6 +87,7 @@ def render_template(
         ],
         deleted_paths=DEPRECATED_FILE_PATHS,
         contents=contents,
+        manifest=manifest,
     )
 
     if new:
@@ -79,11 +122,10 @@ def render_template(
             output_filename.parent.mkdir(parents=True, exist_ok=True)
 
             if isinstance(contents[filename], str):
-                with open(output_filename, "w") as f:
-                    f.write(contents[filename])
+                output_filename.write_text(contents[filename])
             else:
-                with open(output_filename, "wb") as f:
-                    f.write(contents[filename])
+                output_filename.write_bytes(contents[filename])
+            manifest["files"].pop(str(filename), None)
 
         for path in deleted:
             abs_path = (output_directory / path).resolve()
@@ -98,13 +140,16 @@ def render_template(
             elif abs_path.is_dir():
                 shutil.rmtree(abs_path)
 
+        write_manifest(output_directory, manifest)
+
 
 def inspect_files(
     output_base_dir: pathlib.Path,
-    ignore_filenames: List[str] = None,
-    ignore_directories: List[str] = None,
-    deleted_paths: List[pathlib.Path] = None,
-    contents: Dict[str, str] = None,
+    ignore_filenames: Optional[List[str]] = None,
+    ignore_directories: Optional[List[str]] = None,
+    deleted_paths: Optional[List[pathlib.Path]] = None,
+    contents: Optional[Dict[pathlib.Path, Any]] = None,
+    manifest: Optional[Dict[str, Any]] = None,
 ):
     """Return created, updated and untracked files by computing a checksum over the provided directory.
 
@@ -113,24 +158,58 @@ def inspect_files(
         ignore_filenames (list[str]): Filenames to ignore while comparing for changes
         ignore_directories (list[str]): Directories to ignore while comparing for changes
         deleted_paths (list[Path]): Paths that if exist in output directory should be deleted
-        contents (dict): filename to content mapping for dynamically generated files
+        contents (dict): path to content mapping for dynamically generated files
+        manifest (dict): size, mtime and digest of the output files from the last
+            render, see `read_manifest`. Files whose size and mtime did not change
+            are not hashed again. Updated in place with the current output files.
     """
-    ignore_filenames = ignore_filenames or []
+    ignore_filenames = (ignore_filenames or []) + [MANIFEST_FILENAME]
     ignore_directories = ignore_directories or []
+    deleted_paths = deleted_paths or []
     contents = contents or {}
+    manifest = manifest if manifest is not None else {"files": {}}
 
-    source_files = {}
-    output_files = {}
+    # by path relative to the output directory, the manifest is keyed by
+    # the same paths as strings
+    source_files: Dict[pathlib.Path, str] = {}
+    output_files: Dict[pathlib.Path, str] = {}
+    previous_files = manifest.get("files", {})
+    # files modified in the same instant the manifest was written may have
+    # changed after they were hashed, they are hashed again
+    written_ns = manifest.get("written_ns", 0)
+    current_files = {}
 
     def list_files(
         directory: pathlib.Path,
         ignore_filenames: List[str],
         ignore_directories: List[str],
     ):
-        for path in directory.rglob("*"):
-            if not path.is_file():
-                continue
-            yield path
+        for root, dirs, filenames in os.walk(directory):
+            # prune ignored directories instead of walking them
+            dirs[:] = [_ for _ in dirs if _ not in ignore_directories]
+            for filename in filenames:
+                if filename in ignore_filenames:
+                    continue
+                yield pathlib.Path(root) / filename
+
+    def output_digest(path: pathlib.Path, relative_path: pathlib.Path):
+        stat = path.stat()
+        entry = previous_files.get(str(relative_path))
+        if (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+            and stat.st_mtime_ns < written_ns
+        ):
+            digest = entry["digest"]
+        else:
+            digest = hash_file(path)
+        current_files[str(relative_path)] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "digest": digest,
+        }
+        return digest
 
     for filename in contents:
         if isinstance(contents[filename], str):
@@ -140,10 +219,6 @@ def inspect_files(
         else:
             source_files[filename] = hashlib.sha256(contents[filename]).hexdigest()
 
-        output_filename = pathlib.Path(output_base_dir) / filename
-        if output_filename.is_file():
-            output_files[filename] = hash_file(filename)
-
     deleted_files = set()
     for path in deleted_paths:
         absolute_path = output_base_dir / path
@@ -155,7 +230,15 @@ def inspect_files(
             pathlib.Path(filename), output_base_dir
         )
         if filename.is_file():
-            output_files[relative_path] = hash_file(filename)
+            output_files[relative_path] = output_digest(filename, relative_path)
+
+    # rendered files within ignored directories or with ignored names
+    for filename in source_files.keys() - output_files.keys():
+        output_filename = pathlib.Path(output_base_dir) / filename
+        if output_filename.is_file():
+            output_files[filename] = output_digest(output_filename, filename)
+
+    manifest["files"] = current_files
 
     new_files = source_files.keys() - output_files.keys()
     untracted_files = output_files.keys() - source_files.keys()
@@ -168,11 +251,30 @@ def inspect_files(
     return new_files, untracted_files, updated_files, deleted_files
 
 
-def hash_file(file_path: str):
+def read_manifest(output_directory: pathlib.Path) -> Dict[str, Any]:
+    """Index of the output files written by the last render."""
+    try:
+        with (output_directory / MANIFEST_FILENAME).open() as f:
+            manifest: Dict[str, Any] = json.load(f)
+            return manifest
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"files": {}}
+
+
+def write_manifest(output_directory: pathlib.Path, manifest: Dict[str, Any]):
+    manifest["written_ns"] = time.time_ns()
+    with (output_directory / MANIFEST_FILENAME).open("w") as f:
+        json.dump(manifest, f)
+
+
+def hash_file(file_path: pathlib.Path) -> str:
     """Get the hex digest of the given file.
 
     Args:
-        file_path (str): path to file
+        file_path (Path): path to file
     """
+    digest = hashlib.sha256()
     with open(file_path, "rb") as f:
-        return hashlib.sha256(f.read()).hexdigest()
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,86 @@
+import concurrent.futures
+import logging
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Type
+
+from nebari import hookspecs
+
+logger = logging.getLogger(__name__)
+
+
+def stage_dependencies(
+    stages: List[Type[hookspecs.NebariStage]],
+) -> Dict[str, Set[str]]:
+    """Map each stage name to the names of the stages it must run after.
+
+    Stages without `depends_on` depend on every stage before them.
+    Dependencies on stages which are not part of `stages` (e.g. excluded
+    via `--exclude-stage`) are ignored.
+    """
+    names = [stage.name for stage in stages]
+    dependencies = {}
+    for index, stage in enumerate(stages):
+        if stage.depends_on is None:
+            dependencies[stage.name] = set(names[:index])
+            continue
+
+        stage_names = set()
+        for key in stage.depends_on:
+            name = key.removeprefix("stages/")
+            if name not in names:
+                continue
+            if names.index(name) >= index:
+                raise ValueError(
+                    f"Stage={stage.name} depends on stage={name} which does not run before it"
+                )
+            stage_names.add(name)
+        dependencies[stage.name] = stage_names
+    return dependencies
+
+
+def run_stages(
+    stages: List[Type[hookspecs.NebariStage]],
+    run: Callable[[Type[hookspecs.NebariStage]], Any],
+    max_workers: int = 1,
+) -> Iterator[Tuple[Type[hookspecs.NebariStage], Any]]:
+    """Call `run(stage)` for each stage once all its dependencies have finished.
+
+    Yields `(stage, result)` pairs in completion order. With
+    `max_workers=1` stages run one after another in priority order in
+    the calling thread. Otherwise independent stages run concurrently on
+    a thread pool. Once `run` raises no new stages are started and the
+    first exception is propagated after the stages in flight finish.
+    """
+    dependencies = stage_dependencies(stages)
+
+    if max_workers <= 1:
+        for stage in stages:
+            yield stage, run(stage)
+        return
+
+    pending = list(stages)
+    finished: Set[str] = set()
+    running: Dict[concurrent.futures.Future, Type[hookspecs.NebariStage]] = {}
+    error: Optional[BaseException] = None
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while (pending and error is None) or running:
+            for stage in list(pending if error is None else []):
+                if len(running) >= max_workers:
+                    break
+                if dependencies[stage.name] <= finished:
+                    logger.info(f"scheduling stage={stage.name}")
+                    pending.remove(stage)
+                    running[executor.submit(run, stage)] = stage
+
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                stage = running.pop(future)
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                finished.add(stage.name)
+                yield stage, future.result()
+
+    if error is not None:
+        raise error
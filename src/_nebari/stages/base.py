@@ -1,22 +1,47 @@
 import contextlib
+import hashlib
 import inspect
+import json
+import logging
 import os
 import pathlib
 import shutil
+import stat
 import sys
 import tempfile
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from jinja2 import Environment, FileSystemLoader
 from kubernetes import client, config
 from kubernetes.client.rest import ApiException
-
-from _nebari.provider import helm, kubernetes, kustomize, opentofu
+from ruamel.yaml import YAML
+
+from _nebari import constants
+from _nebari.provider import (
+    helm,
+    kubernetes,
+    kubernetes_apply,
+    kubernetes_readiness,
+    kustomize,
+    opentofu,
+)
 from _nebari.stages.tf_objects import NebariTerraformState
+from _nebari.utils import timer
 from nebari.hookspecs import NebariStage
 
+logger = logging.getLogger(__name__)
+
 KUSTOMIZATION_TEMPLATE = "kustomization.yaml.tmpl"
 
+# stored within the `.terraform` directory of each terraform stage
+STAGE_CACHE_FILENAME = "nebari-stage-cache.json"
+# files within a terraform stage directory managed by tofu itself
+TERRAFORM_STATE_FILENAMES = {
+    "terraform.tfstate",
+    "terraform.tfstate.backup",
+    ".terraform.tfstate.lock.info",
+}
+
 
 class NebariKustomizeStage(NebariStage):
     @property
@@ -33,6 +58,14 @@ class NebariKustomizeStage(NebariStage):
 
     failed_to_create = False
     error_message = ""
+    # objects which failed to apply during the last deploy
+    apply_errors: List[kubernetes_apply.ApplyError] = []
+    # seconds to wait for the applied workloads to be ready
+    ready_timeout = kubernetes_readiness.READY_TIMEOUT
+
+    # do not apply the stage, set by `nebari deploy --resume-from/--only`
+    # for stages before the one being resumed
+    restore_outputs: bool = False
 
     def _get_k8s_client(self, stage_outputs: Dict[str, Dict[str, Any]]):
         try:
@@ -74,10 +107,10 @@ class NebariKustomizeStage(NebariStage):
             )
             sys.exit(1)
 
-    def render(self) -> Dict[pathlib.Path, str]:
+    def render(self) -> Dict[pathlib.Path, bytes]:
         env = Environment(loader=FileSystemLoader(self.template_directory))
 
-        contents = {}
+        contents: Dict[pathlib.Path, bytes] = {}
         if not (self.template_directory / KUSTOMIZATION_TEMPLATE).exists():
             raise FileNotFoundError(
                 f"ERROR: After stage={self.name} "
@@ -85,24 +118,53 @@ class NebariKustomizeStage(NebariStage):
             )
         kustomize_template = env.get_template(KUSTOMIZATION_TEMPLATE)
         rendered_kustomization = kustomize_template.render(**self.kustomize_vars)
-        with open(self.template_directory / "kustomization.yaml", "w") as f:
-            f.write(rendered_kustomization)
+        # not the shared YAML instance, stages are rendered concurrently
+        kustomization = YAML(typ="safe").load(rendered_kustomization)
 
         with tempfile.TemporaryDirectory() as temp_dir:
+            # kustomize builds from a scratch copy of the template directory
+            # so that renders never modify the installed package and can
+            # run concurrently
+            build_dir = pathlib.Path(temp_dir) / "build"
+            shutil.copytree(
+                self.template_directory,
+                build_dir,
+                ignore=shutil.ignore_patterns(
+                    KUSTOMIZATION_TEMPLATE, "kustomization.yaml", "charts"
+                ),
+                copy_function=shutil.copyfile,
+            )
+            # copytree keeps the mode of directories, which are read-only
+            # when the package is installed read-only
+            for root, _, _ in os.walk(build_dir):
+                path = pathlib.Path(root)
+                path.chmod(path.stat().st_mode | stat.S_IWUSR)
+            (build_dir / "kustomization.yaml").write_text(rendered_kustomization)
+
+            # charts come from the chart cache rather than being pulled on every render
+            charts_dir = build_dir / "charts"
+            for chart in kustomization.get("helmCharts") or []:
+                if chart.get("repo") and chart.get("version"):
+                    helm.copy_cached_chart(
+                        chart["repo"], chart["name"], chart["version"], charts_dir
+                    )
+
+            manifests_dir = pathlib.Path(temp_dir) / "manifests"
+            manifests_dir.mkdir()
             kustomize.run_kustomize_subprocess(
                 [
                     "build",
                     "-o",
-                    f"{temp_dir}",
+                    f"{manifests_dir}",
                     "--enable-helm",
                     "--helm-command",
                     f"{helm.download_helm_binary()}",
-                    f"{self.template_directory}",
+                    f"{build_dir}",
                 ]
             )
 
-            # copy crds from the template directory to the temp directory
-            crds = self.template_directory.glob("charts/*/*/crds/*.yaml")
+            # copy crds from the charts to the stage directory
+            crds = charts_dir.glob("*/*/crds/*.yaml")
             for crd in crds:
                 with crd.open("rb") as f:
                     contents[
@@ -113,7 +175,7 @@ class NebariKustomizeStage(NebariStage):
                         )
                     ] = f.read()
 
-            for root, _, filenames in os.walk(temp_dir):
+            for root, _, filenames in os.walk(manifests_dir):
                 for filename in filenames:
                     root_filename = pathlib.Path(root) / filename
                     with root_filename.open("rb") as f:
@@ -122,17 +184,10 @@ class NebariKustomizeStage(NebariStage):
                                 self.stage_prefix,
                                 "manifests",
                                 pathlib.Path.relative_to(
-                                    pathlib.Path(root_filename), temp_dir
+                                    pathlib.Path(root_filename), manifests_dir
                                 ),
                             )
                         ] = f.read()
-            # cleanup generated kustomization.yaml
-            pathlib.Path(self.template_directory, "kustomization.yaml").unlink()
-
-            # clean up downloaded helm charts
-            charts_dir = pathlib.Path(self.template_directory, "charts")
-            if charts_dir.exists():
-                shutil.rmtree(charts_dir)
 
             return contents
 
@@ -143,6 +198,10 @@ class NebariKustomizeStage(NebariStage):
     def deploy(
         self, stage_outputs: Dict[str, Dict[str, Any]], disable_prompt: bool = False
     ):
+        if self.restore_outputs:
+            print(f"Stage={self.name} previously deployed, skipping")
+            yield
+            return
 
         print(f"Deploying kubernetes resources for {self.name}")
         # get the kubernetes client
@@ -157,30 +216,45 @@ class NebariKustomizeStage(NebariStage):
         # get the list of all the files in the manifests folder
         manifests = directory.glob("manifests/*.yaml")
 
-        # apply each crd to the kubernetes cluster in alphabetical order
-        for crd in sorted(crds):
-            print(f"CRD: {crd}")
-            try:
-                kubernetes.create_from_yaml(kubernetes_client, crd, apply=True)
-            except ApiException as e:
+        objects = []
+        for filename in sorted(crds) + sorted(manifests):
+            objects.extend(kubernetes_apply.load_objects(filename))
+
+        # API discovery is shared by the apply and the readiness watches
+        resolver = kubernetes.ResourceResolver(kubernetes_client)
+
+        # applied in phases, objects within a phase concurrently
+        print(f"Applying {len(objects)} kubernetes objects for {self.name}")
+        with timer(logger, "kubernetes apply", category="kubernetes", stage=self.name):
+            self.apply_errors = kubernetes_apply.apply_objects(
+                kubernetes_client,
+                objects,
+                namespace=self.config.namespace,
+                resolver=resolver,
+            )
+        if self.apply_errors:
+            self.failed_to_create = True
+            self.error_message = "\n".join(map(str, self.apply_errors))
+            for error in self.apply_errors:
+                print(f"Failed to apply {error}")
+        print(f"Applied kubernetes objects for {self.name}")
+
+        if not self.failed_to_create:
+            # later stages rely on the workloads of this stage
+            print(f"Waiting for kubernetes objects of {self.name} to be ready")
+            not_ready = kubernetes_readiness.wait_until_ready(
+                kubernetes_client,
+                kubernetes_readiness.targets(objects, namespace=self.config.namespace),
+                timeout=self.ready_timeout,
+                resolver=resolver,
+            )
+            if not_ready:
                 self.failed_to_create = True
-                self.error_message = str(e)
-            print(f"Applied CRD: {crd}")
-
-        # apply each manifest to the kubernetes cluster in alphabetical order
-        for manifest in sorted(manifests):
-            print(f"manifest: {manifest}")
-            try:
-                kubernetes.create_from_yaml(
-                    kubernetes_client,
-                    manifest,
-                    namespace=self.config.namespace,
-                    apply=True,
+                self.error_message = "\n".join(
+                    f"{target} not ready: {status}"
+                    for target, status in not_ready.items()
                 )
-            except ApiException as e:
-                self.failed_to_create = True
-                self.error_message = str(e)
-            print(f"Applied manifest: {manifest}")
+                print(self.error_message)
         yield
 
     @contextlib.contextmanager
@@ -205,13 +279,17 @@ class NebariKustomizeStage(NebariStage):
         # get the list of all the files in the manifests folder
         manifests = directory.glob("manifests/*.yaml")
 
+        resolver = kubernetes.ResourceResolver(kubernetes_client)
+
         # destroy each manifest in the reverse order
 
         for manifest in sorted(manifests, reverse=True):
 
             print(f"Destroyed manifest: {manifest}")
             try:
-                kubernetes.delete_from_yaml(kubernetes_client, manifest)
+                kubernetes.delete_from_yaml(
+                    kubernetes_client, manifest, resolver=resolver
+                )
             except ApiException as e:
                 self.error_message = str(e)
                 if not ignore_errors:
@@ -223,7 +301,7 @@ class NebariKustomizeStage(NebariStage):
 
             print(f"Destroyed CRD: {crd}")
             try:
-                kubernetes.delete_from_yaml(kubernetes_client, crd)
+                kubernetes.delete_from_yaml(kubernetes_client, crd, resolver=resolver)
             except ApiException as e:
                 self.error_message = str(e)
                 if not ignore_errors:
@@ -232,6 +310,38 @@ class NebariKustomizeStage(NebariStage):
 
 
 class NebariTerraformStage(NebariStage):
+    # skip `tofu apply` when the stage fingerprint matches the last
+    # successful deploy, `post_deploy` still runs, set by
+    # `nebari deploy --skip-unchanged`
+    skip_unchanged: bool = False
+    # restore the outputs of the last deploy instead of applying, set by
+    # `nebari deploy --resume-from/--only` for stages before the one
+    # being resumed
+    restore_outputs: bool = False
+    # run `tofu init -upgrade` even when the stage directory is already
+    # initialized, set by `nebari deploy --upgrade-providers`
+    upgrade_providers: bool = False
+    # import `state_imports` within the apply using `import` blocks, set
+    # by `nebari deploy --batch-imports`
+    batch_imports: bool = False
+    # run `tofu plan` first and only apply the saved plan if it has
+    # changes, set by `nebari deploy --plan-first`
+    plan_first: bool = False
+    # only plan the stage and report its changes, set by
+    # `nebari deploy --plan-only`
+    plan_only: bool = False
+    # resource change counts of the last plan with `plan_only`
+    planned_changes: Optional[Dict[str, int]] = None
+    # follow tofu through its `-json` output, set by `--tofu-progress`
+    tofu_progress: bool = False
+    # `-parallelism` and `-refresh` defaults of the stage, see `tofu_settings`
+    parallelism: Optional[int] = None
+    refresh: bool = True
+    # set by `nebari deploy --parallelism/--refresh`, take precedence over
+    # nebari-config.yaml
+    parallelism_override: Optional[int] = None
+    refresh_override: Optional[bool] = None
+
     @property
     def template_directory(self):
         return pathlib.Path(inspect.getfile(self.__class__)).parent / "template"
@@ -240,9 +350,83 @@ class NebariTerraformStage(NebariStage):
     def stage_prefix(self):
         return pathlib.Path("stages") / self.name
 
+    @property
+    def stage_cache_filename(self) -> pathlib.Path:
+        directory: pathlib.Path = self.output_directory / self.stage_prefix
+        return directory / ".terraform" / STAGE_CACHE_FILENAME
+
+    def fingerprint(self, input_vars: Dict[str, Any]) -> str:
+        """Hash of everything `tofu apply` depends on for this stage.
+
+        Covers the rendered files in the stage directory (including the
+        provider lock file), the input variables, the state imports and
+        the OpenTofu version.
+        """
+        fingerprint = hashlib.sha256()
+        fingerprint.update(constants.OPENTOFU_VERSION.encode("utf8"))
+        fingerprint.update(
+            json.dumps(input_vars, sort_keys=True, default=str).encode("utf8")
+        )
+        fingerprint.update(
+            json.dumps(self.state_imports() or [], default=str).encode("utf8")
+        )
+
+        directory = self.output_directory / self.stage_prefix
+        for root, dirs, filenames in os.walk(directory):
+            dirs[:] = sorted(_ for _ in dirs if _ != ".terraform")
+            for filename in sorted(filenames):
+                if filename in TERRAFORM_STATE_FILENAMES:
+                    continue
+                path = pathlib.Path(root) / filename
+                fingerprint.update(str(path.relative_to(directory)).encode("utf8"))
+                fingerprint.update(path.read_bytes())
+        return fingerprint.hexdigest()
+
+    def read_stage_cache(self) -> Dict[str, Any]:
+        try:
+            with self.stage_cache_filename.open() as f:
+                stage_cache: Dict[str, Any] = json.load(f)
+                return stage_cache
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def write_stage_cache(self, **values):
+        stage_cache = {**self.read_stage_cache(), **values}
+        self.stage_cache_filename.parent.mkdir(parents=True, exist_ok=True)
+        # outputs may contain credentials
+        fd = os.open(
+            self.stage_cache_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600
+        )
+        with os.fdopen(fd, "w") as f:
+            json.dump(stage_cache, f)
+
     def state_imports(self) -> List[Tuple[str, str]]:
         return []
 
+    def tofu_settings(self) -> Dict[str, Any]:
+        """`-parallelism` and `-refresh` to run tofu with for this stage.
+
+        Resolved from the command line overrides, the stage entry in
+        `terraform_state.stages` of nebari-config.yaml, the
+        `terraform_state` defaults and finally the stage defaults.
+        """
+        terraform_state = getattr(self.config, "terraform_state", None)
+        stage_settings = None
+        if terraform_state is not None:
+            stage_settings = terraform_state.stages.get(self.name)
+
+        def _resolve(key):
+            for value in (
+                getattr(self, f"{key}_override"),
+                getattr(stage_settings, key, None),
+                getattr(terraform_state, key, None),
+            ):
+                if value is not None:
+                    return value
+            return getattr(self, key)
+
+        return {"parallelism": _resolve("parallelism"), "refresh": _resolve("refresh")}
+
     def tf_objects(self) -> List[Dict]:
         return [NebariTerraformState(self.name, self.config)]
 
@@ -278,6 +462,26 @@ class NebariTerraformStage(NebariStage):
         else:
             stage_outputs[stage_key].update(outputs)
 
+    def previous_outputs(self, input_vars: Dict[str, Any]) -> Dict[str, Any]:
+        """Outputs of the last deploy of this stage without applying it.
+
+        The outputs recorded in the stage cache are used when the stage
+        fingerprint still matches the deploy they were recorded for,
+        otherwise they are read with `tofu output -json`.
+        """
+        stage_cache = self.read_stage_cache()
+        if "outputs" in stage_cache and stage_cache.get(
+            "fingerprint"
+        ) == self.fingerprint(input_vars):
+            cached_outputs: Dict[str, Any] = stage_cache["outputs"]
+            return cached_outputs
+
+        directory = self.output_directory / self.stage_prefix
+        if not (directory / ".terraform").is_dir():
+            opentofu.init(str(directory))
+        outputs: Dict[str, Any] = opentofu.output(str(directory))
+        return outputs
+
     @contextlib.contextmanager
     def deploy(
         self,
@@ -285,17 +489,61 @@ class NebariTerraformStage(NebariStage):
         disable_prompt: bool = False,
         tofu_init: bool = True,
     ):
+        input_vars = self.input_vars(stage_outputs)
+        if self.restore_outputs:
+            print(f"Stage={self.name} previously deployed, restoring outputs")
+            self.set_outputs(stage_outputs, self.previous_outputs(input_vars))
+            yield
+            return
+
+        if self.plan_only:
+            directory = self.output_directory / self.stage_prefix
+            self.planned_changes = opentofu.plan_changes(
+                str(directory),
+                input_vars=input_vars,
+                tofu_init=tofu_init,
+                upgrade_providers=self.upgrade_providers,
+                **self.tofu_settings(),
+            )
+            print(
+                f"Stage={self.name} plan: {opentofu.format_changes(self.planned_changes)}"
+            )
+            # later stages are planned against the currently deployed outputs
+            self.set_outputs(stage_outputs, self.previous_outputs(input_vars))
+            yield
+            return
+
+        fingerprint = self.fingerprint(input_vars)
+
+        stage_cache = self.read_stage_cache()
+        if self.skip_unchanged and stage_cache.get("fingerprint") == fingerprint:
+            print(f"Stage={self.name} unchanged since last deploy, skipping apply")
+            self.set_outputs(stage_outputs, stage_cache["outputs"])
+            # post_deploy steps act outside of the stage fingerprint, e.g.
+            # DNS records or keycloak users, and are idempotent
+            self.post_deploy(stage_outputs, disable_prompt)
+            yield
+            return
+
         deploy_config = dict(
             directory=str(self.output_directory / self.stage_prefix),
-            input_vars=self.input_vars(stage_outputs),
+            input_vars=input_vars,
             tofu_init=tofu_init,
+            upgrade_providers=self.upgrade_providers,
+            batch_imports=self.batch_imports,
+            tofu_plan=self.plan_first,
+            tofu_progress=self.tofu_progress,
+            **self.tofu_settings(),
         )
         state_imports = self.state_imports()
         if state_imports:
             deploy_config["tofu_import"] = True
             deploy_config["state_imports"] = state_imports
 
-        self.set_outputs(stage_outputs, opentofu.deploy(**deploy_config))
+        outputs = opentofu.deploy(**deploy_config)
+        self.write_stage_cache(fingerprint=fingerprint, outputs=outputs)
+
+        self.set_outputs(stage_outputs, outputs)
         self.post_deploy(stage_outputs, disable_prompt)
         yield
 
@@ -336,7 +584,10 @@ class NebariTerraformStage(NebariStage):
                 tofu_import=True,
                 tofu_apply=False,
                 tofu_destroy=True,
+                tofu_progress=self.tofu_progress,
+                **self.tofu_settings(),
             )
+            self.stage_cache_filename.unlink(missing_ok=True)
             status["stages/" + self.name] = True
         except opentofu.OpenTofuException as e:
             if not ignore_errors:
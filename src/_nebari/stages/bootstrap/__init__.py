@@ -28,6 +28,9 @@ def gen_gitignore():
         terraform.tfstate.backup
         .terraform.tfstate.lock.info
 
+        # index of the rendered files
+        .nebari-render-manifest.json
+
         # python
         __pycache__
     """
@@ -91,6 +94,7 @@ class OutputSchema(schema.Base):
 class BootstrapStage(NebariStage):
     name = "bootstrap"
     priority = 0
+    depends_on = []
 
     input_schema = InputSchema
     output_schema = OutputSchema
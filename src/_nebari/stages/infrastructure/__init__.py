@@ -796,6 +796,7 @@ class KubernetesInfrastructureStage(NebariTerraformStage):
 
     name = "02-infrastructure"
     priority = 20
+    depends_on = ["stages/01-terraform-state"]
 
     input_schema = InputSchema
     output_schema = OutputSchema
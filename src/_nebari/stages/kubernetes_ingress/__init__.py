@@ -6,7 +6,7 @@ import sys
 import time
 from typing import Any, Dict, List, Optional, Type
 
-from _nebari import constants
+from _nebari import constants, healthcheck
 from _nebari.provider.dns.cloudflare import update_record
 from _nebari.stages.base import NebariTerraformStage
 from _nebari.stages.tf_objects import (
@@ -169,6 +169,10 @@ class OutputSchema(schema.Base):
 class KubernetesIngressStage(NebariTerraformStage):
     name = "04-kubernetes-ingress"
     priority = 40
+    depends_on = [
+        "stages/02-infrastructure",
+        "stages/03-kubernetes-initialize",
+    ]
 
     input_schema = InputSchema
     output_schema = OutputSchema
@@ -248,31 +252,6 @@ class KubernetesIngressStage(NebariTerraformStage):
     def check(
         self, stage_outputs: Dict[str, Dict[str, Any]], disable_prompt: bool = False
     ):
-        def _attempt_tcp_connect(
-            host, port, num_attempts=NUM_ATTEMPTS, timeout=TIMEOUT
-        ):
-            for i in range(num_attempts):
-                s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                try:
-                    # normalize hostname to ip address
-                    ip = socket.gethostbyname(host)
-                    s.settimeout(5)
-                    result = s.connect_ex((ip, port))
-                    if result == 0:
-                        print(
-                            f"Attempt {i+1} succeeded to connect to tcp://{ip}:{port}"
-                        )
-                        return True
-                    print(f"Attempt {i+1} failed to connect to tcp tcp://{ip}:{port}")
-                except socket.gaierror:
-                    print(f"Attempt {i+1} failed to get IP for {host}...")
-                finally:
-                    s.close()
-
-                time.sleep(timeout)
-
-            return False
-
         tcp_ports = {
             80,  # http
             443,  # https
@@ -287,8 +266,16 @@ class KubernetesIngressStage(NebariTerraformStage):
         host = ip_or_name["hostname"] or ip_or_name["ip"]
         host = host.strip("\n")
 
+        results = healthcheck.wait_until_healthy(
+            {
+                f"tcp://{host}:{port}": healthcheck.tcp_probe(host, port)
+                for port in tcp_ports
+            },
+            num_attempts=NUM_ATTEMPTS,
+            max_delay=TIMEOUT,
+        )
         for port in tcp_ports:
-            if not _attempt_tcp_connect(host, port):
+            if not results[f"tcp://{host}:{port}"]:
                 print(
                     f"ERROR: After stage={self.name} unable to connect to ingress host={host} port={port}"
                 )
@@ -59,6 +59,7 @@ class OutputSchema(schema.Base):
 class KubernetesInitializeStage(NebariTerraformStage):
     name = "03-kubernetes-initialize"
     priority = 30
+    depends_on = ["stages/02-infrastructure"]
 
     input_schema = InputSchema
     output_schema = OutputSchema
@@ -18,6 +18,7 @@ from keycloak.exceptions import KeycloakError
 from kubernetes.stream import stream
 from pydantic import Field, ValidationInfo, field_validator, model_validator
 
+from _nebari.provider import kubernetes_readiness
 from _nebari.stages.base import NebariTerraformStage
 from _nebari.stages.tf_objects import (
     NebariHelmProvider,
@@ -239,6 +240,10 @@ class OutputSchema(schema.Base):
 class KubernetesKeycloakStage(NebariTerraformStage):
     name = "05-kubernetes-keycloak"
     priority = 50
+    depends_on = [
+        "stages/02-infrastructure",
+        "stages/04-kubernetes-ingress",
+    ]
 
     input_schema = InputSchema
     output_schema = OutputSchema
@@ -483,25 +488,25 @@ class KubernetesKeycloakStage(NebariTerraformStage):
 
             # Wait for pods to terminate
             print("  Waiting for Keycloak pods to terminate...")
-            max_wait = 60  # seconds
-            wait_interval = 2
-            elapsed = 0
-            while elapsed < max_wait:
-                pods = api.list_namespaced_pod(
-                    namespace=namespace,
-                    label_selector="app.kubernetes.io/name=keycloak",
-                )
-                if len(pods.items) == 0:
-                    print("  ✓ All Keycloak pods terminated")
-                    break
-                print(f"  Still waiting... ({len(pods.items)} pods remaining)")
-                time.sleep(wait_interval)
-                elapsed += wait_interval
-
-            if elapsed >= max_wait:
+            not_ready = kubernetes_readiness.wait_until_ready(
+                kubernetes.client.ApiClient(),
+                [
+                    kubernetes_readiness.Target(
+                        "v1",
+                        "Pod",
+                        namespace=namespace,
+                        label_selector="app.kubernetes.io/name=keycloak",
+                        status=kubernetes_readiness.all_deleted,
+                    )
+                ],
+                timeout=60,
+            )
+            if not_ready:
                 print(
                     "  ⚠ Warning: Timed out waiting for pods to terminate, proceeding anyway"
                 )
+            else:
+                print("  ✓ All Keycloak pods terminated")
 
             print("✓ Keycloak scaled down\n")
 
@@ -702,37 +707,23 @@ class KubernetesKeycloakStage(NebariTerraformStage):
 
             # Wait for StatefulSet to be ready
             print("  Waiting for Keycloak to be ready...")
-            max_wait = 300  # 5 minutes
-            wait_interval = 5
-            elapsed = 0
-
-            while elapsed < max_wait:
-                statefulset = apps_api.read_namespaced_stateful_set(
-                    name=keycloak_statefulset_name, namespace=namespace
-                )
-
-                ready_replicas = statefulset.status.ready_replicas or 0
-                current_replicas = statefulset.status.current_replicas or 0
-
-                if (
-                    ready_replicas == original_replicas
-                    and current_replicas == original_replicas
-                ):
-                    print(
-                        f"  ✓ Keycloak is ready ({ready_replicas}/{original_replicas} replicas)"
+            not_ready = kubernetes_readiness.wait_until_ready(
+                kubernetes.client.ApiClient(),
+                [
+                    kubernetes_readiness.Target(
+                        "apps/v1",
+                        "StatefulSet",
+                        name=keycloak_statefulset_name,
+                        namespace=namespace,
                     )
-                    break
-
-                print(
-                    f"  Still waiting... ({ready_replicas}/{original_replicas} ready)"
-                )
-                time.sleep(wait_interval)
-                elapsed += wait_interval
-
-            if elapsed >= max_wait:
+                ],
+                timeout=300,
+            )
+            if not_ready:
                 print("  ⚠ Warning: Timed out waiting for StatefulSet to be ready")
                 print("  The StatefulSet may still be starting up")
             else:
+                print(f"  ✓ Keycloak is ready ({original_replicas} replicas)")
                 print(
                     "  Keycloak pods are ready and connected to the restored database\n"
                 )
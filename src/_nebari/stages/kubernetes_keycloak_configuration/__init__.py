@@ -23,6 +23,9 @@ class InputVars(schema.Base):
 class KubernetesKeycloakConfigurationStage(NebariTerraformStage):
     name = "06-kubernetes-keycloak-configuration"
     priority = 60
+    depends_on = ["stages/05-kubernetes-keycloak"]
+    # many independent keycloak groups, roles and clients
+    parallelism = 20
 
     def tf_objects(self) -> List[Dict]:
         return [
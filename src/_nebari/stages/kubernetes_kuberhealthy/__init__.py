@@ -17,6 +17,10 @@ class OutputSchema(schema.Base):
 class KuberHealthyStage(NebariKustomizeStage):
     name = "10-kubernetes-kuberhealthy"
     priority = 100
+    depends_on = [
+        "stages/02-infrastructure",
+        "stages/03-kubernetes-initialize",
+    ]
 
     input_schema = InputSchema
     output_schema = OutputSchema
@@ -17,6 +17,10 @@ class OutputSchema(schema.Base):
 class KuberHealthyStage(NebariKustomizeStage):
     name = "11-kubernetes-kuberhealthy-healthchecks"
     priority = 110
+    depends_on = [
+        "stages/02-infrastructure",
+        "stages/10-kubernetes-kuberhealthy",
+    ]
 
     input_schema = InputSchema
     output_schema = OutputSchema
@@ -1,7 +1,6 @@
 import enum
 import json
 import sys
-import time
 from typing import Any, Dict, List, Optional, Type, Union
 from urllib.parse import urlencode
 
@@ -14,7 +13,7 @@ from pydantic import (
 )
 from typing_extensions import Self
 
-from _nebari import constants
+from _nebari import constants, healthcheck
 from _nebari.stages.base import NebariTerraformStage
 from _nebari.stages.tf_objects import (
     NebariHelmProvider,
@@ -611,6 +610,14 @@ class ArgoWorkflowsInputVars(schema.Base):
 class KubernetesServicesStage(NebariTerraformStage):
     name = "07-kubernetes-services"
     priority = 70
+    depends_on = [
+        "stages/02-infrastructure",
+        "stages/04-kubernetes-ingress",
+        "stages/05-kubernetes-keycloak",
+        "stages/06-kubernetes-keycloak-configuration",
+    ]
+    # many independent kubernetes and helm resources
+    parallelism = 20
 
     input_schema = InputSchema
     output_schema = OutputSchema
@@ -815,32 +822,32 @@ class KubernetesServicesStage(NebariTerraformStage):
         self, stage_outputs: Dict[str, Dict[str, Any]], disable_prompt: bool = False
     ):
         directory = "stages/07-kubernetes-services"
-        import requests
 
         # suppress insecure warnings
         import urllib3
 
         urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-        def _attempt_connect_url(
-            url, verify=False, num_attempts=NUM_ATTEMPTS, timeout=TIMEOUT
-        ):
-            for i in range(num_attempts):
-                response = requests.get(url, verify=verify, timeout=timeout)
-                if response.status_code < 400:
-                    print(f"Attempt {i+1} health check succeeded for url={url}")
-                    return True
-                else:
-                    print(f"Attempt {i+1} health check failed for url={url}")
-                time.sleep(timeout)
-            return False
-
         services = stage_outputs[directory]["service_urls"]["value"]
-        for service_name, service in services.items():
-            service_url = service["health_url"]
-            if service_url and not _attempt_connect_url(service_url):
+        service_urls = {
+            service_name: service["health_url"]
+            for service_name, service in services.items()
+            if service["health_url"]
+        }
+        results = healthcheck.wait_until_healthy(
+            {
+                service_name: healthcheck.http_probe(
+                    service_url, verify=False, timeout=TIMEOUT
+                )
+                for service_name, service_url in service_urls.items()
+            },
+            num_attempts=NUM_ATTEMPTS,
+            max_delay=TIMEOUT,
+        )
+        for service_name, healthy in results.items():
+            if not healthy:
                 print(
-                    f"ERROR: Service {service_name} DOWN when checking url={service_url}"
+                    f"ERROR: Service {service_name} DOWN when checking url={service_urls[service_name]}"
                 )
                 sys.exit(1)
 
@@ -48,6 +48,11 @@ class OutputSchema(schema.Base):
 class NebariTFExtensionsStage(NebariTerraformStage):
     name = "08-nebari-tf-extensions"
     priority = 80
+    depends_on = [
+        "stages/05-kubernetes-keycloak",
+        "stages/06-kubernetes-keycloak-configuration",
+        "stages/07-kubernetes-services",
+    ]
 
     input_schema = InputSchema
     output_schema = OutputSchema
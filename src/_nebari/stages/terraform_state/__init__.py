@@ -4,9 +4,9 @@ import inspect
 import os
 import pathlib
 import re
-from typing import Any, Dict, List, Optional, Tuple, Type
+from typing import Annotated, Any, Dict, List, Optional, Tuple, Type
 
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 
 from _nebari import utils
 from _nebari.provider import opentofu
@@ -77,10 +77,22 @@ class TerraformStateEnum(str, enum.Enum):
         return representer.represent_str(node.value)
 
 
+class TerraformStageSettings(schema.Base):
+    # `-parallelism` of tofu plan, apply and destroy
+    parallelism: Optional[Annotated[int, Field(ge=1)]] = None
+    # `-refresh=false` skips refreshing resources which are known not to
+    # change outside of nebari
+    refresh: Optional[bool] = None
+
+
 class TerraformState(schema.Base):
     type: TerraformStateEnum = TerraformStateEnum.remote
     backend: Optional[str] = None
     config: Dict[str, str] = {}
+    # defaults for all stages, overridden per stage name in `stages`
+    parallelism: Optional[Annotated[int, Field(ge=1)]] = None
+    refresh: Optional[bool] = None
+    stages: Dict[str, TerraformStageSettings] = {}
 
 
 class InputSchema(schema.Base):
@@ -94,6 +106,7 @@ class OutputSchema(schema.Base):
 class TerraformStateStage(NebariTerraformStage):
     name = "01-terraform-state"
     priority = 10
+    depends_on = []
 
     input_schema = InputSchema
     output_schema = OutputSchema
@@ -215,9 +228,7 @@ class TerraformStateStage(NebariTerraformStage):
     ):
         self.check_immutable_fields()
 
-        # No need to run tofu init here as it's being called when running the
-        # terraform show command, inside check_immutable_fields
-        with super().deploy(stage_outputs, disable_prompt, tofu_init=False):
+        with super().deploy(stage_outputs, disable_prompt):
             env_mapping = {}
             with modified_environ(**env_mapping):
                 yield
@@ -260,19 +271,51 @@ class TerraformStateStage(NebariTerraformStage):
                     f'Attempting to change immutable field "{key_path}" ("{old}"->"{new}") in Nebari config file.  Immutable fields cannot be changed after initial deployment.'
                 )
 
-    def get_nebari_config_state(self) -> dict:
-        directory = str(self.output_directory / self.stage_prefix)
+    def get_nebari_config_state(self) -> Optional[dict]:
+        """Nebari config stored in the state by the last deploy, if any.
 
-        tf_state = opentofu.show(directory)
-        nebari_config_state = None
-
-        # get nebari config from state
-        for resource in (
-            tf_state.get("values", {}).get("root_module", {}).get("resources", [])
-        ):
-            if resource["address"] == "terraform_data.nebari_config":
-                nebari_config_state = resource["values"]["input"]
+        This stage always uses the local backend, whatever the
+        `terraform_state.type`, so its raw state is read straight from the
+        stage directory. The config is cached for the state lineage and
+        serial it was read from.
+        """
+        state_file = (
+            self.output_directory / self.stage_prefix / opentofu.LOCAL_STATE_FILENAME
+        )
+        if not state_file.is_file():
+            return None
+        state = state_file.read_text()
+
+        cached = self.read_stage_cache().get("nebari_config_state", {})
+        version = {}
+        nebari_config_state: Optional[dict] = None
+        for key, value in opentofu.iter_state(state):
+            if key in ("lineage", "serial"):
+                version[key] = value
+                if version == cached.get("version"):
+                    nebari_config_state = cached["config"]
+                    return nebari_config_state
+            elif key == "resource" and (
+                value.get("module"),
+                value.get("mode"),
+                value.get("type"),
+                value.get("name"),
+            ) == (None, "managed", "terraform_data", "nebari_config"):
+                instances = value.get("instances") or [{}]
+                nebari_config_state = instances[0].get("attributes", {}).get("input")
                 break
+
+        # dynamic attributes are stored along with their type in the raw state
+        if isinstance(nebari_config_state, dict) and set(nebari_config_state) == {
+            "value",
+            "type",
+        }:
+            nebari_config_state = nebari_config_state["value"]
+
+        if len(version) == 2:
+            self.write_stage_cache(
+                nebari_config_state={"version": version, "config": nebari_config_state}
+            )
         return nebari_config_state
 
     @contextlib.contextmanager
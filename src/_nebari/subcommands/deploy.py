@@ -7,6 +7,7 @@ import typer
 from _nebari.config import read_configuration
 from _nebari.deploy import deploy_configuration
 from _nebari.render import render_template
+from _nebari.timing import collect
 from nebari.hookspecs import hookimpl
 
 TERRAFORM_STATE_STAGE_NAME = "01-terraform-state"
@@ -56,6 +57,74 @@ def nebari_subcommand(cli: typer.Typer):
             "--disable-checks",
             help="Disable the checks performed after each stage",
         ),
+        max_parallel_stages: int = typer.Option(
+            1,
+            "--max-parallel-stages",
+            min=1,
+            help="Maximum number of independent stages to deploy concurrently",
+        ),
+        skip_unchanged: bool = typer.Option(
+            False,
+            "--skip-unchanged",
+            help="Skip applying terraform stages whose rendered files and inputs are unchanged since their last successful deploy",
+        ),
+        resume_from: Optional[str] = typer.Option(
+            None,
+            "--resume-from",
+            help="Restore the outputs of the stages before the given stage from their last deploy instead of applying them",
+        ),
+        only: Optional[str] = typer.Option(
+            None,
+            "--only",
+            help="Only apply the given stage, restoring the outputs of the stages before it from their last deploy",
+        ),
+        upgrade_providers: bool = typer.Option(
+            False,
+            "--upgrade-providers",
+            help="Run `tofu init -upgrade` for every stage, by default stages whose configuration and lock file are unchanged are not initialized again",
+        ),
+        batch_imports: bool = typer.Option(
+            False,
+            "--batch-imports",
+            help="Import existing resources within `tofu apply` using import blocks instead of a `tofu import` per resource, the apply fails if a resource to import does not exist",
+        ),
+        plan_first: bool = typer.Option(
+            False,
+            "--plan-first",
+            help="Run `tofu plan` before applying each terraform stage and only apply the saved plan, stages without changes are not applied",
+        ),
+        plan_only: bool = typer.Option(
+            False,
+            "--plan-only",
+            help="Only plan the terraform stages and list their resource changes without applying them, requires the earlier stages to be deployed",
+        ),
+        tofu_progress: bool = typer.Option(
+            False,
+            "--tofu-progress",
+            help="Show the progress of tofu plan, apply and destroy from their machine-readable output and write the time spent on each resource to the .terraform directory of each stage",
+        ),
+        parallelism: Optional[int] = typer.Option(
+            None,
+            "--parallelism",
+            min=1,
+            help="Number of concurrent tofu operations of every stage, overrides `terraform_state.parallelism` in nebari-config.yaml",
+        ),
+        refresh: Optional[bool] = typer.Option(
+            None,
+            "--refresh/--no-refresh",
+            help="Whether tofu refreshes the state of every stage before planning, overrides `terraform_state.refresh` in nebari-config.yaml",
+            show_default=False,
+        ),
+        log_dir: Optional[pathlib.Path] = typer.Option(
+            None,
+            "--log-dir",
+            help="Also write the output of the tools run by each stage to <stage>.log in this directory",
+        ),
+        timing_report: Optional[pathlib.Path] = typer.Option(
+            None,
+            "--timing-report",
+            help="Write a JSON report of the time spent in each stage and subprocess to this path, plus a Chrome trace next to it",
+        ),
         skip_remote_state_provision: bool = typer.Option(
             False,
             "--skip-remote-state-provision",
@@ -67,6 +136,12 @@ def nebari_subcommand(cli: typer.Typer):
         """
         from nebari.plugins import nebari_plugin_manager
 
+        if resume_from and only:
+            rich.print(
+                "The [green]`--resume-from`[/green] and [green]`--only`[/green] flags cannot be used together"
+            )
+            raise typer.Abort()
+
         if dns_provider or dns_auto_provision:
             msg = "The [green]`--dns-provider`[/green] and [green]`--dns-auto-provision`[/green] flags have been removed in favor of configuring DNS via nebari-config.yaml"
             rich.print(msg)
@@ -75,26 +150,39 @@ def nebari_subcommand(cli: typer.Typer):
         stages = nebari_plugin_manager.ordered_stages
         config_schema = nebari_plugin_manager.config_schema
 
-        config = read_configuration(config_filename, config_schema=config_schema)
+        with collect("deploy", timing_report):
+            config = read_configuration(config_filename, config_schema=config_schema)
 
-        if not disable_render:
-            # Use hardcoded "./" since output_directory parameter was removed
-            render_template("./", config, stages)
+            if not disable_render:
+                # Use hardcoded "./" since output_directory parameter was removed
+                render_template("./", config, stages)
 
-        if skip_remote_state_provision:
-            for stage in stages:
-                if stage.name == TERRAFORM_STATE_STAGE_NAME:
-                    stages.remove(stage)
-            rich.print("Skipping remote state provision")
+            if skip_remote_state_provision:
+                for stage in stages:
+                    if stage.name == TERRAFORM_STATE_STAGE_NAME:
+                        stages.remove(stage)
+                rich.print("Skipping remote state provision")
 
-        # Digital Ocean support deprecation warning -- Nebari 2024.7.1
-        if config.provider == "do" and not disable_prompt:
-            msg = "Digital Ocean support is currently being deprecated and will be removed in a future release. Would you like to continue?"
-            typer.confirm(msg)
+            # Digital Ocean support deprecation warning -- Nebari 2024.7.1
+            if config.provider == "do" and not disable_prompt:
+                msg = "Digital Ocean support is currently being deprecated and will be removed in a future release. Would you like to continue?"
+                typer.confirm(msg)
 
-        deploy_configuration(
-            config,
-            stages,
-            disable_prompt=disable_prompt,
-            disable_checks=disable_checks,
-        )
+            deploy_configuration(
+                config,
+                stages,
+                disable_prompt=disable_prompt,
+                disable_checks=disable_checks,
+                max_parallel_stages=max_parallel_stages,
+                skip_unchanged=skip_unchanged,
+                resume_from=resume_from,
+                only=only,
+                upgrade_providers=upgrade_providers,
+                batch_imports=batch_imports,
+                plan_first=plan_first,
+                plan_only=plan_only,
+                tofu_progress=tofu_progress,
+                parallelism=parallelism,
+                refresh=refresh,
+                log_dir=log_dir,
+            )
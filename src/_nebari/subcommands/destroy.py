@@ -1,10 +1,12 @@
 import pathlib
+from typing import Optional
 
 import typer
 
 from _nebari.config import read_configuration
 from _nebari.destroy import destroy_configuration
 from _nebari.render import render_template
+from _nebari.timing import collect
 from nebari.hookspecs import hookimpl
 
 
@@ -34,6 +36,16 @@ def nebari_subcommand(cli: typer.Typer):
             "--disable-prompt",
             help="Destroy entire Nebari cluster without confirmation request. Suggested for CI use.",
         ),
+        tofu_progress: bool = typer.Option(
+            False,
+            "--tofu-progress",
+            help="Show the progress of tofu plan, apply and destroy from their machine-readable output and write the time spent on each resource to the .terraform directory of each stage",
+        ),
+        timing_report: Optional[pathlib.Path] = typer.Option(
+            None,
+            "--timing-report",
+            help="Write a JSON report of the time spent in each stage and subprocess to this path, plus a Chrome trace next to it",
+        ),
     ):
         """
         Destroy the Nebari cluster from your [purple]nebari-config.yaml[/purple] file.
@@ -46,13 +58,16 @@ def nebari_subcommand(cli: typer.Typer):
         def _run_destroy(
             config_filename=config_filename, disable_render=disable_render
         ):
-            config = read_configuration(config_filename, config_schema=config_schema)
+            with collect("destroy", timing_report):
+                config = read_configuration(
+                    config_filename, config_schema=config_schema
+                )
 
-            if not disable_render:
-                # Use hardcoded "./" since output_directory parameter was removed
-                render_template("./", config, stages)
+                if not disable_render:
+                    # Use hardcoded "./" since output_directory parameter was removed
+                    render_template("./", config, stages)
 
-            destroy_configuration(config, stages)
+                destroy_configuration(config, stages, tofu_progress=tofu_progress)
 
         if disable_prompt:
             _run_destroy()
@@ -0,0 +1,65 @@
+import pathlib
+from typing import Optional
+
+import typer
+
+from _nebari.config import read_configuration
+from _nebari.drift import drift_configuration
+from _nebari.render import render_template
+from _nebari.timing import collect
+from nebari.hookspecs import hookimpl
+
+
+@hookimpl
+def nebari_subcommand(cli: typer.Typer):
+    @cli.command()
+    def drift(
+        ctx: typer.Context,
+        config_filename: pathlib.Path = typer.Option(
+            ...,
+            "-c",
+            "--config",
+            help="nebari configuration yaml file path",
+        ),
+        disable_render: bool = typer.Option(
+            False,
+            "--disable-render",
+            help="Disable auto-rendering before checking for drift",
+        ),
+        max_parallel_stages: int = typer.Option(
+            4,
+            "--max-parallel-stages",
+            min=1,
+            help="Maximum number of stages to check concurrently",
+        ),
+        timing_report: Optional[pathlib.Path] = typer.Option(
+            None,
+            "--timing-report",
+            help="Write a JSON report of the time spent in each stage and subprocess to this path, plus a Chrome trace next to it",
+        ),
+    ):
+        """
+        Detect resources of your [purple]nebari-config.yaml[/purple] deployment changed outside of Nebari.
+
+        Exits with 0 when nothing drifted, 2 when resources drifted and 1 when a stage could not be checked.
+        """
+        from nebari.plugins import nebari_plugin_manager
+
+        stages = nebari_plugin_manager.ordered_stages
+        config_schema = nebari_plugin_manager.config_schema
+
+        with collect("drift", timing_report):
+            config = read_configuration(config_filename, config_schema=config_schema)
+
+            if not disable_render:
+                # Use hardcoded "./" since output_directory parameter was removed
+                render_template(pathlib.Path("./"), config, stages)
+
+            drifted, failed = drift_configuration(
+                config, stages, max_parallel_stages=max_parallel_stages
+            )
+
+        if failed:
+            raise typer.Exit(1)
+        if any(drifted.values()):
+            raise typer.Exit(2)
@@ -1,9 +1,11 @@
 import pathlib
+from typing import Optional
 
 import typer
 
 from _nebari.config import read_configuration
 from _nebari.render import render_template
+from _nebari.timing import collect
 from nebari.hookspecs import hookimpl
 
 
@@ -31,6 +33,16 @@ def nebari_subcommand(cli: typer.Typer):
             "--dry-run",
             help="simulate rendering files without actually writing or updating any files",
         ),
+        render_times: bool = typer.Option(
+            False,
+            "--render-times",
+            help="Show the time spent rendering each stage",
+        ),
+        timing_report: Optional[pathlib.Path] = typer.Option(
+            None,
+            "--timing-report",
+            help="Write a JSON report of the time spent in each stage and subprocess to this path, plus a Chrome trace next to it",
+        ),
     ):
         """
         Dynamically render the Terraform scripts and other files from your [purple]nebari-config.yaml[/purple] file.
@@ -40,6 +52,13 @@ def nebari_subcommand(cli: typer.Typer):
         stages = nebari_plugin_manager.ordered_stages
         config_schema = nebari_plugin_manager.config_schema
 
-        config = read_configuration(config_filename, config_schema=config_schema)
-        # Use hardcoded "./" since output_directory parameter was removed
-        render_template("./", config, stages, dry_run=dry_run)
+        with collect("render", timing_report):
+            config = read_configuration(config_filename, config_schema=config_schema)
+            # Use hardcoded "./" since output_directory parameter was removed
+            render_template(
+                "./",
+                config,
+                stages,
+                dry_run=dry_run,
+                show_render_times=render_times,
+            )
@@ -0,0 +1,126 @@
+import contextlib
+import datetime
+import json
+import os
+import pathlib
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# active collector, only set within `collect`
+_COLLECTOR = None
+
+
+class TimingCollector:
+    """Records timed spans and renders them as a JSON or Chrome trace report."""
+
+    def __init__(self, command: str):
+        self.command = command
+        self.start_time = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        name: str,
+        start_time: float,
+        duration: float,
+        category: str = "nebari",
+        **args,
+    ):
+        span = {
+            "name": name,
+            "category": category,
+            "start": start_time - self.start_time,
+            "duration": duration,
+            "thread": threading.current_thread().name,
+            "args": {k: str(v) for k, v in args.items()},
+        }
+        with self._lock:
+            self.spans.append(span)
+
+    def report(self) -> Dict[str, Any]:
+        summary: Dict[str, Dict[str, float]] = {}
+        for span in self.spans:
+            entry = summary.setdefault(span["name"], {"count": 0, "duration": 0.0})
+            entry["count"] += 1
+            entry["duration"] += span["duration"]
+
+        return {
+            "command": self.command,
+            "started": datetime.datetime.fromtimestamp(self.start_time).isoformat(),
+            "duration": time.time() - self.start_time,
+            "spans": sorted(self.spans, key=lambda span: span["start"]),
+            "summary": dict(
+                sorted(summary.items(), key=lambda item: -item[1]["duration"])
+            ),
+        }
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Report in the Chrome trace event format (chrome://tracing, Perfetto)."""
+        pid = os.getpid()
+        thread_ids: Dict[str, int] = {}
+        events = []
+        for span in sorted(self.spans, key=lambda span: span["start"]):
+            tid = thread_ids.setdefault(span["thread"], len(thread_ids))
+            events.append(
+                {
+                    "name": span["name"],
+                    "cat": span["category"],
+                    "ph": "X",
+                    "ts": int(span["start"] * 1e6),
+                    "dur": int(span["duration"] * 1e6),
+                    "pid": pid,
+                    "tid": tid,
+                    "args": span["args"],
+                }
+            )
+        for thread_name, tid in thread_ids.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {"name": thread_name},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, filename: pathlib.Path):
+        """Write the JSON report to `filename` and the Chrome trace next to it."""
+        filename = pathlib.Path(filename)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        with filename.open("w") as f:
+            json.dump(self.report(), f, indent=4)
+        with filename.with_suffix(".trace.json").open("w") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+def record(name: str, start_time: float, duration: float, category: str, **args):
+    """Record a span with the active collector, if any."""
+    collector = _COLLECTOR
+    if collector is not None:
+        collector.record(name, start_time, duration, category, **args)
+
+
+@contextlib.contextmanager
+def collect(command: str, filename: Optional[pathlib.Path] = None):
+    """Collect spans while the context is active and write them to `filename`.
+
+    Nothing is collected when `filename` is None. The report is written
+    even when the command fails.
+    """
+    global _COLLECTOR
+    if filename is None:
+        yield None
+        return
+
+    collector = TimingCollector(command)
+    _COLLECTOR = collector
+    try:
+        yield collector
+    finally:
+        _COLLECTOR = None
+        collector.write(filename)
+        print(f"Timing report written to {filename}")
@@ -1,4 +1,7 @@
+import asyncio
+import collections
 import contextlib
+import dataclasses
 import enum
 import functools
 import json
@@ -10,19 +13,21 @@ import signal
 import string
 import subprocess
 import sys
+import tempfile
 import threading
 import time
 import warnings
 from pathlib import Path
-from typing import Any, Dict, List, Set
+from typing import IO, Any, Deque, Dict, Iterator, List, Optional, Set
 
 import rich
 from ruamel.yaml import YAML
 
-from _nebari import constants
+from _nebari import constants, timing
 
 # environment variable overrides
 NEBARI_GH_BRANCH = os.getenv("NEBARI_GH_BRANCH", None)
+NEBARI_CACHE_DIR = os.getenv("NEBARI_CACHE_DIR", None)
 
 AZURE_TF_STATE_RESOURCE_GROUP_SUFFIX = "-state"
 AZURE_NODE_RESOURCE_GROUP_SUFFIX = "-node-resource-group"
@@ -34,10 +39,15 @@ yaml.default_flow_style = False
 
 
 @contextlib.contextmanager
-def timer(logger, prefix):
+def timer(logger, prefix, category="nebari", **args):
+    """Log the duration of the block and record it with the active timing collector."""
     start_time = time.time()
-    yield
-    logger.info(f"{prefix} took {time.time() - start_time:.3f} [s]")
+    try:
+        yield
+    finally:
+        duration = time.time() - start_time
+        timing.record(prefix, start_time, duration, category, **args)
+        logger.info(f"{prefix} took {duration:.3f} [s]")
 
 
 @contextlib.contextmanager
@@ -48,77 +58,221 @@ def change_directory(directory):
     os.chdir(current_directory)
 
 
+ANSI_ESCAPE = re.compile(rb"\x1b\[[0-9;]*[mK]")
+
+# output written to the terminal is flushed at least this often, in seconds
+FLUSH_INTERVAL = 0.1
+# captured output kept in memory before older output spills to a file
+CAPTURE_MAX_BYTES = 8 * 1024 * 1024
+READ_SIZE = 64 * 1024
+
+# log file of the subprocesses run by the current thread, see `subprocess_log`
+_SUBPROCESS_LOG = threading.local()
+
+
 def strip_ansi_errors(line):
     """Strips ANSI escape codes from a string."""
-    ansi_escape = re.compile(rb"\x1b\[[0-9;]*[mK]")
-    return ansi_escape.sub(b"", line)
+    return ANSI_ESCAPE.sub(b"", line)
+
+
+class OutputBuffer:
+    """Captured subprocess output holding at most `max_bytes` in memory.
+
+    The most recent output is kept in a ring buffer, older output is
+    spilled to a temporary file once the ring buffer is full. Iterate
+    over the buffer to read the output in blocks, `getvalue` returns
+    all of it at once and so holds all of it in memory. Close the
+    buffer, or use it as a context manager, to remove the spill file.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = CAPTURE_MAX_BYTES if max_bytes is None else max_bytes
+        self.size = 0
+        self._chunks: Deque[bytes] = collections.deque()
+        self._spill: Optional[IO[bytes]] = None
+
+    def append(self, data: bytes):
+        self._chunks.append(data)
+        self.size += len(data)
+        while self.size > self.max_bytes and len(self._chunks) > 1:
+            chunk = self._chunks.popleft()
+            self.size -= len(chunk)
+            if self._spill is None:
+                self._spill = tempfile.TemporaryFile()
+            self._spill.write(chunk)
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self._spill is not None:
+            self._spill.seek(0)
+            while block := self._spill.read(READ_SIZE):
+                yield block
+        yield from self._chunks
+
+    def getvalue(self) -> bytes:
+        return b"".join(self)
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def prefix_lines(block: bytes, line_prefix: bytes) -> bytes:
+    """Prefix each line of `block`, terminating the last line if needed."""
+    if not block.endswith(b"\n"):
+        block += b"\n"
+    if not line_prefix:
+        return block
+    return b"".join(line_prefix + line for line in block.splitlines(keepends=True))
+
+
+def _emit_block(
+    block: bytes,
+    line_prefix: bytes,
+    strip_errors: bool,
+    terminal=None,
+    output: Optional[OutputBuffer] = None,
+    tee=None,
+    line_callback=None,
+) -> bool:
+    """Pass the complete lines of `block` on to the output of a subprocess.
+
+    The lines go to the first of `line_callback`, `terminal` (prefixed
+    with `line_prefix`) and `output` given, and always to `tee`. Returns
+    whether they were written to `terminal` and still need flushing.
+    """
+    if strip_errors:
+        block = ANSI_ESCAPE.sub(b"", block)
+    if tee is not None:
+        tee.write(block)
+
+    if line_callback is not None:
+        for line in block.splitlines(keepends=True):
+            line_callback(line)
+    elif terminal is not None:
+        terminal.write(prefix_lines(block, line_prefix))
+        return True
+    elif output is not None:
+        output.append(block)
+    return False
+
+
+@contextlib.contextmanager
+def subprocess_log(filename: Optional[Path]):
+    """Also write the output of subprocesses run by this thread to `filename`."""
+    if filename is None:
+        yield
+        return
+
+    filename = Path(filename)
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    previous = getattr(_SUBPROCESS_LOG, "file", None)
+    with filename.open("ab") as f:
+        _SUBPROCESS_LOG.file = f
+        try:
+            yield
+        finally:
+            _SUBPROCESS_LOG.file = previous
 
 
 def process_streams(
-    process, line_prefix, strip_errors, print_stdout=True, print_stderr=True
+    process,
+    line_prefix,
+    strip_errors,
+    print_stdout=True,
+    print_stderr=True,
+    stdout_callback=None,
+    tee=None,
 ):
+    """Pump the output of `process` until both of its streams are closed.
+
+    Complete lines are printed with `line_prefix` through buffered writes
+    flushed every `FLUSH_INTERVAL`, passed to `stdout_callback` or
+    captured in an `OutputBuffer`. All output is also written to the
+    binary file `tee` when given. Returns the `OutputBuffer` of the
+    captured stdout and stderr, to be closed by the caller.
+    """
     sel = selectors.DefaultSelector()
     sel.register(process.stdout, selectors.EVENT_READ, data="stdout")
     if process.stderr and process.stderr != process.stdout:
         sel.register(process.stderr, selectors.EVENT_READ, data="stderr")
 
-    outputs = {"stdout": [], "stderr": []}
+    terminals = {
+        "stdout": sys.stdout.buffer if print_stdout else None,
+        "stderr": sys.stderr.buffer if print_stderr else None,
+    }
+    outputs = {"stdout": OutputBuffer(), "stderr": OutputBuffer()}
     partial = {"stdout": b"", "stderr": b""}
     reset_code = b"\x1b[0m"  # ANSI reset code
+    unflushed = set()
+    last_flush = time.monotonic()
+
+    def emit(stream_name, block):
+        if _emit_block(
+            block,
+            line_prefix,
+            strip_errors,
+            terminal=terminals[stream_name],
+            output=outputs[stream_name],
+            tee=tee,
+            line_callback=stdout_callback if stream_name == "stdout" else None,
+        ):
+            unflushed.add(stream_name)
+
+    def flush():
+        nonlocal last_flush
+        for stream_name in unflushed:
+            terminals[stream_name].flush()
+        unflushed.clear()
+        last_flush = time.monotonic()
 
     try:
-        while True:
-            events = sel.select(timeout=0.1)
+        while sel.get_map():
+            # only wake up periodically to flush pending output and to
+            # notice a process whose streams are held open by its children
+            events = sel.select(timeout=FLUSH_INTERVAL if unflushed else 1)
             if not events and process.poll() is not None:
-                # Handle any remaining partial output
-                for stream_name in ["stdout", "stderr"]:
-                    if partial[stream_name]:
-                        line = partial[stream_name]
-                        if strip_errors:
-                            line = strip_ansi_errors(line)
-                        outputs[stream_name].append(line)
                 break
 
             for key, _ in events:
-                data = key.fileobj.read1(8192)
+                data = key.fileobj.read1(READ_SIZE)
+                stream_name = key.data
                 if not data:
                     sel.unregister(key.fileobj)
                     continue
 
-                stream_name = key.data
                 chunk = partial[stream_name] + data
-                lines = chunk.split(b"\n")
-                partial[stream_name] = lines[-1]
-
-                for line in lines[:-1]:
-                    line_w_newline = line + b"\n"
-                    if strip_errors:
-                        line_w_newline = strip_ansi_errors(line_w_newline)
-
-                    # Handle stdout
-                    if stream_name == "stdout":
-                        if print_stdout:
-                            sys.stdout.buffer.write(line_prefix + line_w_newline)
-                            sys.stdout.flush()
-                        else:
-                            outputs["stdout"].append(line_w_newline)
-
-                    # Handle stderr
-                    if stream_name == "stderr":
-                        if print_stderr:
-                            sys.stderr.buffer.write(line_prefix + line_w_newline)
-                            sys.stderr.flush()
-                        else:
-                            outputs["stderr"].append(line_w_newline)
+                end = chunk.rfind(b"\n") + 1
+                partial[stream_name] = chunk[end:]
+                if end:
+                    emit(stream_name, chunk[:end])
 
-        # Add reset code when we're done processing output
-        if print_stdout:
-            sys.stdout.buffer.write(reset_code)
-            sys.stdout.flush()
-        if print_stderr:
-            sys.stderr.buffer.write(reset_code)
-            sys.stderr.flush()
+            if unflushed and time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                flush()
 
+        # Handle any remaining partial output
+        for stream_name in ["stdout", "stderr"]:
+            if partial[stream_name]:
+                emit(stream_name, partial[stream_name])
+
+        # Add reset code when we're done processing output
+        for stream_name, terminal in terminals.items():
+            if terminal is not None:
+                terminal.write(reset_code)
+                unflushed.add(stream_name)
+        flush()
+
+        return outputs["stdout"], outputs["stderr"]
+    except BaseException:
+        for output in outputs.values():
+            output.close()
+        raise
     finally:
         sel.close()
         if process.stdout:
@@ -126,11 +280,16 @@ def process_streams(
         if process.stderr:
             process.stderr.close()
 
-    return outputs["stdout"], outputs["stderr"]
-
 
 def run_subprocess_cmd(processargs, prefix=b"", capture_output=False, **kwargs):
-    """Runs subprocess command with realtime stdout logging with optional line prefix."""
+    """Runs subprocess command with realtime stdout logging with optional line prefix.
+
+    With `capture_output` stdout is returned as an `OutputBuffer` instead
+    of printed, holding at most `CAPTURE_MAX_BYTES` of it in memory. The
+    caller reads it in blocks or with `getvalue` and closes it. Pass
+    `stdout_callback` to be called with each line of stdout instead, e.g.
+    to process large output as it is produced.
+    """
     if prefix:
         line_prefix = f"[{prefix}]: ".encode("utf-8")
     else:
@@ -146,7 +305,10 @@ def run_subprocess_cmd(processargs, prefix=b"", capture_output=False, **kwargs):
         timeout = kwargs.pop("timeout")  # in seconds
 
     strip_errors = kwargs.pop("strip_errors", False)
+    # called with each line of stdout instead of printing it
+    stdout_callback = kwargs.pop("stdout_callback", None)
 
+    start_time = time.time()
     process = subprocess.Popen(
         processargs,
         **kwargs,
@@ -168,26 +330,259 @@ def run_subprocess_cmd(processargs, prefix=b"", capture_output=False, **kwargs):
         timeout_timer = threading.Timer(timeout, kill_process)
         timeout_timer.start()
 
-    if capture_output:
-        output, _ = process_streams(
-            process, line_prefix, strip_errors, print_stdout=False, print_stderr=True
+    tee = getattr(_SUBPROCESS_LOG, "file", None)
+    if tee is not None:
+        tee.write(f"$ {' '.join(str(arg) for arg in processargs)}\n".encode("utf-8"))
+
+    output = None
+    exit_code = None
+    try:
+        stdout, stderr = process_streams(
+            process,
+            line_prefix,
+            strip_errors,
+            print_stdout=not capture_output,
+            print_stderr=True,
+            stdout_callback=stdout_callback,
+            tee=tee,
         )
-    else:
-        process_streams(
-            process, line_prefix, strip_errors, print_stdout=True, print_stderr=True
+        # stderr is always printed, nothing of it is captured
+        stderr.close()
+        if capture_output:
+            output = stdout
+        else:
+            stdout.close()
+
+        exit_code = process.wait(
+            timeout=10
+        )  # Should already have finished because we have drained stdout
+    except BaseException:
+        if output is not None:
+            output.close()
+        raise
+    finally:
+        if timeout_timer is not None:
+            timeout_timer.cancel()
+
+        from nebari.plugins import nebari_plugin_manager
+
+        # also reported when reading the output failed, then with the
+        # exit code of the process if it already exited
+        nebari_plugin_manager.plugin_manager.hook.nebari_subprocess_finished(
+            args=[str(arg) for arg in processargs],
+            exit_code=exit_code if exit_code is not None else process.poll(),
+            duration=time.time() - start_time,
+        )
+
+    return exit_code, output
+
+
+@dataclasses.dataclass
+class SubprocessCommand:
+    """A command to run with `run_subprocesses`."""
+
+    args: List[str]
+    prefix: str = ""
+    capture_output: bool = False
+    strip_errors: bool = False
+    # in seconds, the process group is terminated once exceeded
+    timeout: Optional[float] = None
+    cwd: Optional[str] = None
+    env: Optional[Dict[str, str]] = None
+
+
+@dataclasses.dataclass
+class SubprocessResult:
+    args: List[str]
+    # None when the process was cancelled before it finished
+    exit_code: Optional[int]
+    # captured stdout, only with `capture_output`, to be closed by the caller
+    output: Optional[OutputBuffer] = None
+    duration: float = 0.0
+    timed_out: bool = False
+    cancelled: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0
+
+
+async def _pump_stream(stream, line_prefix, strip_errors, terminal, output, tee):
+    partial = b""
+    while True:
+        data = await stream.read(READ_SIZE)
+        if not data:
+            break
+        chunk = partial + data
+        end = chunk.rfind(b"\n") + 1
+        partial = chunk[end:]
+        # whole lines in a single write, lines of concurrent processes
+        # are never interleaved
+        if end and _emit_block(
+            chunk[:end], line_prefix, strip_errors, terminal, output, tee
+        ):
+            terminal.flush()
+    if partial and _emit_block(
+        partial, line_prefix, strip_errors, terminal, output, tee
+    ):
+        terminal.flush()
+
+
+async def _terminate_process_group(process, grace_period: float = 10):
+    if process.returncode is not None:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        await asyncio.wait_for(process.wait(), grace_period)
+    except asyncio.TimeoutError:
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(process.pid, signal.SIGKILL)
+        await process.wait()
+
+
+async def run_subprocess_async(command: SubprocessCommand) -> SubprocessResult:
+    """Run `command` with prefixed, line buffered output on the running event loop.
+
+    The process runs in its own process group which is terminated when
+    the timeout is exceeded or the awaiting task is cancelled.
+    """
+    line_prefix = f"[{command.prefix}]: ".encode("utf-8") if command.prefix else b""
+    start_time = time.time()
+    process = await asyncio.create_subprocess_exec(
+        *command.args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=(
+            asyncio.subprocess.PIPE
+            if command.capture_output
+            else asyncio.subprocess.STDOUT
+        ),
+        cwd=command.cwd,
+        env=command.env,
+        start_new_session=True,
+    )
+
+    tee = getattr(_SUBPROCESS_LOG, "file", None)
+    if tee is not None:
+        tee.write(f"$ {' '.join(str(arg) for arg in command.args)}\n".encode("utf-8"))
+
+    output = OutputBuffer() if command.capture_output else None
+    pumps = [
+        _pump_stream(
+            process.stdout,
+            line_prefix,
+            command.strip_errors,
+            None if command.capture_output else sys.stdout.buffer,
+            output,
+            tee,
+        )
+    ]
+    if command.capture_output:
+        pumps.append(
+            _pump_stream(
+                process.stderr,
+                line_prefix,
+                command.strip_errors,
+                sys.stderr.buffer,
+                None,
+                tee,
+            )
+        )
+
+    timed_out = False
+    try:
+        await asyncio.wait_for(asyncio.gather(*pumps, process.wait()), command.timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        await _terminate_process_group(process)
+    except BaseException:
+        await _terminate_process_group(process)
+        if output is not None:
+            output.close()
+        raise
+    finally:
+        from nebari.plugins import nebari_plugin_manager
+
+        nebari_plugin_manager.plugin_manager.hook.nebari_subprocess_finished(
+            args=[str(arg) for arg in command.args],
+            exit_code=process.returncode,
+            duration=time.time() - start_time,
         )
 
-    if timeout_timer is not None:
-        timeout_timer.cancel()
+    return SubprocessResult(
+        args=command.args,
+        exit_code=process.returncode,
+        output=output,
+        duration=time.time() - start_time,
+        timed_out=timed_out,
+    )
 
-    exit_code = process.wait(
-        timeout=10
-    )  # Should already have finished because we have drained stdout
 
-    if capture_output:
-        return exit_code, b"".join(output)
+async def run_subprocesses_async(
+    commands: List[SubprocessCommand],
+    max_concurrency: Optional[int] = None,
+    fail_fast: bool = False,
+) -> List[SubprocessResult]:
+    """Run `commands` concurrently, see `run_subprocesses`."""
+    semaphore = asyncio.Semaphore(max_concurrency or max(len(commands), 1))
+    tasks: List[asyncio.Task] = []
+
+    async def _run(command: SubprocessCommand) -> SubprocessResult:
+        async with semaphore:
+            result = await run_subprocess_async(command)
+        if fail_fast and not result.ok:
+            for task in tasks:
+                if task is not asyncio.current_task():
+                    task.cancel()
+        return result
+
+    tasks.extend(asyncio.create_task(_run(command)) for command in commands)
+    if tasks:
+        await asyncio.wait(tasks)
+
+    results = []
+    for command, task in zip(commands, tasks):
+        if task.cancelled():
+            results.append(
+                SubprocessResult(args=command.args, exit_code=None, cancelled=True)
+            )
+        else:
+            results.append(task.result())
+    return results
+
+
+def run_subprocesses(
+    commands: List[SubprocessCommand],
+    max_concurrency: Optional[int] = None,
+    fail_fast: bool = False,
+) -> List[SubprocessResult]:
+    """Run `commands` concurrently and return their results in the same order.
+
+    At most `max_concurrency` processes run at once, all of them by
+    default. The output of each process is prefixed and written one
+    complete line at a time. With `fail_fast` the remaining commands are
+    cancelled once one of them fails or times out.
+    """
+    return asyncio.run(run_subprocesses_async(commands, max_concurrency, fail_fast))
+
+
+def cache_directory(*parts: str) -> Path:
+    """Persistent directory for caches shared between nebari invocations.
+
+    Defaults to `$XDG_CACHE_HOME/nebari` and can be overridden with the
+    `NEBARI_CACHE_DIR` environment variable, e.g. to share it within CI.
+    """
+    if NEBARI_CACHE_DIR:
+        directory = Path(NEBARI_CACHE_DIR)
     else:
-        return exit_code, None
+        directory = (
+            Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "nebari"
+        )
+    directory = directory.joinpath(*parts)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
 
 
 def load_yaml(config_filename: Path):
@@ -200,36 +595,58 @@ def load_yaml(config_filename: Path):
     return config
 
 
+# active `modified_environ` contexts in the order they were entered, and
+# the values of the variables they modify from before the first of them
+_ENVIRON_LOCK = threading.Lock()
+_ENVIRON_LAYERS: List[Dict[str, Optional[str]]] = []
+_ENVIRON_ORIGINAL: Dict[str, Optional[str]] = {}
+
+
 @contextlib.contextmanager
-def modified_environ(*remove: List[str], **update: Dict[str, str]):
+def modified_environ(*remove: str, **update: str):
     """
     https://stackoverflow.com/questions/2059482/python-temporarily-modify-the-current-processs-environment/51754362
     Temporarily updates the ``os.environ`` dictionary in-place.
 
     The ``os.environ`` dictionary is updated in-place so that the modification
-    is sure to work in all situations.
+    is sure to work in all situations. Contexts may exit in any order, e.g.
+    those of stages deployed concurrently: on exit each variable is set as if
+    only the contexts still active had modified it.
 
     :param remove: Environment variables to remove.
     :param update: Dictionary of environment variables and values to add/update.
     """
     env = os.environ
-    update = update or {}
-    remove = remove or []
+    # None removes a variable
+    layer: Dict[str, Optional[str]] = {
+        **{k: None for k in remove},
+        **(update or {}),
+    }
 
-    # List of environment variables being updated or removed.
-    stomped = (set(update.keys()) | set(remove)) & set(env.keys())
-    # Environment variables and values to restore on exit.
-    update_after = {k: env[k] for k in stomped}
-    # Environment variables and values to remove on exit.
-    remove_after = frozenset(k for k in update if k not in env)
+    def _set(key, value):
+        if value is None:
+            env.pop(key, None)
+        else:
+            env[key] = value
 
+    with _ENVIRON_LOCK:
+        for key, value in layer.items():
+            _ENVIRON_ORIGINAL.setdefault(key, env.get(key))
+            _set(key, value)
+        _ENVIRON_LAYERS.append(layer)
     try:
-        env.update(update)
-        [env.pop(k, None) for k in remove]
         yield
     finally:
-        env.update(update_after)
-        [env.pop(k) for k in remove_after]
+        with _ENVIRON_LOCK:
+            _ENVIRON_LAYERS[:] = [_ for _ in _ENVIRON_LAYERS if _ is not layer]
+            for key in layer:
+                value = _ENVIRON_ORIGINAL[key]
+                active = [_ for _ in _ENVIRON_LAYERS if key in _]
+                for other in active:
+                    value = other[key]
+                if not active:
+                    del _ENVIRON_ORIGINAL[key]
+                _set(key, value)
 
 
 def deep_merge(*args):
@@ -277,6 +694,37 @@ def deep_merge(*args):
         return d1
 
 
+def _copy_containers(value):
+    if isinstance(value, dict):
+        return {k: _copy_containers(v) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [_copy_containers(v) for v in value]
+    return value
+
+
+def _merge_into(d1: dict, d2: dict):
+    for key, value in d2.items():
+        if key not in d1:
+            d1[key] = _copy_containers(value)
+        elif isinstance(d1[key], dict) and isinstance(value, dict):
+            _merge_into(d1[key], value)
+        elif isinstance(d1[key], list) and isinstance(value, list):
+            d1[key].extend(_copy_containers(value))
+        # if they don't match keep the existing value
+
+
+def deep_merge_into(target: dict, *args) -> dict:
+    """Deep merge dictionaries into `target` in place and return it.
+
+    Gives the same result as `deep_merge(target, *args)` without
+    rebuilding `target` for every argument. Dicts and lists are copied
+    out of `args` so later merges never modify them.
+    """
+    for arg in args:
+        _merge_into(target, arg)
+    return target
+
+
 # https://github.com/minrk/escapism/blob/master/escapism.py
 def escape_string(
     to_escape,
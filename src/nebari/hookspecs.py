@@ -1,6 +1,6 @@
 import contextlib
 import pathlib
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import pydantic
 import typer
@@ -16,6 +16,11 @@ class NebariStage:
     name: str = None
     priority: int = None
 
+    # stage_outputs keys (e.g. "stages/02-infrastructure") consumed by
+    # this stage. `None` means the stage depends on every stage with a
+    # lower priority.
+    depends_on: Optional[List[str]] = None
+
     input_schema: pydantic.BaseModel = None
     output_schema: pydantic.BaseModel = None
 
@@ -52,3 +57,38 @@ def nebari_stage() -> List[NebariStage]:
 @hookspec
 def nebari_subcommand(cli: typer.Typer):
     """Register Typer subcommand in nebari"""
+
+
+@hookspec
+def nebari_stage_started(stage: NebariStage, action: str):
+    """Called before a stage is deployed or destroyed
+
+    `action` is either "deploy" or "destroy".
+    """
+
+
+@hookspec
+def nebari_stage_finished(
+    stage: NebariStage,
+    action: str,
+    duration: float,
+    outputs_size: int,
+    error: Optional[BaseException],
+):
+    """Called after a stage is deployed or destroyed
+
+    `duration` is the time in seconds spent in the stage, `outputs_size`
+    the number of outputs the stage set and `error` the exception raised
+    by the stage, if any.
+    """
+
+
+@hookspec
+def nebari_subprocess_finished(
+    args: List[str], exit_code: Optional[int], duration: float
+):
+    """Called after a subprocess (tofu, helm, kustomize, ...) run by nebari exits
+
+    Also called when reading its output failed, `exit_code` is None if
+    the subprocess had not exited yet.
+    """
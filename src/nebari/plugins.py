@@ -19,6 +19,8 @@ DEFAULT_SUBCOMMAND_PLUGINS = [
     "_nebari.subcommands.deploy",
     "_nebari.subcommands.destroy",
     "_nebari.subcommands.keycloak",
+    "_nebari.subcommands.plan",
+    "_nebari.subcommands.drift",
     "_nebari.subcommands.plugin",
     "_nebari.subcommands.render",
     "_nebari.subcommands.support",
@@ -36,6 +36,7 @@ class TestGenGitignore:
             "terraform.tfstate",
             "terraform.tfstate.backup",
             ".terraform.tfstate.lock.info",
+            ".nebari-render-manifest.json",
             "# python",
             "__pycache__",
         ]
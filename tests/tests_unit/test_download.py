@@ -0,0 +1,54 @@
+import hashlib
+import io
+import tarfile
+
+import pytest
+
+from _nebari.provider import download
+
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    monkeypatch.setattr("_nebari.utils.NEBARI_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr("sys.platform", "linux")
+    monkeypatch.setattr("platform.machine", lambda: "x86_64")
+    monkeypatch.setenv("NEBARI_BINARY_MIRROR", str(tmp_path / "mirror"))
+
+    directory = tmp_path / "mirror" / "kustomize" / "5.4.3"
+    directory.mkdir(parents=True)
+    archive = directory / "kustomize_v5.4.3_linux_amd64.tar.gz"
+    with tarfile.open(archive, "w:gz") as t:
+        content = b"#!/bin/sh\necho kustomize\n"
+        info = tarfile.TarInfo("kustomize")
+        info.size = len(content)
+        t.addfile(info, io.BytesIO(content))
+
+    checksum = hashlib.sha256(archive.read_bytes()).hexdigest()
+    (directory / "checksums.txt").write_text(
+        f"{checksum}  {archive.name}\n{'0' * 64}  kustomize_v5.4.3_darwin_arm64.tar.gz\n"
+    )
+    return directory
+
+
+def test_download_binary(mirror, tmp_path):
+    binary_path = download.download_binary("kustomize", "5.4.3")
+
+    assert binary_path == (
+        tmp_path / "cache" / "bin" / "kustomize" / "5.4.3" / "linux_amd64" / "kustomize"
+    )
+    assert binary_path.read_bytes() == b"#!/bin/sh\necho kustomize\n"
+
+    # cached binaries are used without accessing the mirror
+    for path in mirror.iterdir():
+        path.unlink()
+    assert download.download_binary("kustomize", "5.4.3") == binary_path
+
+
+def test_download_binary_checksum_mismatch(mirror, tmp_path):
+    (mirror / "checksums.txt").write_text(
+        f"{'0' * 64}  kustomize_v5.4.3_linux_amd64.tar.gz\n"
+    )
+
+    with pytest.raises(download.DownloadException, match="Checksum mismatch"):
+        download.download_binary("kustomize", "5.4.3")
+    assert not list((tmp_path / "cache" / "bin" / "kustomize").rglob("kustomize"))
@@ -0,0 +1,90 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from _nebari.drift import drift_configuration
+from _nebari.provider import opentofu
+from _nebari.stages.base import NebariKustomizeStage, NebariTerraformStage
+
+
+class FirstStage(NebariTerraformStage):
+    name = "01-first"
+    priority = 10
+    depends_on = []
+
+
+class SecondStage(NebariTerraformStage):
+    name = "02-second"
+    priority = 20
+    depends_on = ["stages/01-first"]
+
+
+class KustomizeStage(NebariKustomizeStage):
+    name = "03-kustomize"
+    priority = 30
+
+
+def test_drift_configuration(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+
+    def drift(directory, **kwargs):
+        if directory.endswith("01-first"):
+            return [{"address": "aws_eks_node_group.general", "action": "update"}]
+        raise opentofu.OpenTofuException("OpenTofu refresh-only plan failed")
+
+    with (
+        patch.object(NebariTerraformStage, "previous_outputs", return_value={}),
+        patch("_nebari.drift.opentofu.drift", side_effect=drift),
+    ):
+        drifted, failed = drift_configuration(
+            None, [FirstStage, SecondStage, KustomizeStage]
+        )
+
+    assert drifted == {
+        "01-first": [{"address": "aws_eks_node_group.general", "action": "update"}]
+    }
+    assert list(failed) == ["02-second"]
+    assert "aws_eks_node_group.general (update)" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("exit_code", [0, 2])
+@patch("_nebari.provider.opentofu._run_tofu_subprocess")
+def test_refresh_only_plan(mock_run, exit_code, tmp_path):
+    events = [
+        {"type": "version", "tofu": "1.8.3"},
+        {
+            "type": "resource_drift",
+            "change": {
+                "resource": {"addr": "kubernetes_secret.token"},
+                "action": "delete",
+            },
+        },
+        {"type": "change_summary", "changes": {"operation": "refresh-only"}},
+    ]
+
+    def run(command, stdout_callback=None, **kwargs):
+        for event in events:
+            stdout_callback(json.dumps(event).encode() + b"\n")
+        return exit_code, ""
+
+    mock_run.side_effect = run
+    drifted = opentofu.refresh_only_plan(tmp_path, var_files=["vars.json"])
+    assert drifted == [{"address": "kubernetes_secret.token", "action": "delete"}]
+    assert mock_run.call_args.args[0][:2] == ["plan", "-refresh-only"]
+    assert "-lock=false" in mock_run.call_args.args[0]
+
+    mock_run.side_effect = None
+    mock_run.return_value = (1, "")
+    with pytest.raises(opentofu.OpenTofuException):
+        opentofu.refresh_only_plan(tmp_path)
+
+
+@patch("_nebari.provider.opentofu.refresh_only_plan")
+@patch("_nebari.provider.opentofu._run_tofu_subprocess", return_value=(1, ""))
+def test_drift_init_failure(mock_run, mock_plan, tmp_path):
+    # a failing init is reported for the stage instead of exiting
+    with pytest.raises(opentofu.OpenTofuException):
+        opentofu.drift(str(tmp_path))
+    assert mock_run.call_args.args[0][0] == "init"
+    mock_plan.assert_not_called()
@@ -0,0 +1,66 @@
+import socket
+import time
+
+from _nebari import healthcheck
+
+
+def make_probe(succeed_after):
+    calls = []
+
+    async def probe():
+        calls.append(None)
+        return len(calls) >= succeed_after
+
+    return probe, calls
+
+
+def test_wait_until_healthy():
+    healthy, healthy_calls = make_probe(succeed_after=3)
+    down, down_calls = make_probe(succeed_after=100)
+
+    results = healthcheck.wait_until_healthy(
+        {"healthy": healthy, "down": down},
+        num_attempts=5,
+        initial_delay=0,
+        max_delay=0,
+    )
+
+    assert results == {"healthy": True, "down": False}
+    assert len(healthy_calls) == 3
+    assert len(down_calls) == 5
+
+
+def test_wait_until_healthy_deadline():
+    down, down_calls = make_probe(succeed_after=100)
+
+    start = time.monotonic()
+    results = healthcheck.wait_until_healthy(
+        {"down": down}, num_attempts=2, initial_delay=0.01, max_delay=0.1
+    )
+
+    # backoff probes more often but gives up no sooner than without it
+    assert results == {"down": False}
+    assert time.monotonic() - start >= 0.2
+    assert len(down_calls) > 2
+
+
+def test_tcp_probe():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        port = server.getsockname()[1]
+
+        results = healthcheck.wait_until_healthy(
+            {"open": healthcheck.tcp_probe("127.0.0.1", port)},
+            num_attempts=1,
+            max_delay=0,
+        )
+    assert results == {"open": True}
+
+    # the port is closed again once the server socket is gone
+    results = healthcheck.wait_until_healthy(
+        {"closed": healthcheck.tcp_probe("127.0.0.1", port)},
+        num_attempts=1,
+        max_delay=0,
+    )
+    assert results == {"closed": False}
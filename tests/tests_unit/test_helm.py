@@ -0,0 +1,28 @@
+from unittest.mock import patch
+
+from _nebari.provider import helm
+
+
+def test_cache_chart(tmp_path, monkeypatch):
+    monkeypatch.setattr("_nebari.utils.NEBARI_CACHE_DIR", str(tmp_path / "cache"))
+
+    def helm_pull(args):
+        chart = tmp_path / args[args.index("--untardir") + 1] / args[1]
+        chart.mkdir(parents=True)
+        (chart / "Chart.yaml").write_text(f"name: {args[1]}")
+
+    repo = "https://kuberhealthy.github.io/kuberhealthy/helm-repos"
+    with patch.object(helm, "run_helm_subprocess", side_effect=helm_pull) as pull:
+        helm.copy_cached_chart(repo, "kuberhealthy", "100", tmp_path / "a")
+        helm.copy_cached_chart(repo, "kuberhealthy", "100", tmp_path / "b")
+    pull.assert_called_once()
+
+    assert (
+        tmp_path
+        / "cache/helm-charts/kuberhealthy.github.io_kuberhealthy_helm-repos"
+        / "kuberhealthy/100/kuberhealthy/Chart.yaml"
+    ).is_file()
+    for chart_home in ["a", "b"]:
+        assert (
+            tmp_path / chart_home / "kuberhealthy-100/kuberhealthy/Chart.yaml"
+        ).is_file()
@@ -0,0 +1,330 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from kubernetes.dynamic.exceptions import ResourceNotFoundError
+
+from _nebari.provider import kubernetes
+
+MANIFEST = """
+apiVersion: v1
+kind: ConfigMap
+metadata:
+  name: a
+  namespace: dev
+---
+apiVersion: v1
+kind: ConfigMap
+metadata:
+  name: b
+  namespace: dev
+---
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: c
+  namespace: dev
+"""
+
+
+@patch("_nebari.provider.kubernetes.DynamicClient")
+def test_resource_resolver(mock_dynamic_client, tmp_path):
+    manifest = tmp_path / "manifest.yaml"
+    manifest.write_text(MANIFEST)
+    resources = mock_dynamic_client.return_value.resources
+
+    resolver = kubernetes.ResourceResolver(MagicMock())
+    kubernetes.create_from_yaml(None, manifest, apply=True, resolver=resolver)
+    kubernetes.create_from_yaml(None, manifest, apply=True, resolver=resolver)
+
+    # discovery once, one lookup per apiVersion and kind
+    mock_dynamic_client.assert_called_once()
+    assert resources.get.call_count == 2
+    assert resources.get.return_value.server_side_apply.call_count == 6
+
+    # invalidating discovers again rather than reloading the cache file
+    resolver.invalidate()
+    resources.invalidate_cache.assert_called_once()
+    resolver.get("v1", "ConfigMap")
+    mock_dynamic_client.assert_called_once()
+    assert resources.get.call_count == 3
+
+
+def test_apply_phases():
+    from _nebari.provider import kubernetes_apply
+
+    objects = [
+        {"kind": kind, "metadata": {"name": kind.lower()}}
+        for kind in ["Role", "Deployment", "Namespace", "ConfigMap", "MyResource"]
+    ]
+    assert [
+        [obj["kind"] for obj in phase] for phase in kubernetes_apply.phases(objects)
+    ] == [["Namespace"], ["Role"], ["ConfigMap"], ["Deployment", "MyResource"], []]
+
+
+def test_apply_objects(tmp_path):
+    import threading
+
+    from kubernetes.client.rest import ApiException
+
+    from _nebari.provider import kubernetes_apply
+
+    manifest = tmp_path / "manifest.yaml"
+    manifest.write_text(
+        MANIFEST
+        + """
+---
+apiVersion: v1
+kind: Namespace
+metadata:
+  name: dev
+---
+apiVersion: v1
+kind: List
+items:
+- apiVersion: apps/v1
+  kind: Deployment
+  metadata:
+    name: d
+"""
+    )
+    objects = kubernetes_apply.load_objects(manifest)
+    assert [obj["kind"] for obj in objects] == [
+        "ConfigMap",
+        "ConfigMap",
+        "Deployment",
+        "Namespace",
+        "Deployment",
+    ]
+
+    # both deployments can only be applied concurrently
+    barrier = threading.Barrier(2, timeout=5)
+    applied = []
+
+    def apply(k8s_client, obj, apply, resolver, namespace):
+        applied.append((obj["kind"], obj["metadata"]["name"], namespace))
+        if obj["kind"] == "Deployment":
+            barrier.wait()
+        if obj["metadata"]["name"] == "b":
+            raise ApiException(status=422, reason="Unprocessable Entity")
+
+    with patch.object(kubernetes, "create_from_yaml_single_item", side_effect=apply):
+        errors = kubernetes_apply.apply_objects(
+            None, objects, namespace="prod", resolver=MagicMock()
+        )
+
+    assert applied[0] == ("Namespace", "dev", "prod")
+    assert {kind for kind, _, _ in applied[1:3]} == {"ConfigMap"}
+    assert sorted(applied[3:]) == [
+        ("Deployment", "c", "dev"),
+        ("Deployment", "d", "prod"),
+    ]
+    assert [str(error) for error in errors] == [
+        "ConfigMap dev/b: (422) Unprocessable Entity"
+    ]
+
+
+@pytest.mark.parametrize(
+    "obj, status",
+    [
+        (
+            {
+                "kind": "Deployment",
+                "metadata": {"generation": 2},
+                "spec": {"replicas": 2},
+                "status": {"observedGeneration": 1},
+            },
+            "waiting for the controller to observe the change",
+        ),
+        (
+            {
+                "kind": "Deployment",
+                "metadata": {"generation": 2},
+                "spec": {"replicas": 2},
+                "status": {
+                    "observedGeneration": 2,
+                    "replicas": 2,
+                    "updatedReplicas": 2,
+                    "availableReplicas": 1,
+                },
+            },
+            "1/2 replicas available",
+        ),
+        (
+            {
+                "kind": "StatefulSet",
+                "metadata": {},
+                "spec": {},
+                "status": {
+                    "readyReplicas": 1,
+                    "currentRevision": "a",
+                    "updateRevision": "a",
+                },
+            },
+            None,
+        ),
+        (
+            {
+                "kind": "DaemonSet",
+                "metadata": {},
+                "spec": {},
+                "status": {"desiredNumberScheduled": 3, "updatedNumberScheduled": 2},
+            },
+            "2/3 pods updated",
+        ),
+        (
+            {
+                "kind": "CustomResourceDefinition",
+                "metadata": {},
+                "spec": {},
+                "status": {"conditions": [{"type": "Established", "status": "True"}]},
+            },
+            None,
+        ),
+    ],
+)
+def test_readiness_status(obj, status):
+    from _nebari.provider import kubernetes_readiness
+
+    assert kubernetes_readiness.STATUS[obj["kind"]](obj) == status
+
+
+def test_readiness_failed_job():
+    from _nebari.provider import kubernetes_readiness
+
+    job = {
+        "metadata": {},
+        "spec": {},
+        "status": {
+            "conditions": [
+                {"type": "Failed", "status": "True", "message": "BackoffLimitExceeded"}
+            ]
+        },
+    }
+    with pytest.raises(kubernetes_readiness.ReadinessError):
+        kubernetes_readiness.job_status(job)
+
+
+def test_wait_until_ready():
+    from _nebari.provider import kubernetes_readiness
+
+    def deployment(name, available, resource_version):
+        return {
+            "kind": "Deployment",
+            "metadata": {"name": name, "resourceVersion": resource_version},
+            "spec": {"replicas": 1},
+            "status": {
+                "replicas": 1,
+                "updatedReplicas": 1,
+                "availableReplicas": available,
+            },
+        }
+
+    listed = {
+        "a": [deployment("a", 1, "1")],
+        "b": [deployment("b", 0, "1")],
+        "c": [deployment("c", 0, "1")],
+    }
+    watched = {
+        "a": [],
+        "b": [{"type": "MODIFIED", "raw_object": deployment("b", 1, "2")}],
+        "c": [],
+    }
+
+    def get(resource, namespace, label_selector, field_selector):
+        name = field_selector.split("=")[1]
+        result = MagicMock()
+        result.to_dict.return_value = {
+            "metadata": {"resourceVersion": "1"},
+            "items": listed[name],
+        }
+        return result
+
+    def watch(resource, namespace, label_selector, field_selector, **kwargs):
+        # the server closes the watch after the timeout
+        assert kwargs["resource_version"] in ("1", "2")
+        return iter(watched[field_selector.split("=")[1]])
+
+    resolver = MagicMock()
+    resolver.dynamic_client.get.side_effect = get
+    resolver.dynamic_client.watch.side_effect = watch
+
+    targets = kubernetes_readiness.targets(
+        [deployment(name, 0, "1") | {"apiVersion": "apps/v1"} for name in "abc"]
+        + [{"apiVersion": "v1", "kind": "ConfigMap", "metadata": {"name": "d"}}],
+        namespace="dev",
+    )
+    assert [str(target) for target in targets] == [
+        "Deployment dev/a",
+        "Deployment dev/b",
+        "Deployment dev/c",
+    ]
+
+    not_ready = kubernetes_readiness.wait_until_ready(
+        None, targets, timeout=0.5, resolver=resolver
+    )
+    assert {str(target): status for target, status in not_ready.items()} == {
+        "Deployment dev/c": "0/1 replicas available"
+    }
+    # the ready deployment is never watched
+    watched_names = {
+        call.kwargs["field_selector"]
+        for call in resolver.dynamic_client.watch.call_args_list
+    }
+    assert watched_names == {"metadata.name=b", "metadata.name=c"}
+
+
+def test_wait_until_ready_retries(monkeypatch):
+    import urllib3
+
+    from _nebari.provider import kubernetes_readiness
+
+    monkeypatch.setattr(kubernetes_readiness, "WATCH_RETRY_DELAY", 0.01)
+
+    crd = {
+        "kind": "CustomResourceDefinition",
+        "metadata": {"name": "a", "resourceVersion": "1"},
+        "spec": {},
+    }
+    established = {
+        **crd,
+        "status": {"conditions": [{"type": "Established", "status": "True"}]},
+    }
+
+    resolver = MagicMock()
+    # the kind is not served yet
+    resolver.get.side_effect = [ResourceNotFoundError("not served")] + [MagicMock()] * 2
+    resolver.dynamic_client.get.return_value.to_dict.return_value = {
+        "metadata": {"resourceVersion": "1"},
+        "items": [crd],
+    }
+    resolver.dynamic_client.watch.side_effect = [
+        # closed without any events
+        iter([]),
+        urllib3.exceptions.ProtocolError("connection dropped"),
+        iter([{"type": "MODIFIED", "raw_object": established}]),
+    ]
+
+    target = kubernetes_readiness.Target(
+        "apiextensions.k8s.io/v1", "CustomResourceDefinition", name="a"
+    )
+    assert (
+        kubernetes_readiness.wait_until_ready(
+            None, [target], timeout=5, resolver=resolver
+        )
+        == {}
+    )
+    assert resolver.dynamic_client.get.call_count == 2
+    assert resolver.dynamic_client.watch.call_count == 3
+
+
+def test_wait_until_ready_unexpected_error():
+    from _nebari.provider import kubernetes_readiness
+
+    resolver = MagicMock()
+    resolver.get.side_effect = KeyError("kind")
+
+    target = kubernetes_readiness.Target("v1", "Pod", name="a", namespace="dev")
+    not_ready = kubernetes_readiness.wait_until_ready(
+        None, [target], timeout=5, resolver=resolver
+    )
+    assert not_ready == {target: "failed: KeyError('kind')"}
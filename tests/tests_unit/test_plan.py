@@ -0,0 +1,54 @@
+import threading
+from unittest.mock import patch
+
+from _nebari.plan import plan_configuration
+from _nebari.stages.base import NebariKustomizeStage, NebariTerraformStage
+
+
+class FirstStage(NebariTerraformStage):
+    name = "01-first"
+    priority = 10
+    depends_on = []
+
+
+class SecondStage(NebariTerraformStage):
+    name = "02-second"
+    priority = 20
+    depends_on = ["stages/01-first"]
+
+    def input_vars(self, stage_outputs):
+        return {"upstream": stage_outputs["stages/01-first"]["output"]["value"]}
+
+
+class KustomizeStage(NebariKustomizeStage):
+    name = "03-kustomize"
+    priority = 30
+
+
+def test_plan_configuration(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # both stages can only finish planning once they are planned concurrently
+    barrier = threading.Barrier(2, timeout=5)
+    planned_input_vars = {}
+
+    def plan_changes(directory, input_vars, **kwargs):
+        barrier.wait()
+        planned_input_vars[directory] = input_vars
+        return {"create": 1, "update": 0, "replace": 0, "delete": 0}
+
+    with (
+        patch.object(
+            NebariTerraformStage,
+            "previous_outputs",
+            side_effect=lambda input_vars: {"output": {"value": "deployed"}},
+        ),
+        patch("_nebari.plan.opentofu.plan_changes", side_effect=plan_changes),
+    ):
+        planned_changes = plan_configuration(
+            None, [FirstStage, SecondStage, KustomizeStage]
+        )
+
+    assert list(planned_changes) == ["01-first", "02-second"]
+    assert planned_input_vars[str(tmp_path / "stages/02-second")] == {
+        "upstream": "deployed"
+    }
@@ -1,4 +1,5 @@
 import os
+import pathlib
 
 from _nebari.stages.bootstrap import CiEnum
 from nebari.plugins import nebari_plugin_manager
@@ -32,3 +33,76 @@ def test_render_config(nebari_render):
         assert (output_directory / ".github/workflows/").is_dir()
     elif config.ci_cd.type == CiEnum.gitlab_ci:
         assert (output_directory / ".gitlab-ci.yml").is_file()
+
+
+def test_inspect_files_manifest(tmp_path, monkeypatch):
+    from _nebari import render
+
+    stage = tmp_path / "stages" / "01-a"
+    (stage / ".terraform" / "providers").mkdir(parents=True)
+    (stage / ".terraform" / "providers" / "provider").write_bytes(b"binary")
+    (stage / "main.tf").write_text("old")
+    (stage / "stale.tf").write_text("stale")
+    contents = {
+        pathlib.Path("stages/01-a/main.tf"): "new",
+        pathlib.Path("stages/01-a/outputs.tf"): b"outputs",
+    }
+
+    hashed = []
+    hash_file = render.hash_file
+    monkeypatch.setattr(
+        render, "hash_file", lambda path: hashed.append(path) or hash_file(path)
+    )
+
+    manifest = render.read_manifest(tmp_path)
+    new, untracked, updated, deleted = render.inspect_files(
+        tmp_path,
+        ignore_directories=[".terraform"],
+        deleted_paths=[],
+        contents=contents,
+        manifest=manifest,
+    )
+    assert new == {pathlib.Path("stages/01-a/outputs.tf")}
+    assert updated == {pathlib.Path("stages/01-a/main.tf")}
+    assert untracked == {pathlib.Path("stages/01-a/stale.tf")}
+    # ignored directories are not walked
+    assert sorted(path.name for path in hashed) == ["main.tf", "stale.tf"]
+    render.write_manifest(tmp_path, manifest)
+
+    # unchanged files are not hashed again
+    hashed.clear()
+    render.inspect_files(
+        tmp_path,
+        ignore_directories=[".terraform"],
+        contents=contents,
+        manifest=render.read_manifest(tmp_path),
+    )
+    assert hashed == []
+
+
+def test_render_template_concurrent(tmp_path, capsys):
+    import threading
+
+    from _nebari.render import render_template
+    from nebari.hookspecs import NebariStage
+
+    # both stages can only finish rendering once they render concurrently
+    barrier = threading.Barrier(2, timeout=5)
+
+    def make_stage(name, contents):
+        def render(self):
+            barrier.wait()
+            return contents
+
+        return type(name, (NebariStage,), {"name": name, "render": render})
+
+    stages = [
+        make_stage("01-a", {pathlib.Path("a.txt"): "a", pathlib.Path("b.txt"): "a"}),
+        make_stage("02-b", {pathlib.Path("b.txt"): "b"}),
+    ]
+    render_template(tmp_path, None, stages, show_render_times=True)
+
+    assert (tmp_path / "a.txt").read_text() == "a"
+    # later stages override the files of earlier ones
+    assert (tmp_path / "b.txt").read_text() == "b"
+    assert "01-a" in capsys.readouterr().out
@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from _nebari.scheduler import run_stages, stage_dependencies
+from nebari.hookspecs import NebariStage
+
+
+def make_stage(name, priority, depends_on=None):
+    return type(
+        name,
+        (NebariStage,),
+        {"name": name, "priority": priority, "depends_on": depends_on},
+    )
+
+
+@pytest.fixture
+def stages():
+    return [
+        make_stage("01-a", 10, []),
+        make_stage("02-b", 20, ["stages/01-a"]),
+        make_stage("03-c", 30, ["stages/01-a"]),
+        make_stage("04-d", 40, ["stages/02-b", "stages/03-c", "stages/99-excluded"]),
+        make_stage("05-e", 50),
+    ]
+
+
+def test_stage_dependencies(stages):
+    assert stage_dependencies(stages) == {
+        "01-a": set(),
+        "02-b": {"01-a"},
+        "03-c": {"01-a"},
+        "04-d": {"02-b", "03-c"},
+        "05-e": {"01-a", "02-b", "03-c", "04-d"},
+    }
+
+
+def test_stage_dependencies_later_stage():
+    stages = [make_stage("01-a", 10, ["stages/02-b"]), make_stage("02-b", 20, [])]
+    with pytest.raises(ValueError, match="does not run before it"):
+        stage_dependencies(stages)
+
+
+def test_run_stages_serial(stages):
+    order = [stage.name for stage, _ in run_stages(stages, lambda s: None)]
+    assert order == [stage.name for stage in stages]
+
+
+def test_run_stages_parallel(stages):
+    # 02-b and 03-c can only finish once both of them are running
+    barrier = threading.Barrier(2, timeout=5)
+    finished = []
+
+    def run(stage):
+        if stage.name in {"02-b", "03-c"}:
+            barrier.wait()
+        finished.append(stage.name)
+        return stage.name
+
+    results = dict(run_stages(stages, run, max_workers=4))
+    assert list(results.values()) == [stage.name for stage in results]
+    assert finished[0] == "01-a"
+    assert finished[3:] == ["04-d", "05-e"]
+
+
+def test_run_stages_error(stages):
+    def run(stage):
+        if stage.name == "02-b":
+            raise RuntimeError("boom")
+
+    completed = []
+    with pytest.raises(RuntimeError, match="boom"):
+        for stage, _ in run_stages(stages, run, max_workers=4):
+            completed.append(stage.name)
+    assert "04-d" not in completed
+    assert "05-e" not in completed
@@ -1,5 +1,9 @@
+import json
+import os
 import pathlib
-from unittest.mock import patch
+import shutil
+import stat
+from unittest.mock import PropertyMock, patch
 
 import pytest
 
@@ -145,3 +149,516 @@ def test_node_group_taints(taints, keys, values, effects):
     assert [t.key for t in ng.taints] == keys
     assert [t.value for t in ng.taints] == values
     assert [t.effect for t in ng.taints] == effects
+
+
+@patch.object(TerraformStateStage, "post_deploy")
+@patch.object(TerraformStateStage, "get_nebari_config_state", return_value=None)
+@patch("_nebari.stages.base.opentofu.deploy")
+def test_deploy_skip_unchanged(
+    mock_deploy, mock_get_state, mock_post_deploy, terraform_state_stage
+):
+    mock_deploy.return_value = {"output": {"value": "first"}}
+    stage_directory = terraform_state_stage.output_directory / (
+        terraform_state_stage.stage_prefix
+    )
+    stage_directory.mkdir(parents=True)
+    (stage_directory / "main.tf").write_text("# main")
+
+    terraform_state_stage.skip_unchanged = True
+    stage_outputs = {}
+    with terraform_state_stage.deploy(stage_outputs):
+        pass
+    assert mock_deploy.call_count == 1
+
+    # unchanged stage reuses the outputs of the last deploy
+    stage_outputs = {}
+    with terraform_state_stage.deploy(stage_outputs):
+        pass
+    assert mock_deploy.call_count == 1
+    assert stage_outputs["stages/01-terraform-state"] == {"output": {"value": "first"}}
+    # post deploy steps run even when the apply is skipped
+    assert mock_post_deploy.call_count == 2
+
+    # changes to the rendered files trigger an apply
+    (stage_directory / "main.tf").write_text("# changed")
+    with terraform_state_stage.deploy(stage_outputs):
+        pass
+    assert mock_deploy.call_count == 2
+
+
+@pytest.mark.parametrize("plan_first", [False, True])
+@patch.object(TerraformStateStage, "get_nebari_config_state", return_value=None)
+@patch("_nebari.stages.base.opentofu.deploy", return_value={})
+def test_deploy_plan_first_stage(
+    mock_deploy, mock_get_state, plan_first, terraform_state_stage
+):
+    terraform_state_stage.plan_first = plan_first
+    with terraform_state_stage.deploy({}):
+        pass
+    assert mock_deploy.call_args.kwargs["tofu_plan"] == plan_first
+
+
+@pytest.mark.parametrize(
+    "unchanged, outputs",
+    [
+        (True, {"output": {"value": "cached"}}),
+        (False, {"output": {"value": "tofu"}}),
+    ],
+)
+@patch.object(TerraformStateStage, "get_nebari_config_state", return_value=None)
+@patch("_nebari.stages.base.opentofu.output")
+@patch("_nebari.stages.base.opentofu.deploy")
+def test_deploy_restore_outputs(
+    mock_deploy,
+    mock_output,
+    mock_get_state,
+    unchanged,
+    outputs,
+    terraform_state_stage,
+):
+    mock_output.return_value = {"output": {"value": "tofu"}}
+    (
+        terraform_state_stage.output_directory
+        / terraform_state_stage.stage_prefix
+        / ".terraform"
+    ).mkdir(parents=True)
+    fingerprint = terraform_state_stage.fingerprint(
+        terraform_state_stage.input_vars({})
+    )
+    terraform_state_stage.write_stage_cache(
+        fingerprint=fingerprint if unchanged else "changed",
+        outputs={"output": {"value": "cached"}},
+    )
+
+    terraform_state_stage.restore_outputs = True
+    stage_outputs = {}
+    with terraform_state_stage.deploy(stage_outputs):
+        pass
+
+    mock_deploy.assert_not_called()
+    assert stage_outputs["stages/01-terraform-state"] == outputs
+
+
+@patch("_nebari.provider.opentofu.run_tofu_subprocess")
+def test_init_skip_unchanged(mock_run, tmp_path):
+    from _nebari.provider import opentofu
+
+    def fake_init(command, cwd, **kwargs):
+        (pathlib.Path(cwd) / ".terraform").mkdir(exist_ok=True)
+        (pathlib.Path(cwd) / opentofu.LOCK_FILENAME).write_text("# lock")
+
+    mock_run.side_effect = fake_init
+    (tmp_path / "main.tf").write_text("# main")
+
+    opentofu.init(tmp_path)
+    opentofu.init(tmp_path)
+    assert mock_run.call_count == 1
+
+    # forced init, e.g. to upgrade providers
+    opentofu.init(tmp_path, force=True)
+    assert mock_run.call_count == 2
+
+    # changes to the configuration or lock file require a new init
+    (tmp_path / "main.tf").write_text("# changed")
+    opentofu.init(tmp_path)
+    assert mock_run.call_count == 3
+    (tmp_path / opentofu.LOCK_FILENAME).write_text("# changed lock")
+    opentofu.init(tmp_path)
+    assert mock_run.call_count == 4
+
+
+@patch("_nebari.provider.opentofu.state_pull")
+def test_pending_imports(mock_state_pull):
+    from _nebari.provider import opentofu
+
+    mock_state_pull.return_value = {
+        "resources": [
+            {
+                "module": "module.terraform-state",
+                "mode": "managed",
+                "type": "aws_s3_bucket",
+                "name": "terraform-state",
+                "instances": [{}],
+            },
+            {
+                "mode": "managed",
+                "type": "aws_subnet",
+                "name": "main",
+                "instances": [{"index_key": 0}],
+            },
+        ]
+    }
+    state_imports = [
+        ("module.terraform-state.aws_s3_bucket.terraform-state", "bucket"),
+        ("aws_subnet.main[0]", "subnet-0"),
+        ("aws_subnet.main[1]", "subnet-1"),
+    ]
+    assert opentofu.pending_imports("stage", state_imports) == [
+        ("aws_subnet.main[1]", "subnet-1")
+    ]
+
+    mock_state_pull.side_effect = opentofu.OpenTofuException("no state")
+    assert opentofu.pending_imports("stage", state_imports) == state_imports
+
+
+@patch("_nebari.provider.opentofu.output", return_value={})
+@patch("_nebari.provider.opentofu.tfimport")
+@patch("_nebari.provider.opentofu.apply")
+@patch("_nebari.provider.opentofu.state_pull", return_value={})
+def test_deploy_batch_imports(
+    mock_state_pull, mock_apply, mock_tfimport, mock_output, tmp_path
+):
+    from _nebari.provider import opentofu
+
+    imports = []
+
+    def fake_apply(directory, var_files, **kwargs):
+        imports.append(json.loads((tmp_path / opentofu.IMPORTS_FILENAME).read_text()))
+
+    mock_apply.side_effect = fake_apply
+
+    opentofu.deploy(
+        tmp_path,
+        tofu_init=False,
+        tofu_import=True,
+        state_imports=[("aws_s3_bucket.a", "a"), ("aws_s3_bucket.b", "b")],
+        batch_imports=True,
+    )
+
+    mock_tfimport.assert_not_called()
+    assert imports == [
+        {
+            "import": [
+                {"to": "aws_s3_bucket.a", "id": "a"},
+                {"to": "aws_s3_bucket.b", "id": "b"},
+            ]
+        }
+    ]
+    assert not (tmp_path / opentofu.IMPORTS_FILENAME).exists()
+
+
+@patch("_nebari.provider.opentofu.output", return_value={})
+@patch("_nebari.provider.opentofu.tfimport")
+@patch("_nebari.provider.opentofu.apply")
+@patch("_nebari.provider.opentofu.state_pull")
+def test_deploy_imports(
+    mock_state_pull, mock_apply, mock_tfimport, mock_output, tmp_path
+):
+    from _nebari.provider import opentofu
+
+    state_imports = [("aws_s3_bucket.a", "a"), ("aws_s3_bucket.b", "b")]
+    opentofu.deploy(
+        tmp_path, tofu_init=False, tofu_import=True, state_imports=state_imports
+    )
+
+    # without batch imports every import runs without reading the state first
+    mock_state_pull.assert_not_called()
+    assert [call.args for call in mock_tfimport.call_args_list] == state_imports
+    mock_apply.assert_called_once()
+
+
+@pytest.mark.parametrize("exit_code, applied", [(0, False), (2, True)])
+@patch("_nebari.provider.opentofu.output", return_value={})
+@patch("_nebari.provider.opentofu.apply")
+@patch("_nebari.provider.opentofu._run_tofu_subprocess")
+def test_deploy_plan_first(
+    mock_run, mock_apply, mock_output, exit_code, applied, tmp_path
+):
+    from _nebari.provider import opentofu
+
+    mock_run.return_value = (exit_code, None)
+
+    opentofu.deploy(tmp_path, tofu_init=False, tofu_plan=True)
+
+    assert mock_run.call_args.args[0][:3] == [
+        "plan",
+        "-input=false",
+        "-detailed-exitcode",
+    ]
+    assert mock_apply.called == applied
+    if applied:
+        assert mock_apply.call_args.kwargs["plan_file"].name == "nebari.tfplan"
+
+
+def test_summarize_plan():
+    from _nebari.provider import opentofu
+
+    plan = {
+        "resource_changes": [
+            {"change": {"actions": ["create"]}},
+            {"change": {"actions": ["create"]}},
+            {"change": {"actions": ["update"]}},
+            {"change": {"actions": ["delete", "create"]}},
+            {"change": {"actions": ["delete"]}},
+            {"change": {"actions": ["no-op"]}},
+            {"change": {"actions": ["read"]}},
+        ]
+    }
+    assert opentofu.summarize_plan(plan) == {
+        "create": 2,
+        "update": 1,
+        "replace": 1,
+        "delete": 1,
+    }
+
+
+@patch("_nebari.provider.opentofu._run_tofu_subprocess")
+def test_apply_progress(mock_run, tmp_path, capsys):
+    from _nebari.provider import opentofu
+
+    events = [
+        {"type": "version", "@message": "OpenTofu 1.8.3"},
+        {
+            "type": "apply_start",
+            "@message": "aws_eks_node_group.general: Creating...",
+            "hook": {
+                "resource": {"addr": "aws_eks_node_group.general"},
+                "action": "create",
+            },
+        },
+        {
+            "type": "apply_complete",
+            "@message": "aws_eks_node_group.general: Creation complete after 15m2s",
+            "hook": {
+                "resource": {"addr": "aws_eks_node_group.general"},
+                "action": "create",
+                "elapsed_seconds": 902,
+            },
+        },
+        {
+            "type": "change_summary",
+            "@message": "Apply complete! Resources: 1 added, 0 changed, 0 destroyed.",
+            "changes": {"add": 1, "change": 0, "remove": 0, "operation": "apply"},
+        },
+    ]
+
+    def fake_run(command, stdout_callback, **kwargs):
+        for event in events:
+            stdout_callback(json.dumps(event).encode("utf-8") + b"\n")
+        return 0, None
+
+    mock_run.side_effect = fake_run
+
+    opentofu.apply(tmp_path, progress=True)
+
+    assert "-json" in mock_run.call_args.args[0]
+    assert "Creation complete after 15m2s" in capsys.readouterr().out
+    report = json.loads(
+        (tmp_path / ".terraform" / "nebari-apply-report.json").read_text()
+    )
+    assert report["total"] == 1
+    assert report["resources"] == [
+        {
+            "address": "aws_eks_node_group.general",
+            "action": "create",
+            "duration": 902,
+            "status": "complete",
+        }
+    ]
+
+
+def test_tofu_settings(terraform_state_stage):
+    assert terraform_state_stage.tofu_settings() == {
+        "parallelism": None,
+        "refresh": True,
+    }
+
+    terraform_state = terraform_state_stage.config.terraform_state
+    terraform_state.parallelism = 15
+    terraform_state.stages = {"01-terraform-state": {"refresh": False}}
+    assert terraform_state_stage.tofu_settings() == {
+        "parallelism": 15,
+        "refresh": False,
+    }
+
+    terraform_state.stages = {"01-terraform-state": {"parallelism": 5}}
+    terraform_state_stage.refresh_override = False
+    assert terraform_state_stage.tofu_settings() == {
+        "parallelism": 5,
+        "refresh": False,
+    }
+
+    terraform_state_stage.parallelism_override = 30
+    assert terraform_state_stage.tofu_settings()["parallelism"] == 30
+
+
+@patch("_nebari.provider.opentofu.run_tofu_subprocess")
+def test_apply_tofu_options(mock_run, tmp_path):
+    from _nebari.provider import opentofu
+
+    opentofu.apply(tmp_path, var_files=["vars.json"], parallelism=20, refresh=False)
+    assert mock_run.call_args.args[0] == [
+        "apply",
+        "-auto-approve",
+        "-parallelism=20",
+        "-refresh=false",
+        "-var-file=vars.json",
+    ]
+
+    # refresh is part of a saved plan
+    opentofu.apply(tmp_path, plan_file="nebari.tfplan", parallelism=20, refresh=False)
+    assert mock_run.call_args.args[0] == [
+        "apply",
+        "-auto-approve",
+        "-parallelism=20",
+        "nebari.tfplan",
+    ]
+
+
+def test_get_nebari_config_state(terraform_state_stage):
+    assert terraform_state_stage.get_nebari_config_state() is None
+
+    state = {
+        "version": 4,
+        "serial": 3,
+        "lineage": "abc",
+        "outputs": {"resources": {"value": [], "type": ["list", "string"]}},
+        "resources": [
+            {
+                "mode": "data",
+                "type": "terraform_data",
+                "name": "nebari_config",
+                "instances": [],
+            },
+            {
+                "mode": "managed",
+                "type": "terraform_data",
+                "name": "nebari_config",
+                "instances": [
+                    {
+                        "attributes": {
+                            "id": "1",
+                            "input": {
+                                "value": {"project_name": "test"},
+                                "type": ["object", {"project_name": "string"}],
+                            },
+                        }
+                    }
+                ],
+            },
+            "not decoded",
+        ],
+    }
+    directory = (
+        terraform_state_stage.output_directory / terraform_state_stage.stage_prefix
+    )
+    directory.mkdir(parents=True)
+    state_file = directory / "terraform.tfstate"
+    # the trailing resource is invalid JSON and never decoded
+    state_file.write_text(json.dumps(state, indent=2).replace('"not decoded"', "x"))
+    assert terraform_state_stage.get_nebari_config_state() == {"project_name": "test"}
+
+    # cached for the state serial
+    state["resources"] = []
+    state_file.write_text(json.dumps(state))
+    assert terraform_state_stage.get_nebari_config_state() == {"project_name": "test"}
+
+    state["serial"] = 4
+    state_file.write_text(json.dumps(state))
+    assert terraform_state_stage.get_nebari_config_state() is None
+
+
+@patch("_nebari.provider.opentofu.run_tofu_subprocess")
+def test_get_nebari_config_state_remote(mock_run, terraform_state_stage):
+    # the terraform state stage itself always uses the local backend
+    terraform_state_stage.config.terraform_state.type = "remote"
+    state = {
+        "serial": 1,
+        "lineage": "abc",
+        "resources": [
+            {
+                "module": "module.other",
+                "mode": "managed",
+                "type": "terraform_data",
+                "name": "nebari_config",
+                "instances": [{"attributes": {"input": {"project_name": "y"}}}],
+            },
+            {
+                "mode": "managed",
+                "type": "terraform_data",
+                "name": "nebari_config",
+                "instances": [{"attributes": {"input": {"project_name": "x"}}}],
+            },
+        ],
+    }
+    directory = (
+        terraform_state_stage.output_directory / terraform_state_stage.stage_prefix
+    )
+    directory.mkdir(parents=True)
+    (directory / "terraform.tfstate").write_text(json.dumps(state))
+
+    assert terraform_state_stage.get_nebari_config_state() == {"project_name": "x"}
+    mock_run.assert_not_called()
+
+
+@patch("_nebari.stages.base.helm.download_helm_binary", return_value="helm")
+@patch("_nebari.stages.base.helm.copy_cached_chart")
+@patch("_nebari.stages.base.kustomize.run_kustomize_subprocess")
+def test_kustomize_render_scratch_copy(
+    mock_kustomize, mock_copy_chart, mock_helm, mock_config, tmp_path
+):
+    from _nebari.stages.kubernetes_kuberhealthy import KuberHealthyStage
+
+    stage = KuberHealthyStage(tmp_path, mock_config)
+    template_files = sorted(stage.template_directory.rglob("*"))
+
+    def kustomize_build(args):
+        build_dir = pathlib.Path(args[-1])
+        assert build_dir != stage.template_directory
+        assert (build_dir / "kustomization.yaml").is_file()
+        assert (build_dir / "values.yaml").is_file()
+        output_dir = pathlib.Path(args[args.index("-o") + 1])
+        (output_dir / "deployment.yaml").write_text("kind: Deployment")
+
+    mock_kustomize.side_effect = kustomize_build
+    contents = stage.render()
+
+    assert contents == {
+        pathlib.Path("stages/10-kubernetes-kuberhealthy/manifests/deployment.yaml"): (
+            b"kind: Deployment"
+        )
+    }
+    assert mock_copy_chart.call_args.args[1:3] == ("kuberhealthy", "100")
+    # the installed package is left untouched
+    assert sorted(stage.template_directory.rglob("*")) == template_files
+
+
+@patch("_nebari.stages.base.helm.download_helm_binary", return_value="helm")
+@patch("_nebari.stages.base.helm.copy_cached_chart")
+@patch("_nebari.stages.base.kustomize.run_kustomize_subprocess")
+def test_kustomize_render_read_only_template(
+    mock_kustomize, mock_copy_chart, mock_helm, mock_config, tmp_path
+):
+    from _nebari.stages.kubernetes_kuberhealthy import KuberHealthyStage
+
+    # a package installed read-only, e.g. into a Nix store
+    template_directory = tmp_path / "template"
+    shutil.copytree(
+        KuberHealthyStage(tmp_path, mock_config).template_directory, template_directory
+    )
+    for root, dirs, filenames in os.walk(template_directory):
+        for filename in filenames:
+            (pathlib.Path(root) / filename).chmod(0o444)
+    for root, dirs, filenames in os.walk(template_directory, topdown=False):
+        pathlib.Path(root).chmod(0o555)
+
+    def kustomize_build(args):
+        build_dir = pathlib.Path(args[-1])
+        for root, dirs, filenames in os.walk(build_dir):
+            assert pathlib.Path(root).stat().st_mode & stat.S_IWUSR
+            for filename in filenames:
+                assert (pathlib.Path(root) / filename).stat().st_mode & stat.S_IWUSR
+
+    mock_kustomize.side_effect = kustomize_build
+    try:
+        with patch.object(
+            KuberHealthyStage,
+            "template_directory",
+            new_callable=PropertyMock,
+            return_value=template_directory,
+        ):
+            KuberHealthyStage(tmp_path, mock_config).render()
+        mock_kustomize.assert_called_once()
+    finally:
+        for root, dirs, filenames in os.walk(template_directory):
+            pathlib.Path(root).chmod(0o755)
@@ -1,14 +1,28 @@
+import json
+import logging
+import os
 import sys
+from unittest.mock import patch
 
 import pytest
 
+from _nebari.timing import collect
 from _nebari.utils import (
     JsonDiff,
     JsonDiffEnum,
+    OutputBuffer,
+    SubprocessCommand,
     byte_unit_conversion,
     deep_merge,
+    deep_merge_into,
+    modified_environ,
     run_subprocess_cmd,
+    run_subprocesses,
+    subprocess_log,
+    timer,
 )
+from nebari.hookspecs import hookimpl
+from nebari.plugins import nebari_plugin_manager
 
 
 @pytest.mark.parametrize(
@@ -146,6 +160,24 @@ def test_deep_merge_empty():
     assert result == expected_result
 
 
+def test_deep_merge_into():
+    values = [
+        {"a": [1, 2], "b": {"c": 1, "z": [5, 6]}, "e": {"f": {"g": {}}}, "m": 1},
+        {"a": [3, 4], "b": {"d": 2, "z": [7]}, "e": {"f": {"h": 1}}, "m": [1]},
+        {"b": {"z": [8], "c": {"x": 1}}, "n": {"o": [9]}},
+    ]
+    expected_result = deep_merge(*values)
+
+    result = deep_merge_into({}, *values)
+    assert result == expected_result
+    assert list(result.keys()) == list(expected_result.keys())
+    assert list(result["b"].keys()) == list(expected_result["b"].keys())
+
+    # merged values are never modified
+    deep_merge_into(result, {"n": {"o": [10], "p": 1}})
+    assert values[2] == {"b": {"z": [8], "c": {"x": 1}}, "n": {"o": [9]}}
+
+
 size_kb_end_args = [
     (1, ""),  # 1KB no newline
     (1, "\\n"),  # 1KB with newline
@@ -172,4 +204,198 @@ def test_run_subprocess_cmd(size_kb, end):
         command, capture_output=True, strip_errors=True, timeout=1
     )
     assert exit_code == 0
-    assert len(output.decode()) == size_kb * 1024 + (1 if end else 0)
+    with output:
+        assert len(output.getvalue().decode()) == size_kb * 1024 + (1 if end else 0)
+
+
+def test_timer_timing_report(tmp_path):
+    logger = logging.getLogger(__name__)
+    report_filename = tmp_path / "timings.json"
+
+    with collect("deploy", report_filename):
+        with timer(logger, "tofu apply", category="tofu", directory="stages/a"):
+            pass
+        with timer(logger, "tofu apply", category="tofu", directory="stages/b"):
+            pass
+    # spans outside of `collect` are not recorded
+    with timer(logger, "tofu output"):
+        pass
+
+    with report_filename.open() as f:
+        report = json.load(f)
+    assert report["command"] == "deploy"
+    assert [span["args"]["directory"] for span in report["spans"]] == [
+        "stages/a",
+        "stages/b",
+    ]
+    assert report["summary"]["tofu apply"]["count"] == 2
+
+    with (tmp_path / "timings.trace.json").open() as f:
+        trace = json.load(f)
+    assert [e["name"] for e in trace["traceEvents"] if e["ph"] == "X"] == [
+        "tofu apply",
+        "tofu apply",
+    ]
+
+
+def test_run_subprocess_cmd_hook():
+    calls = []
+
+    class Plugin:
+        @hookimpl
+        def nebari_subprocess_finished(self, args, exit_code, duration):
+            calls.append((args, exit_code))
+
+    plugin = Plugin()
+    nebari_plugin_manager.plugin_manager.register(plugin)
+    try:
+        command = [sys.executable, "-c", "import sys; sys.exit(3)"]
+        exit_code, _ = run_subprocess_cmd(command, capture_output=True)
+    finally:
+        nebari_plugin_manager.plugin_manager.unregister(plugin)
+
+    assert exit_code == 3
+    assert calls == [(command, 3)]
+
+
+def test_run_subprocess_cmd_hook_on_error():
+    calls = []
+
+    class Plugin:
+        @hookimpl
+        def nebari_subprocess_finished(self, args, exit_code, duration):
+            calls.append((args, exit_code))
+
+    def process_streams(process, *args, **kwargs):
+        process.stdout.close()
+        process.stderr.close()
+        process.wait()
+        raise OSError("reading the output failed")
+
+    plugin = Plugin()
+    nebari_plugin_manager.plugin_manager.register(plugin)
+    try:
+        command = [sys.executable, "-c", "pass"]
+        with patch("_nebari.utils.process_streams", side_effect=process_streams):
+            with pytest.raises(OSError):
+                run_subprocess_cmd(command, capture_output=True)
+    finally:
+        nebari_plugin_manager.plugin_manager.unregister(plugin)
+
+    assert calls == [(command, 0)]
+
+
+def test_output_buffer_spill():
+    buffer = OutputBuffer(max_bytes=10)
+    for i in range(10):
+        buffer.append(f"line {i}\n".encode())
+    assert buffer.size <= 10
+    assert buffer.getvalue() == b"".join(f"line {i}\n".encode() for i in range(10))
+    # iterating reads the spilled output back in blocks
+    assert b"".join(buffer) == buffer.getvalue()
+    buffer.close()
+
+
+@patch("_nebari.utils.READ_SIZE", 256)
+@patch("_nebari.utils.CAPTURE_MAX_BYTES", 1024)
+def test_run_subprocess_cmd_capture_bounded():
+    command = [sys.executable, "-c", "[print(f'{i:099d}') for i in range(100)]"]
+
+    exit_code, output = run_subprocess_cmd(command, capture_output=True)
+    assert exit_code == 0
+    with output:
+        # only the most recent output is held in memory, the rest spilled
+        assert isinstance(output, OutputBuffer)
+        assert output.size <= 1024
+        assert b"".join(output) == b"".join(f"{i:099d}\n".encode() for i in range(100))
+
+
+def test_run_subprocess_cmd_capture_callback():
+    lines = []
+    command = [sys.executable, "-c", "[print('line', i) for i in range(3)]"]
+
+    exit_code, output = run_subprocess_cmd(
+        command, capture_output=True, stdout_callback=lines.append
+    )
+    assert exit_code == 0
+    assert output.getvalue() == b""
+    assert lines == [b"line 0\n", b"line 1\n", b"line 2\n"]
+
+
+def test_run_subprocess_cmd_log(tmp_path, capsysbinary):
+    script = "import sys; print('\\x1b[31mout\\x1b[0m'); print('err', file=sys.stderr); print('last', end='')"
+    command = [sys.executable, "-c", script]
+
+    with subprocess_log(tmp_path / "stage.log"):
+        exit_code, _ = run_subprocess_cmd(command, prefix="test", strip_errors=True)
+    assert exit_code == 0
+
+    stdout = capsysbinary.readouterr().out
+    assert b"[test]: out\n" in stdout
+    assert b"[test]: err\n" in stdout
+    assert b"[test]: last\n" in stdout
+
+    log = (tmp_path / "stage.log").read_bytes()
+    assert log.startswith(b"$ " + sys.executable.encode())
+    assert log.endswith(b"out\nerr\nlast")
+
+
+def test_run_subprocesses(capsysbinary):
+    script = "import time; [print('line', i, flush=True) or time.sleep(0.01) for i in range(20)]"
+    commands = [
+        SubprocessCommand([sys.executable, "-c", script], prefix=f"tool{i}")
+        for i in range(3)
+    ] + [
+        SubprocessCommand(
+            [sys.executable, "-c", "print('{}')"], capture_output=True, prefix="json"
+        )
+    ]
+
+    results = run_subprocesses(commands)
+    assert [result.exit_code for result in results] == [0, 0, 0, 0]
+    with results[3].output as output:
+        assert output.getvalue() == b"{}\n"
+
+    lines = capsysbinary.readouterr().out.splitlines()
+    for i in range(3):
+        tool_lines = [
+            line for line in lines if line.startswith(f"[tool{i}]: ".encode())
+        ]
+        assert tool_lines == [f"[tool{i}]: line {j}".encode() for j in range(20)]
+
+
+def test_run_subprocesses_timeout_and_cancel():
+    sleep = [sys.executable, "-c", "import time; time.sleep(30)"]
+    fail = [sys.executable, "-c", "import time, sys; time.sleep(0.2); sys.exit(1)"]
+
+    results = run_subprocesses([SubprocessCommand(sleep, timeout=0.2)])
+    assert results[0].timed_out
+    assert not results[0].ok
+    assert results[0].duration < 10
+
+    results = run_subprocesses(
+        [SubprocessCommand(sleep), SubprocessCommand(fail)], fail_fast=True
+    )
+    assert results[0].cancelled
+    assert results[0].exit_code is None
+    assert results[1].exit_code == 1
+
+
+def test_modified_environ_out_of_order(monkeypatch):
+    monkeypatch.setenv("NEBARI_TEST_SHARED", "original")
+    monkeypatch.delenv("NEBARI_TEST_ADDED", raising=False)
+
+    first = modified_environ(NEBARI_TEST_SHARED="first")
+    second = modified_environ(NEBARI_TEST_SHARED="second", NEBARI_TEST_ADDED="second")
+    first.__enter__()
+    second.__enter__()
+    assert os.environ["NEBARI_TEST_SHARED"] == "second"
+
+    # e.g. stages deployed concurrently finishing in another order
+    first.__exit__(None, None, None)
+    assert os.environ["NEBARI_TEST_SHARED"] == "second"
+    assert os.environ["NEBARI_TEST_ADDED"] == "second"
+
+    second.__exit__(None, None, None)
+    assert os.environ["NEBARI_TEST_SHARED"] == "original"
+    assert "NEBARI_TEST_ADDED" not in os.environ